@@ -0,0 +1,99 @@
+"""
+Busca unificada da empresa: funcionários, EPIs, extintores e equipamentos numa só consulta.
+
+Cada tipo vira um SELECT com as mesmas colunas (entidade, id, título, detalhe, relevância)
+e os quatro são unidos com UNION ALL, ordenados pela relevância e cortados no limite.
+O filtro é icontains, que no PostgreSQL vira UPPER(col::text) LIKE UPPER('%termo%'); a
+migração 0024 cria índices GIN pg_trgm exatamente nessa expressão, então a busca usa o
+índice em vez de varrer a tabela. A relevância no PostgreSQL é a word_similarity do
+pg_trgm; no SQLite (testes/desenvolvimento) é uma escala simples igual > começa > contém.
+"""
+from django.db import connection
+from django.db.models import Case, CharField, F, FloatField, Func, Q, Value, When
+from django.db.models.functions import Cast, Concat, Greatest
+from django.urls import reverse
+
+from .models import EPI, Equipamento, Extintor, Funcionario, normalizar_cpf
+
+TAMANHO_MINIMO = 2
+LIMITE = 30
+
+
+class SimilaridadePalavra(Func):
+    """word_similarity(termo, coluna) do pg_trgm: 1.0 quando o termo aparece inteiro na coluna"""
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+
+def _so_digitos(termo):
+    return normalizar_cpf(termo) if any(c.isdigit() for c in termo) else ''
+
+
+# entidade -> (modelo, [(campo, transformação do termo)], título, detalhe, rota de destino)
+TIPOS = {
+    'funcionario': (
+        Funcionario, [('nome', None), ('cargo', None), ('cpf', _so_digitos)],
+        F('nome'), F('cargo'), 'detalhe_funcionario',
+    ),
+    'epi': (
+        EPI, [('ca', None), ('codigo_unico', None), ('tipo__nome', None)],
+        Concat('tipo__nome', Value(' - '), 'tamanho'), Concat(Value('CA '), 'ca', Value(' · '), 'codigo_unico'),
+        'editar_epi',
+    ),
+    'extintor': (
+        Extintor, [('codigo_patrimonial', None), ('numero_serie', None), ('localizacao__nome', None)],
+        F('codigo_patrimonial'), F('localizacao__nome'), 'historico_extintor',
+    ),
+    'equipamento': (
+        Equipamento, [('nome', None), ('especificacao', None), ('localizacao__nome', None)],
+        F('nome'), F('localizacao__nome'), 'historico_equipamento',
+    ),
+}
+
+ROTULOS = {'funcionario': 'Funcionário', 'epi': 'EPI', 'extintor': 'Extintor', 'equipamento': 'Equipamento'}
+
+
+def _relevancia(campo, termo):
+    if connection.vendor == 'postgresql':
+        return SimilaridadePalavra(Value(termo), F(campo))
+    return Case(
+        When(**{f'{campo}__iexact': termo}, then=Value(1.0)),
+        When(**{f'{campo}__istartswith': termo}, then=Value(0.6)),
+        When(**{f'{campo}__icontains': termo}, then=Value(0.3)),
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+
+def _consulta(empresa, entidade, termo):
+    modelo, campos, titulo, detalhe, _ = TIPOS[entidade]
+    filtro, relevancias = Q(), []
+    for campo, transformar in campos:
+        valor = transformar(termo) if transformar else termo
+        if not valor:
+            continue
+        filtro |= Q(**{f'{campo}__icontains': valor})
+        relevancias.append(_relevancia(campo, valor))
+    relevancia = Greatest(*relevancias) if len(relevancias) > 1 else relevancias[0]
+    # Só anotações, na mesma ordem em todos os tipos: as colunas do UNION precisam casar
+    return (modelo.objects.filter(filtro, empresa=empresa)
+            .annotate(entidade=Value(entidade, output_field=CharField()), ident=F('pk'),
+                      titulo=Cast(titulo, CharField()), detalhe=Cast(detalhe, CharField()),
+                      relevancia=relevancia)
+            .values_list('entidade', 'ident', 'titulo', 'detalhe', 'relevancia'))
+
+
+def buscar(empresa, termo, entidades=None, limite=LIMITE):
+    """[{entidade, rotulo, id, titulo, detalhe, relevancia, url}] da empresa, mais relevantes primeiro"""
+    termo = ' '.join(termo.split())
+    if len(termo) < TAMANHO_MINIMO:
+        return []
+    consultas = [_consulta(empresa, entidade, termo) for entidade in (entidades or TIPOS)]
+    uniao = consultas[0].union(*consultas[1:], all=True) if len(consultas) > 1 else consultas[0]
+    resultados = []
+    for entidade, ident, titulo, detalhe, relevancia in uniao.order_by('-relevancia', 'titulo')[:limite]:
+        resultados.append({
+            'entidade': entidade, 'rotulo': ROTULOS[entidade], 'id': ident, 'titulo': titulo,
+            'detalhe': detalhe or '', 'relevancia': round(relevancia or 0, 3),
+            'url': reverse(TIPOS[entidade][4], args=[ident]),
+        })
+    return resultados
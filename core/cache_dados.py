@@ -0,0 +1,162 @@
+"""
+Cache por empresa do que os dashboards e listas calculam a cada acesso.
+
+Cada empresa tem no cache uma versão dos dados: o instante (time_ns) da última alteração
+em algum modelo do core, gravado pelos signals de post_save/post_delete e, nos caminhos
+com bulk_create/update (que não disparam signals), chamando registrar_alteracao à mão.
+O contexto de uma view fica sob (view, empresa, versão, parâmetros da URL, dia); uma
+alteração muda a versão e as chaves antigas deixam de ser lidas até expirarem sozinhas.
+
+Guarda-se o contexto já materializado (listas de instâncias com select_related, agregados),
+e não a resposta: o cabeçalho da página traz o usuário e o token CSRF de cada navegador.
+O template continua sendo renderizado a cada acesso, mas sem nenhuma consulta da view.
+
+A mesma chamada grava no banco o instante da alteração por tabela (AlteracaoTabela).
+O decorator @condicional(Extintor, Localizacao, ...) lê o maior deles numa única consulta
+antes da view e responde 304 quando o navegador já tem a página dessa versão, sem executar
+a view nem renderizar o template. As páginas que passam por ele saem comprimidas (gzip_page);
+a compressão fica só nelas, e não num middleware global, para não alcançar a entrega de
+arquivos (core.midia), cujas respostas 206 e o ETag forte do If-Range precisam dos bytes crus.
+"""
+import hashlib
+import time
+from datetime import date, datetime, time as hora
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+
+from .models import (
+    AlteracaoTabela, ArquivoInspecao, Equipamento, Extintor, FotoInspecao, InspecaoEquipamento, InspecaoExtintor
+)
+from .roteador import usar_replica
+
+# Modelos sem empresa_id: (modelo pai, campo da FK no registro, caminho até a empresa no pai)
+CAMINHO_EMPRESA = {
+    InspecaoExtintor: (Extintor, 'extintor_id', 'empresa_id'),
+    InspecaoEquipamento: (Equipamento, 'equipamento_id', 'empresa_id'),
+    FotoInspecao: (InspecaoExtintor, 'inspecao_id', 'extintor__empresa_id'),
+    ArquivoInspecao: (InspecaoEquipamento, 'inspecao_id', 'equipamento__empresa_id'),
+}
+
+
+def _chave_versao(empresa_id):
+    return f'versao_dados:{empresa_id}'
+
+
+def versao(empresa_id):
+    """Instante (ns) da última alteração conhecida nos dados da empresa"""
+    chave = _chave_versao(empresa_id)
+    valor = cache.get(chave)
+    if valor is None:
+        # Primeiro acesso ou versão despejada do cache: começa agora, nunca volta a uma antiga
+        cache.add(chave, time.time_ns(), None)
+        valor = cache.get(chave) or time.time_ns()
+    return valor
+
+
+def empresa_de(instancia):
+    """empresa_id do registro, subindo pela FK quando o modelo não tem empresa própria"""
+    if type(instancia) in CAMINHO_EMPRESA:
+        pai, campo, caminho = CAMINHO_EMPRESA[type(instancia)]
+        return pai.objects.filter(pk=getattr(instancia, campo)).values_list(caminho, flat=True).first()
+    return instancia.empresa_id
+
+
+def registrar_alteracao(empresa_id, *modelos):
+    """Nova versão para a empresa (e instante de alteração das tabelas) quando a transação fizer commit"""
+    if empresa_id is None:
+        return
+    tabelas = {modelo._meta.model_name for modelo in modelos}
+
+    def gravar():
+        cache.set(_chave_versao(empresa_id), time.time_ns(), None)
+        agora = timezone.now()
+        AlteracaoTabela.objects.bulk_create(
+            [AlteracaoTabela(empresa_id=empresa_id, tabela=tabela, alterado_em=agora) for tabela in tabelas],
+            update_conflicts=True, unique_fields=['empresa', 'tabela'], update_fields=['alterado_em'],
+        )
+
+    # Antes do commit outra requisição poderia ler a versão nova com os dados antigos e guardá-los
+    transaction.on_commit(gravar)
+
+
+def contexto(request, nome, calcular):
+    """Contexto da view `nome` para a empresa da requisição; `calcular()` só roda sem cache.
+
+    `calcular` deve devolver dados prontos para o pickle: listas no lugar de querysets.
+    """
+    if not settings.CACHE_DASHBOARDS:
+        return calcular()
+    empresa_id = request.empresa.pk
+    atual = versao(empresa_id)
+    parametros = hashlib.md5(urlencode(sorted(request.GET.lists()), doseq=True).encode()).hexdigest()
+    # O dia entra na chave: contadores de vencimento mudam à meia-noite sem nenhuma alteração
+    chave = f'contexto:{nome}:{empresa_id}:{atual}:{parametros}:{date.today().isoformat()}'
+    dados = cache.get(chave)
+    if dados is None:
+        dados = calcular()
+        # Lido da réplica logo depois de uma alteração: pode estar atrasado, então não fica guardado
+        recente = time.time_ns() - atual < settings.REPLICA_JANELA_ESCRITA * 1_000_000_000
+        if not (usar_replica.get() and recente):
+            cache.set(chave, dados, settings.CACHE_DASHBOARDS_VALIDADE)
+    return dados
+
+
+def ultima_alteracao(empresa_id, modelos):
+    """Maior instante de alteração das tabelas na empresa (None se nenhuma foi registrada)"""
+    return (AlteracaoTabela.objects
+            .filter(empresa_id=empresa_id, tabela__in=[modelo._meta.model_name for modelo in modelos])
+            .aggregate(ultima=Max('alterado_em'))['ultima'])
+
+
+def condicional(*modelos):
+    """ETag/Last-Modified da view a partir das tabelas que a página mostra; 304 sem executar a view.
+
+    O ETag inclui o usuário, o cookie CSRF (o token está no HTML guardado pelo navegador),
+    o dia (contadores de vencimento) e settings.ETAG_VERSAO, para um deploy que mude os
+    templates invalidar as páginas já guardadas. A resposta sai com gzip quando o navegador aceita.
+    """
+    def exata(request):
+        if not hasattr(request, '_alterado_em'):
+            request._alterado_em = ultima_alteracao(request.empresa.pk, modelos) if request.empresa else None
+        return request._alterado_em
+
+    def alterado_em(request, *args, **kwargs):
+        alterado = exata(request)
+        if alterado is None:
+            return None
+        # Last-Modified tem resolução de segundos e a página muda à meia-noite
+        inicio_do_dia = timezone.make_aware(datetime.combine(date.today(), hora.min))
+        return max(alterado.replace(microsecond=0), inicio_do_dia)
+
+    def etag(request, *args, **kwargs):
+        alterado = exata(request)
+        csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+        # Sem o cookie esta resposta vai criá-lo, e o próximo ETag já seria outro
+        if alterado is None or not csrf:
+            return None
+        assinatura = ':'.join([
+            alterado.isoformat(), str(request.user.pk), csrf, date.today().isoformat(), settings.ETAG_VERSAO,
+        ])
+        return hashlib.md5(assinatura.encode()).hexdigest()
+
+    def decorator(view):
+        # gzip por fora: enfraquece o ETag (W/) depois da comparação, que já é fraca no If-None-Match
+        condicionada = gzip_page(condition(etag_func=etag, last_modified_func=alterado_em)(view))
+
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            resposta = condicionada(request, *args, **kwargs)
+            # O navegador guarda a página mas sempre revalida; nenhum proxy compartilhado a guarda
+            patch_cache_control(resposta, private=True, no_cache=True)
+            return resposta
+        return _view
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Matriz de conformidade: exigências do Setor (vacinas, tipos de EPI e NRs) x registros do funcionário.
+
+Toda a empresa é calculada com um número fixo de consultas (uma por tabela envolvida);
+o cruzamento é feito em memória com conjuntos. As pendências ficam gravadas em
+PendenciaConformidade e são recalculadas só para o funcionário alterado (ver signals.py).
+
+Reforços de vacina e treinamentos de NR com validade são gravados já com a data em que
+vencem, antes de vencerem: `vigentes()` filtra na leitura o que já venceu até hoje, sem
+depender de um recálculo diário.
+"""
+import re
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import (
+    Funcionario, Setor, ControleVacina, EntregaEPI, TreinamentoFuncionario,
+    PendenciaConformidade
+)
+
+NUMERO_NR_RE = re.compile(r'NR\s*-?\s*0*(\d+)')
+
+
+def _normalizar(texto):
+    return re.sub(r'[\s-]', '', texto.upper())
+
+
+def _cumpre_nr(codigo, curso):
+    """O curso cita a NR? NR-35, NR 35 e NR35 (ou NR-06 e NR 6) são a mesma; NR-1 não é NR-10"""
+    numero = NUMERO_NR_RE.fullmatch(codigo.strip().upper())
+    if numero:
+        return numero.group(1) in NUMERO_NR_RE.findall(curso.upper())
+    return _normalizar(codigo) in _normalizar(curso)
+
+
+def vigentes(pendencias, hoje=None):
+    """Só as pendências já em vigor: sem data ou com a data (reforço, validade da NR) já passada"""
+    return pendencias.exclude(vencimento__gte=hoje or date.today())
+
+
+def _exigencias_por_setor(through, campo, campo_nome, empresa_id):
+    """Devolve {setor_id: {item_id}} e {item_id: nome} numa só consulta"""
+    exigencias, nomes = defaultdict(set), {}
+    for setor_id, item_id, nome in through.objects.filter(setor__empresa_id=empresa_id).values_list('setor_id', campo, campo_nome):
+        exigencias[setor_id].add(item_id)
+        nomes[item_id] = nome
+    return exigencias, nomes
+
+
+def calcular_pendencias(empresa_id, funcionario_ids=None):
+    """Retorna as pendências (não salvas) dos funcionários em exercício da empresa, inclusive
+    as que só entram em vigor numa data futura (ver vigentes)"""
+    funcionarios = Funcionario.objects.filter(empresa_id=empresa_id, ativo=True, setor__isnull=False).exclude(situacao='DESLIGADO')
+    if funcionario_ids is not None:
+        funcionarios = funcionarios.filter(pk__in=funcionario_ids)
+    setor_de = dict(funcionarios.values_list('pk', 'setor_id'))
+    if not setor_de:
+        return []
+    ids = list(setor_de)
+
+    vacinas_exigidas, nomes_vacina = _exigencias_por_setor(
+        Setor.vacinas_padrao.through, 'vacina_id', 'vacina__nome', empresa_id)
+    epis_exigidos, nomes_epi = _exigencias_por_setor(
+        Setor.epis_obrigatorios.through, 'tipoepi_id', 'tipoepi__nome', empresa_id)
+    nrs_exigidas, codigos_nr = _exigencias_por_setor(
+        Setor.nrs_obrigatorias.through, 'normaregulamentadora_id', 'normaregulamentadora__codigo', empresa_id)
+
+    # Última dose de cada vacina por funcionário
+    reforcos = {}
+    for func_id, vacina_id, reforco in (ControleVacina.objects.filter(funcionario_id__in=ids)
+                                        .values('funcionario_id', 'vacina_id')
+                                        .annotate(reforco=Max('data_proximo_reforco'))
+                                        .values_list('funcionario_id', 'vacina_id', 'reforco')):
+        reforcos[(func_id, vacina_id)] = reforco
+
+    # Tipos de EPI em posse (entregues e não devolvidos)
+    epis_em_posse = set(EntregaEPI.objects.filter(funcionario_id__in=ids, data_devolucao__isnull=True)
+                        .values_list('funcionario_id', 'epi__tipo_id').distinct())
+
+    # Treinamentos válidos: a NR é reconhecida pelo código no nome do curso (ex.: "NR-35 Trabalho em Altura")
+    treinamentos = defaultdict(list)
+    for func_id, nome, validade in TreinamentoFuncionario.objects.filter(funcionario_id__in=ids).values_list(
+            'funcionario_id', 'nome_treinamento', 'data_validade'):
+        treinamentos[func_id].append((nome, validade))
+
+    pendencias = []
+    for func_id, setor_id in setor_de.items():
+        def pendencia(tipo, descricao, vencimento=None):
+            pendencias.append(PendenciaConformidade(
+                empresa_id=empresa_id, funcionario_id=func_id, tipo=tipo, descricao=descricao, vencimento=vencimento
+            ))
+
+        for vacina_id in vacinas_exigidas.get(setor_id, ()):
+            if (func_id, vacina_id) not in reforcos:
+                pendencia('VACINA', nomes_vacina[vacina_id])
+            elif reforcos[(func_id, vacina_id)]:
+                pendencia('REFORCO', nomes_vacina[vacina_id], reforcos[(func_id, vacina_id)])
+
+        for tipo_id in epis_exigidos.get(setor_id, ()):
+            if (func_id, tipo_id) not in epis_em_posse:
+                pendencia('EPI', nomes_epi[tipo_id])
+
+        for nr_id in nrs_exigidas.get(setor_id, ()):
+            cursos = [validade for nome, validade in treinamentos[func_id] if _cumpre_nr(codigos_nr[nr_id], nome)]
+            if not cursos:
+                pendencia('NR', codigos_nr[nr_id])
+            elif all(cursos):
+                # Vence com o curso de validade mais longa; um curso sem validade não vence nunca
+                pendencia('NR_VENCIDA', codigos_nr[nr_id], max(cursos))
+    return pendencias
+
+
+def atualizar_pendencias(empresa_id, funcionario_ids=None):
+    """Regrava as pendências da empresa inteira ou só dos funcionários informados"""
+    with transaction.atomic():
+        antigas = PendenciaConformidade.objects.filter(empresa_id=empresa_id)
+        if funcionario_ids is not None:
+            antigas = antigas.filter(funcionario_id__in=funcionario_ids)
+        antigas.delete()
+        return len(PendenciaConformidade.objects.bulk_create(calcular_pendencias(empresa_id, funcionario_ids)))
@@ -0,0 +1,206 @@
+"""
+Estoque de EPIs: toda alteração de EPI.quantidade passa por aqui e deixa um MovimentoEstoque.
+
+A linha do EPI é travada (select_for_update) e a quantidade muda com F(), então duas
+entregas simultâneas não consomem a mesma unidade. O fechamento mensal (SaldoEstoque,
+comando fechar_saldos_estoque) guarda o saldo de cada EPI no fim do mês: o saldo numa
+data é o último fechamento + os movimentos do mês em curso, sem reler o livro inteiro.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .conformidade import atualizar_pendencias
+from .models import EPI, EntregaEPI, MovimentoEstoque, SaldoEstoque
+
+TAMANHO_LOTE = 1000
+
+# Sinal aplicado à quantidade informada; AJUSTE recebe a diferença já com sinal
+SINAL = {'ENTRADA': 1, 'ENTREGA': -1, 'DEVOLUCAO': 1, 'AJUSTE': 1}
+CAMPO_SALDO = {'ENTRADA': 'entradas', 'ENTREGA': 'entregas', 'DEVOLUCAO': 'devolucoes', 'AJUSTE': 'ajustes'}
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, epi, disponivel, solicitado):
+        self.epi, self.disponivel, self.solicitado = epi, disponivel, solicitado
+        super().__init__(f"Estoque insuficiente de {epi}: {disponivel} disponível(is), {solicitado} solicitado(s).")
+
+
+def movimentar(epi, tipo, quantidade, usuario=None, entrega=None, observacao=''):
+    """Aplica o movimento ao saldo do EPI e registra no livro. Levanta EstoqueInsuficiente se ficaria negativo"""
+    delta = quantidade * SINAL[tipo]
+    with transaction.atomic():
+        atual = EPI.objects.select_for_update().values_list('quantidade', flat=True).get(pk=epi.pk)
+        if atual + delta < 0:
+            raise EstoqueInsuficiente(epi, atual, -delta)
+        EPI.objects.filter(pk=epi.pk).update(quantidade=F('quantidade') + delta, atualizado_em=timezone.now())
+        movimento = MovimentoEstoque.objects.create(
+            empresa_id=epi.empresa_id, epi_id=epi.pk, tipo=tipo, quantidade=delta, saldo_apos=atual + delta,
+            entrega=entrega, usuario=usuario, observacao=observacao[:255],
+        )
+    epi.quantidade = atual + delta
+    return movimento
+
+
+def entregar(entrega, usuario=None):
+    """Grava a entrega e baixa o estoque na mesma transação"""
+    with transaction.atomic():
+        entrega.save()
+        movimentar(entrega.epi, 'ENTREGA', entrega.quantidade, usuario=usuario, entrega=entrega,
+                   observacao=entrega.funcionario.nome)
+    return entrega
+
+
+def entregar_kit(empresa_id, funcionarios, itens, data_entrega, usuario=None):
+    """Entrega o mesmo kit a vários funcionários numa transação.
+
+    `itens` é uma lista de (epi, quantidade por funcionário). O estoque é conferido uma vez
+    (linhas travadas), as entregas e os movimentos entram com bulk_create e cada EPI recebe
+    um único UPDATE. Retorna as entregas criadas.
+    """
+    quantidades = defaultdict(int)
+    for epi, quantidade in itens:
+        quantidades[epi.pk] += quantidade
+    with transaction.atomic():
+        epis = {epi.pk: epi for epi in EPI.objects.select_for_update()
+                .filter(pk__in=quantidades, empresa_id=empresa_id).select_related('tipo').order_by('pk')}
+        for epi_id, quantidade in quantidades.items():
+            necessario = quantidade * len(funcionarios)
+            if epis[epi_id].quantidade < necessario:
+                raise EstoqueInsuficiente(epis[epi_id], epis[epi_id].quantidade, necessario)
+
+        entregas = EntregaEPI.objects.bulk_create([
+            # Mesmo snapshot de CA que EntregaEPI.save() grava numa entrega avulsa
+            EntregaEPI(funcionario=funcionario, epi=epis[epi_id], data_entrega=data_entrega, quantidade=quantidade,
+                       ca_registrado=epis[epi_id].ca, validade_ca=epis[epi_id].data_validade)
+            for funcionario in funcionarios for epi_id, quantidade in quantidades.items()
+        ], batch_size=TAMANHO_LOTE)
+
+        saldos = {epi_id: epi.quantidade for epi_id, epi in epis.items()}
+        movimentos = []
+        for entrega in entregas:
+            saldos[entrega.epi_id] -= entrega.quantidade
+            movimentos.append(MovimentoEstoque(
+                empresa_id=empresa_id, epi_id=entrega.epi_id, tipo='ENTREGA', quantidade=-entrega.quantidade,
+                saldo_apos=saldos[entrega.epi_id], entrega=entrega, usuario=usuario,
+                observacao=f'Kit - {entrega.funcionario.nome}'[:255],
+            ))
+        MovimentoEstoque.objects.bulk_create(movimentos, batch_size=TAMANHO_LOTE)
+
+        agora = timezone.now()
+        for epi_id, quantidade in quantidades.items():
+            EPI.objects.filter(pk=epi_id).update(
+                quantidade=F('quantidade') - quantidade * len(funcionarios), atualizado_em=agora)
+
+        # bulk_create não dispara os signals da conformidade
+        atualizar_pendencias(empresa_id, [funcionario.pk for funcionario in funcionarios])
+    return entregas
+
+
+def devolver(entrega, usuario=None, retornar_ao_estoque=True):
+    with transaction.atomic():
+        entrega.data_devolucao = timezone.localdate()
+        entrega.save()
+        if retornar_ao_estoque:
+            movimentar(entrega.epi, 'DEVOLUCAO', entrega.quantidade, usuario=usuario, entrega=entrega,
+                       observacao=entrega.funcionario.nome)
+    return entrega
+
+
+# FECHAMENTO MENSAL E CONSULTAS
+
+def _proximo_mes(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _inicio(mes):
+    """Primeiro instante do mês no fuso do projeto"""
+    return timezone.make_aware(datetime.combine(mes, time.min))
+
+
+def fechar_saldos(empresa_id):
+    """Grava SaldoEstoque para cada mês encerrado ainda sem fechamento. Retorna quantos meses foram fechados"""
+    mes_atual = timezone.localdate().replace(day=1)
+    ultimo = SaldoEstoque.objects.filter(empresa_id=empresa_id).aggregate(m=Max('mes'))['m']
+    if ultimo:
+        mes = _proximo_mes(ultimo)
+        saldos = dict(SaldoEstoque.objects.filter(empresa_id=empresa_id, mes=ultimo).values_list('epi_id', 'saldo_final'))
+    else:
+        primeiro = MovimentoEstoque.objects.filter(empresa_id=empresa_id).aggregate(d=Min('data'))['d']
+        if primeiro is None:
+            return 0
+        mes = timezone.localtime(primeiro).date().replace(day=1)
+        saldos = {}
+
+    fechados = 0
+    while mes < mes_atual:
+        proximo = _proximo_mes(mes)
+        totais = defaultdict(dict)
+        for epi_id, tipo, total in (MovimentoEstoque.objects
+                                    .filter(empresa_id=empresa_id, data__gte=_inicio(mes), data__lt=_inicio(proximo))
+                                    .values('epi_id', 'tipo').annotate(total=Sum('quantidade'))
+                                    .values_list('epi_id', 'tipo', 'total').order_by()):
+            totais[epi_id][tipo] = total
+
+        linhas = []
+        for epi_id in set(saldos) | set(totais):
+            movimentos = totais.get(epi_id, {})
+            saldos[epi_id] = saldos.get(epi_id, 0) + sum(movimentos.values())
+            # EPIs zerados e parados não precisam de linha: a ausência vale saldo zero
+            if not movimentos and not saldos[epi_id]:
+                continue
+            linha = SaldoEstoque(empresa_id=empresa_id, epi_id=epi_id, mes=mes, saldo_final=saldos[epi_id])
+            for tipo, total in movimentos.items():
+                # Entregas ficam positivas no fechamento (consumo do mês)
+                setattr(linha, CAMPO_SALDO[tipo], -total if tipo == 'ENTREGA' else total)
+            linhas.append(linha)
+        SaldoEstoque.objects.bulk_create(
+            linhas, update_conflicts=True, unique_fields=['epi', 'mes'],
+            update_fields=['entradas', 'entregas', 'devolucoes', 'ajustes', 'saldo_final'],
+        )
+        fechados += 1
+        mes = proximo
+    return fechados
+
+
+def saldos_em(empresa_id, momento):
+    """{epi_id: saldo} no instante informado: último fechamento anterior + movimentos desde então"""
+    mes = timezone.localtime(momento).date().replace(day=1)
+    base = SaldoEstoque.objects.filter(empresa_id=empresa_id, mes__lt=mes).aggregate(m=Max('mes'))['m']
+    movimentos = MovimentoEstoque.objects.filter(empresa_id=empresa_id, data__lt=momento)
+    saldos = defaultdict(int)
+    if base:
+        saldos.update(SaldoEstoque.objects.filter(empresa_id=empresa_id, mes=base).values_list('epi_id', 'saldo_final'))
+        movimentos = movimentos.filter(data__gte=_inicio(_proximo_mes(base)))
+    for epi_id, total in movimentos.values('epi_id').annotate(total=Sum('quantidade')).values_list('epi_id', 'total').order_by():
+        saldos[epi_id] += total
+    return dict(saldos)
+
+
+def consumo_mensal(empresa_id, desde):
+    """[(mês, tipo de EPI, unidades consumidas)] a partir do mês de `desde`; meses fechados vêm de SaldoEstoque"""
+    desde = desde.replace(day=1)
+    consumo = defaultdict(int)
+    fechados = (SaldoEstoque.objects.filter(empresa_id=empresa_id, mes__gte=desde)
+                .values('mes', 'epi__tipo__nome')
+                .annotate(total=Sum('entregas') - Sum('devolucoes'))
+                .values_list('mes', 'epi__tipo__nome', 'total').order_by())
+    for mes, tipo, total in fechados:
+        consumo[(mes, tipo)] += total
+
+    ultimo = SaldoEstoque.objects.filter(empresa_id=empresa_id).aggregate(m=Max('mes'))['m']
+    aberto = max(desde, _proximo_mes(ultimo)) if ultimo else desde
+    em_aberto = (MovimentoEstoque.objects
+                 .filter(empresa_id=empresa_id, data__gte=_inicio(aberto), tipo__in=['ENTREGA', 'DEVOLUCAO'])
+                 .annotate(mes=TruncMonth('data'))
+                 .values('mes', 'epi__tipo__nome')
+                 .annotate(total=Sum('quantidade'))
+                 .values_list('mes', 'epi__tipo__nome', 'total').order_by())
+    for mes, tipo, total in em_aberto:
+        # No livro as entregas são negativas
+        consumo[(timezone.localtime(mes).date() if isinstance(mes, datetime) else mes, tipo)] -= total
+    return sorted((mes, tipo, total) for (mes, tipo), total in consumo.items() if total)
@@ -0,0 +1,96 @@
+import csv
+import json
+import tempfile
+
+from django.http import FileResponse, Http404, StreamingHttpResponse
+
+from .paginacao import filtro_apos
+
+# Linhas lidas do banco por consulta
+TAMANHO_LOTE = 2000
+
+
+class _Eco:
+    """Pseudo-arquivo do csv.writer: devolve a linha em vez de acumulá-la"""
+    def write(self, valor):
+        return valor
+
+
+def _valor_ordenacao(obj, campo):
+    for parte in campo.lstrip('-').split('__'):
+        obj = getattr(obj, parte)
+    return obj
+
+
+def _linhas(queryset, colunas):
+    """Lotes de TAMANHO_LOTE por keyset, na ordenação do queryset desempatada pelo pk.
+
+    Sem cursores no servidor (DISABLE_SERVER_SIDE_CURSORS, exigido pelo pooler) o iterator()
+    traria o resultado inteiro para a memória do cliente; cada lote aqui é uma consulta
+    própria com LIMIT. As colunas da ordenação não podem ser nulas.
+    """
+    ordenacao = [campo for campo in queryset.query.order_by if campo.lstrip('-') not in ('pk', 'id')]
+    ordenacao.append('pk')
+    ultimo = None
+    while True:
+        lote = queryset.order_by(*ordenacao)
+        if ultimo is not None:
+            lote = lote.filter(filtro_apos(ordenacao, ultimo))
+        lote = list(lote[:TAMANHO_LOTE])
+        for obj in lote:
+            yield [valor(obj) for _, valor in colunas]
+        if len(lote) < TAMANHO_LOTE:
+            return
+        ultimo = [_valor_ordenacao(lote[-1], campo) for campo in ordenacao]
+
+
+def _gerar_csv(queryset, colunas):
+    writer = csv.writer(_Eco())
+    yield writer.writerow([titulo for titulo, _ in colunas])
+    for linha in _linhas(queryset, colunas):
+        yield writer.writerow(linha)
+
+
+def _gerar_ndjson(queryset, colunas):
+    titulos = [titulo for titulo, _ in colunas]
+    for linha in _linhas(queryset, colunas):
+        yield json.dumps(dict(zip(titulos, linha)), ensure_ascii=False, default=str) + '\n'
+
+
+def _gerar_xlsx(queryset, colunas):
+    """Planilha em modo write-only: as linhas vão direto para um arquivo temporário"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise Http404("Exportação XLSX indisponível (openpyxl não instalado).")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([titulo for titulo, _ in colunas])
+    for linha in _linhas(queryset, colunas):
+        ws.append(linha)
+    arquivo = tempfile.TemporaryFile()
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def exportar(queryset, colunas, nome_arquivo, formato='csv'):
+    """
+    Monta a resposta de exportação sem carregar a tabela inteira na memória.
+    `colunas` é uma lista de (título, função que recebe o objeto e devolve o valor).
+    """
+    if formato == 'xlsx':
+        return FileResponse(
+            _gerar_xlsx(queryset, colunas), as_attachment=True, filename=f'{nome_arquivo}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    if formato == 'ndjson':
+        response = StreamingHttpResponse(_gerar_ndjson(queryset, colunas), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.ndjson"'
+        return response
+    if formato != 'csv':
+        raise Http404("Formato de exportação inválido.")
+    response = StreamingHttpResponse(_gerar_csv(queryset, colunas), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.csv"'
+    return response
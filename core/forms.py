@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 import os
+from datetime import date
 from django.db import transaction
 from .models import (
     Empresa, Funcionario, Setor, NormaRegulamentadora, 
@@ -10,8 +11,10 @@ from .models import (
     Equipamento, InspecaoEquipamento,
     ControleVacina, EntregaEPI, TreinamentoFuncionario,
     # Novos modelos
-    Afastamento, AcidenteTrabalho
+    Afastamento, AcidenteTrabalho, UploadParcial, normalizar_cpf,
+    FotoInspecao, ArquivoInspecao
 )
+from .uploads import ErroUpload, concluidos, validar
 
 # --- WIDGETS ---
 class MultipleFileInput(forms.ClearableFileInput):
@@ -30,6 +33,54 @@ class MultipleFileField(forms.FileField):
             raise forms.ValidationError(self.error_messages['required'], code='required')
         return data
 
+def validar_uploads(enviados, destino):
+    """Erro de formulário se algum upload não servir para o campo destino (modelo, campo)"""
+    erros = []
+    for upload in enviados:
+        try:
+            validar(upload, *destino)
+        except ErroUpload as erro:
+            erros.append(str(erro))
+    if erros:
+        raise forms.ValidationError(erros)
+
+class UploadsEnviadosField(forms.ModelMultipleChoiceField):
+    """Ids de uploads em partes já concluídos (core.uploads), preenchidos pelo script de envio.
+
+    `destino` é o (modelo, campo) que vai receber os arquivos; o conteúdo é validado para ele.
+    """
+    widget = forms.MultipleHiddenInput
+
+    def __init__(self, destino, **kwargs):
+        kwargs.setdefault('required', False)
+        self.destino = destino
+        super().__init__(UploadParcial.objects.none(), **kwargs)
+
+    def clean(self, value):
+        enviados = super().clean(value)
+        validar_uploads(enviados, self.destino)
+        return enviados
+
+class UploadEnviadoField(forms.ModelChoiceField):
+    widget = forms.HiddenInput
+
+    def __init__(self, destino, **kwargs):
+        kwargs.setdefault('required', False)
+        self.destino = destino
+        super().__init__(UploadParcial.objects.none(), **kwargs)
+
+    def clean(self, value):
+        upload = super().clean(value)
+        if upload is not None:
+            validar_uploads([upload], self.destino)
+        return upload
+
+def restringir_uploads(form, empresa_id):
+    """Só uploads concluídos da empresa valem nos campos de upload em partes do formulário"""
+    for field in form.fields.values():
+        if isinstance(field, (UploadsEnviadosField, UploadEnviadoField)):
+            field.queryset = concluidos(empresa_id)
+
 # 1. EMPRESA
 class CadastroSaaSForm(forms.Form):
     username = forms.CharField(label="Seu Nome", max_length=150)
@@ -101,9 +152,19 @@ class FuncionarioForm(forms.ModelForm):
 
     def __init__(self, empresa_id, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.empresa_id = empresa_id
         if empresa_id:
             self.fields['setor'].queryset = Setor.objects.filter(empresa_id=empresa_id)
 
+    def clean_cpf(self):
+        cpf = normalizar_cpf(self.cleaned_data['cpf'])
+        if len(cpf) != 11:
+            raise forms.ValidationError("CPF deve ter 11 dígitos.")
+        duplicado = Funcionario.objects.filter(empresa_id=self.empresa_id, cpf=cpf).exclude(pk=self.instance.pk)
+        if duplicado.exists():
+            raise forms.ValidationError("Já existe um funcionário com este CPF.")
+        return cpf
+
 # 4. EPIs
 class TipoEPIForm(forms.ModelForm):
     class Meta:
@@ -126,6 +187,29 @@ class EPIForm(forms.ModelForm):
         if empresa_id:
             self.fields['tipo'].queryset = TipoEPI.objects.filter(empresa_id=empresa_id)
             self.fields['local'].queryset = Localizacao.objects.filter(empresa_id=empresa_id)
+        if self.instance.pk:
+            # Depois do cadastro o saldo só muda por movimentos (entrada, ajuste, entrega, devolução)
+            del self.fields['quantidade']
+        else:
+            self.fields['quantidade'].label = "Quantidade inicial"
+
+    def clean_quantidade(self):
+        quantidade = self.cleaned_data['quantidade']
+        if quantidade < 0:
+            raise forms.ValidationError("A quantidade não pode ser negativa.")
+        return quantidade
+
+class MovimentoEstoqueForm(forms.Form):
+    tipo = forms.ChoiceField(choices=[('ENTRADA', 'Entrada (compra/recebimento)'), ('AJUSTE', 'Ajuste de inventário')])
+    quantidade = forms.IntegerField(help_text="No ajuste, use valor negativo para baixar o saldo (perda, descarte).")
+    observacao = forms.CharField(max_length=255, required=False, label="Observação")
+
+    def clean(self):
+        dados = super().clean()
+        quantidade = dados.get('quantidade')
+        if quantidade is not None and (quantidade == 0 or (dados.get('tipo') == 'ENTRADA' and quantidade < 0)):
+            self.add_error('quantidade', "Informe uma quantidade positiva (ou negativa, só em ajustes).")
+        return dados
 
 # 5. ADVERTÊNCIAS
 class TipoAdvertenciaForm(forms.ModelForm):
@@ -163,6 +247,15 @@ class AdvertenciaFuncionarioForm(forms.ModelForm):
         if empresa_id:
             self.fields['tipo'].queryset = TipoAdvertencia.objects.filter(empresa_id=empresa_id)
 
+class ImportacaoPlanilhaForm(forms.Form):
+    arquivo = forms.FileField(label="Planilha (.csv ou .xlsx)")
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if os.path.splitext(arquivo.name)[1].lower() not in ('.csv', '.xlsx'):
+            raise forms.ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return arquivo
+
 # 6. EXTINTORES
 class ExtintorForm(forms.ModelForm):
     class Meta:
@@ -181,13 +274,19 @@ class ExtintorForm(forms.ModelForm):
 
 class InspecaoExtintorForm(forms.ModelForm):
     fotos = MultipleFileField(
-        widget=MultipleFileInput(attrs={'multiple': True}), label="Evidências Fotográficas", required=False
+        widget=MultipleFileInput(attrs={'multiple': True, 'data-upload-parcial': 'fotos_enviadas'}),
+        label="Evidências Fotográficas", required=False
     )
+    fotos_enviadas = UploadsEnviadosField(destino=(FotoInspecao, 'imagem'))
     class Meta:
         model = InspecaoExtintor
         fields = ['data_inspecao', 'responsavel', 'lacre_intacto', 'manometro_pressao_ok', 'sinalizacao_visivel', 'acesso_livre', 'mangueira_integra', 'observacoes', 'fotos']
         widgets = {'data_inspecao': forms.DateInput(attrs={'type': 'date'}), 'observacoes': forms.Textarea(attrs={'rows': 2})}
 
+    def __init__(self, empresa_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        restringir_uploads(self, empresa_id)
+
 # 7. OUTROS EQUIPAMENTOS
 class EquipamentoForm(forms.ModelForm):
     class Meta:
@@ -202,13 +301,19 @@ class EquipamentoForm(forms.ModelForm):
 
 class InspecaoEquipamentoForm(forms.ModelForm):
     arquivos = MultipleFileField(
-        widget=MultipleFileInput(attrs={'multiple': True}), label="Evidências", required=False
+        widget=MultipleFileInput(attrs={'multiple': True, 'data-upload-parcial': 'arquivos_enviados'}),
+        label="Evidências", required=False
     )
+    arquivos_enviados = UploadsEnviadosField(destino=(ArquivoInspecao, 'arquivo'))
     class Meta:
         model = InspecaoEquipamento
         fields = ['data_inspecao', 'responsavel', 'item_integro', 'acesso_livre', 'sinalizacao_ok', 'teste_funcional', 'observacoes', 'arquivos']
         widgets = {'data_inspecao': forms.DateInput(attrs={'type': 'date'}), 'observacoes': forms.Textarea(attrs={'rows': 2})}
 
+    def __init__(self, empresa_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        restringir_uploads(self, empresa_id)
+
 # 8. PRONTUÁRIO (VACINAS, EPIs, TREINAMENTOS)
 class ControleVacinaForm(forms.ModelForm):
     class Meta:
@@ -230,7 +335,56 @@ class EntregaEPIForm(forms.ModelForm):
     def __init__(self, empresa_id, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if empresa_id:
-            self.fields['epi'].queryset = EPI.objects.filter(empresa_id=empresa_id, quantidade__gt=0)
+            self.fields['epi'].queryset = EPI.objects.filter(empresa_id=empresa_id, quantidade__gt=0).select_related('tipo')
+
+    def clean_quantidade(self):
+        quantidade = self.cleaned_data['quantidade']
+        if quantidade < 1:
+            raise forms.ValidationError("Informe ao menos 1 unidade.")
+        return quantidade
+
+class EntregaKitForm(forms.Form):
+    """Destinatários da entrega em lote: um setor inteiro ou funcionários escolhidos"""
+    setor = forms.ModelChoiceField(queryset=Setor.objects.none(), required=False, label="Setor inteiro")
+    funcionarios = forms.ModelMultipleChoiceField(
+        queryset=Funcionario.objects.none(), required=False, label="Ou funcionários específicos",
+        widget=forms.SelectMultiple(attrs={'size': 8})
+    )
+    data_entrega = forms.DateField(initial=date.today, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, empresa_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        em_exercicio = Funcionario.objects.filter(empresa_id=empresa_id, ativo=True).exclude(situacao='DESLIGADO')
+        self.fields['setor'].queryset = Setor.objects.filter(empresa_id=empresa_id)
+        self.fields['funcionarios'].queryset = em_exercicio.order_by('nome')
+        self.em_exercicio = em_exercicio
+
+    def clean(self):
+        dados = super().clean()
+        if dados.get('setor'):
+            dados['destinatarios'] = list(self.em_exercicio.filter(setor=dados['setor']))
+        else:
+            dados['destinatarios'] = list(dados.get('funcionarios') or [])
+        if not dados['destinatarios']:
+            raise forms.ValidationError("Escolha um setor com funcionários em exercício ou selecione os funcionários.")
+        return dados
+
+class ItemKitForm(forms.Form):
+    epi = forms.ModelChoiceField(queryset=EPI.objects.none(), label="EPI")
+    quantidade = forms.IntegerField(min_value=1, initial=1, label="Qtd por funcionário")
+
+    def __init__(self, *args, empresa_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['epi'].queryset = (EPI.objects.filter(empresa_id=empresa_id, quantidade__gt=0)
+                                       .select_related('tipo'))
+
+    def clean_epi(self):
+        epi = self.cleaned_data['epi']
+        if not epi.data_validade:
+            raise forms.ValidationError("Cadastre a validade do CA deste EPI antes de entregá-lo.")
+        return epi
+
+ItemKitFormSet = forms.formset_factory(ItemKitForm, extra=4, min_num=1, validate_min=True)
 
 class TreinamentoFuncionarioForm(forms.ModelForm):
     class Meta:
@@ -243,6 +397,8 @@ class TreinamentoFuncionarioForm(forms.ModelForm):
 
 # 9. NOVOS FORMS (AFASTAMENTO E ACIDENTE)
 class AfastamentoForm(forms.ModelForm):
+    laudo_enviado = UploadEnviadoField(destino=(Afastamento, 'laudo'))
+
     class Meta:
         model = Afastamento
         fields = ['data_inicio', 'data_retorno', 'motivo', 'laudo']
@@ -250,9 +406,16 @@ class AfastamentoForm(forms.ModelForm):
             'data_inicio': forms.DateInput(attrs={'type': 'date'}),
             'data_retorno': forms.DateInput(attrs={'type': 'date'}),
             'motivo': forms.Textarea(attrs={'rows': 3}),
+            'laudo': forms.ClearableFileInput(attrs={'data-upload-parcial': 'laudo_enviado'}),
         }
 
+    def __init__(self, empresa_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        restringir_uploads(self, empresa_id)
+
 class AcidenteTrabalhoForm(forms.ModelForm):
+    arquivo_enviado = UploadEnviadoField(destino=(AcidenteTrabalho, 'arquivo_evidencia'))
+
     class Meta:
         model = AcidenteTrabalho
         fields = ['data_acidente', 'hora_acidente', 'local', 'descricao_motivo', 'arquivo_evidencia']
@@ -260,4 +423,9 @@ class AcidenteTrabalhoForm(forms.ModelForm):
             'data_acidente': forms.DateInput(attrs={'type': 'date'}),
             'hora_acidente': forms.TimeInput(attrs={'type': 'time'}),
             'descricao_motivo': forms.Textarea(attrs={'rows': 3}),
-        }
\ No newline at end of file
+            'arquivo_evidencia': forms.ClearableFileInput(attrs={'data-upload-parcial': 'arquivo_enviado'}),
+        }
+
+    def __init__(self, empresa_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        restringir_uploads(self, empresa_id)
\ No newline at end of file
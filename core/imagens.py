@@ -0,0 +1,105 @@
+"""
+Miniaturas e versões web das fotos de inspeção.
+
+Foto de celular chega com 3-8 MB; o histórico mostra dezenas delas. Depois do upload
+(on_commit) a foto entra numa fila de threads do próprio processo, que grava uma
+miniatura de 320 px e uma versão de 1280 px em JPEG progressivo. O original fica
+intocado. Registros sem processado_em são pendentes: o comando processar_imagens
+os recupera (ex.: worker reiniciado no meio da fila ou fotos antigas).
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import cache_dados
+from .models import ArquivoInspecao, FotoInspecao
+from .paginacao import filtro_apos
+
+logger = logging.getLogger(__name__)
+
+# campo de destino -> (maior lado em px, qualidade JPEG)
+VARIANTES = {'miniatura': (320, 70), 'versao_web': (1280, 80)}
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+# Registros lidos por consulta em processar_pendentes
+TAMANHO_LOTE = 100
+
+# modelo -> campo do arquivo original
+ORIGINAIS = {FotoInspecao: 'imagem', ArquivoInspecao: 'arquivo'}
+
+_fila = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagens')
+
+
+def gerar_variantes(obj):
+    """Grava as variantes de um registro e marca processado_em (também para arquivos que não são imagem)"""
+    original = getattr(obj, ORIGINAIS[type(obj)])
+    atualizacao = {'processado_em': timezone.now()}
+    if os.path.splitext(original.name)[1].lower() in EXTENSOES_IMAGEM:
+        try:
+            with original.storage.open(original.name, 'rb') as arquivo:
+                imagem = ImageOps.exif_transpose(Image.open(arquivo))
+                imagem.load()
+        except (UnidentifiedImageError, OSError):
+            logger.warning("Imagem ilegível, mantendo só o original: %s", original.name)
+        else:
+            if imagem.mode not in ('RGB', 'L'):
+                imagem = imagem.convert('RGB')
+            base = os.path.splitext(os.path.basename(original.name))[0]
+            for campo, (lado, qualidade) in VARIANTES.items():
+                copia = imagem.copy()
+                copia.thumbnail((lado, lado), Image.LANCZOS)
+                buffer = BytesIO()
+                copia.save(buffer, format='JPEG', quality=qualidade, optimize=True, progressive=True)
+                getattr(obj, campo).save(f'{base}_{lado}.jpg', ContentFile(buffer.getvalue()), save=False)
+                atualizacao[campo] = getattr(obj, campo).name
+    type(obj).objects.filter(pk=obj.pk).update(**atualizacao)
+    obj.processado_em = atualizacao['processado_em']
+    # update() não dispara signals: o histórico passa a mostrar a miniatura, então muda o ETag
+    cache_dados.registrar_alteracao(cache_dados.empresa_de(obj), type(obj))
+
+
+def _processar(modelo, pk):
+    try:
+        obj = modelo.objects.filter(pk=pk, processado_em__isnull=True).first()
+        if obj:
+            gerar_variantes(obj)
+    except Exception:
+        logger.exception("Falha ao gerar variantes de %s %s", modelo.__name__, pk)
+    finally:
+        # A thread tem conexão própria com o banco; não deixar aberta
+        connections.close_all()
+
+
+def agendar(obj):
+    """Enfileira o registro para depois do commit (a foto já está gravada e visível para a thread)"""
+    if getattr(settings, 'IMAGENS_EM_SEGUNDO_PLANO', True):
+        transaction.on_commit(lambda: _fila.submit(_processar, type(obj), obj.pk))
+
+
+def processar_pendentes(limite=None):
+    """Processa, no processo atual, tudo que ainda não tem variantes. Retorna quantos registros
+
+    Lotes de TAMANHO_LOTE por keyset no pk, como nas exportações: sem cursores no servidor
+    (DISABLE_SERVER_SIDE_CURSORS) o iterator() traria todas as fotos pendentes de uma vez.
+    """
+    total = 0
+    for modelo in ORIGINAIS:
+        pendentes = modelo.objects.filter(processado_em__isnull=True).order_by('pk')
+        ultimo = None
+        while not limite or total < limite:
+            tamanho = min(TAMANHO_LOTE, limite - total) if limite else TAMANHO_LOTE
+            lote = pendentes if ultimo is None else pendentes.filter(filtro_apos(['pk'], [ultimo]))
+            lote = list(lote[:tamanho])
+            for obj in lote:
+                gerar_variantes(obj)
+                total += 1
+            if len(lote) < tamanho:
+                break
+            ultimo = lote[-1].pk
+    return total
@@ -0,0 +1,293 @@
+"""
+Importação em lote a partir de planilhas (CSV ou XLSX).
+
+As linhas são lidas em fluxo, validadas com consultas em lote (um dicionário por tabela
+de apoio) e gravadas com bulk_create em lotes dentro de uma única transação: se alguma
+linha tiver erro, nada é gravado e a lista de erros volta para quem chamou.
+"""
+import codecs
+import csv
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Min
+
+from .conformidade import atualizar_pendencias
+from .models import Advertencia, Funcionario, Setor, TipoAdvertencia, normalizar_cpf
+from . import cache_dados
+from . import resumo_advertencias
+
+TAMANHO_LOTE = 1000
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y')
+
+
+class ErroImportacao(Exception):
+    pass
+
+
+class _Desfazer(Exception):
+    """Sai da transação quando alguma linha tem erro"""
+
+
+class Resultado:
+    def __init__(self):
+        self.criados = 0
+        self.atualizados = 0
+        self.erros = []  # [(linha, mensagem)]
+
+    def erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+
+def _normalizar_cabecalho(valor):
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.strip().lower()).strip('_')
+
+
+def _ler_csv(arquivo):
+    texto = codecs.iterdecode(arquivo, 'utf-8-sig')
+    primeira = next(texto, '')
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    yield from csv.reader(chain([primeira], texto), delimiter=delimitador)
+
+
+def _ler_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroImportacao("Importação XLSX indisponível (openpyxl não instalado).")
+    planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    for linha in planilha.iter_rows(values_only=True):
+        yield ['' if valor is None else valor for valor in linha]
+
+
+def ler_planilha(arquivo, nome_arquivo):
+    """Gera (número da linha, {coluna normalizada: valor}) sem carregar o arquivo inteiro"""
+    extensao = os.path.splitext(nome_arquivo)[1].lower()
+    if extensao == '.csv':
+        linhas = _ler_csv(arquivo)
+    elif extensao == '.xlsx':
+        linhas = _ler_xlsx(arquivo)
+    else:
+        raise ErroImportacao("Formato não suportado. Envie um arquivo .csv ou .xlsx.")
+    cabecalho = [_normalizar_cabecalho(coluna) for coluna in next(linhas, [])]
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(str(valor).strip() for valor in valores):
+            continue
+        valores = list(valores) + [''] * (len(cabecalho) - len(valores))
+        yield numero, dict(zip(cabecalho, valores))
+
+
+def em_lotes(linhas, tamanho=TAMANHO_LOTE):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def texto(valor):
+    return str(valor).strip() if valor is not None else ''
+
+
+def somente_digitos(valor):
+    return re.sub(r'\D', '', texto(valor))
+
+
+def converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    valor = texto(valor)
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida: '{valor}'")
+
+
+# ADVERTÊNCIAS
+# Colunas: data, cpf (ou funcionario, pelo nome), motivo, detalhes (opcional)
+
+def travar_funcionarios(ids):
+    """Bloqueia as linhas dos funcionários até o fim da transação (ordem fixa evita deadlock)"""
+    list(Funcionario.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+
+def importar_advertencias(empresa, linhas):
+    resultado = Resultado()
+    funcionarios = Funcionario.objects.filter(empresa=empresa).values_list('pk', 'cpf', 'nome')
+    por_cpf, por_nome = {}, {}
+    for pk, cpf, nome in funcionarios:
+        por_cpf.setdefault(somente_digitos(cpf), pk)
+        por_nome.setdefault(nome.strip().lower(), pk)
+    tipos = {titulo.strip().lower(): pk for pk, titulo in
+             TipoAdvertencia.objects.filter(empresa=empresa).values_list('pk', 'titulo')}
+
+    registros = []
+    motivos_novos = {}
+    for numero, linha in linhas:
+        cpf = somente_digitos(linha.get('cpf'))
+        nome = texto(linha.get('funcionario') or linha.get('nome')).lower()
+        funcionario_id = por_cpf.get(cpf) if cpf else por_nome.get(nome)
+        if funcionario_id is None:
+            resultado.erro(numero, f"funcionário não encontrado ({cpf or nome or 'sem identificação'})")
+            continue
+        motivo = texto(linha.get('motivo') or linha.get('tipo'))
+        if not motivo:
+            resultado.erro(numero, "motivo não informado")
+            continue
+        try:
+            data_incidente = converter_data(linha.get('data') or linha.get('data_incidente'))
+        except ValueError as erro:
+            resultado.erro(numero, str(erro))
+            continue
+        if motivo.lower() not in tipos:
+            motivos_novos.setdefault(motivo.lower(), motivo)
+        registros.append((data_incidente, numero, funcionario_id, motivo.lower(), texto(linha.get('detalhes'))))
+
+    if resultado.erros:
+        return resultado
+
+    # Ordem cronológica: a primeira ocorrência de cada (funcionário, motivo) não é reincidência
+    registros.sort()
+    ids = {funcionario_id for _, _, funcionario_id, _, _ in registros}
+    with transaction.atomic():
+        travar_funcionarios(ids)
+        for tipo in TipoAdvertencia.objects.bulk_create(
+                [TipoAdvertencia(empresa=empresa, titulo=titulo) for titulo in motivos_novos.values()]):
+            tipos[tipo.titulo.lower()] = tipo.pk
+        # Primeira advertência já gravada de cada (funcionário, motivo): a reincidência vale
+        # sobre o histórico todo, em ordem de data, e não só sobre o que veio na planilha
+        primeiras = {
+            (funcionario_id, tipo_id): data for funcionario_id, tipo_id, data in
+            Advertencia.objects.filter(funcionario_id__in=ids).values('funcionario_id', 'tipo_id')
+            .annotate(primeira=Min('data_incidente')).values_list('funcionario_id', 'tipo_id', 'primeira')
+        }
+        vistos = set()
+        antecipados = defaultdict(list)  # tipo -> funcionários cuja primeira advertência veio na planilha
+        for data_incidente, _, funcionario_id, motivo, _ in registros:
+            par = (funcionario_id, tipos[motivo])
+            if par not in vistos and par in primeiras and data_incidente < primeiras[par]:
+                antecipados[par[1]].append(funcionario_id)
+            vistos.add(par)
+        # Antes dos novos registros entrarem: as já gravadas desses pares deixam de ser a primeira
+        for tipo_id, funcionario_ids in antecipados.items():
+            Advertencia.objects.filter(tipo_id=tipo_id, funcionario_id__in=funcionario_ids).update(reincidente=True)
+
+        vistos = set()
+        lote = []
+        for data_incidente, _, funcionario_id, motivo, detalhes in registros:
+            par = (funcionario_id, tipos[motivo])
+            # Mesma data de uma já gravada: a gravada conta como a primeira
+            anterior = par in vistos or (par in primeiras and primeiras[par] <= data_incidente)
+            lote.append(Advertencia(
+                empresa=empresa, funcionario_id=funcionario_id, tipo_id=par[1],
+                data_incidente=data_incidente, detalhes=detalhes, reincidente=anterior,
+            ))
+            vistos.add(par)
+            if len(lote) >= TAMANHO_LOTE:
+                Advertencia.objects.bulk_create(lote)
+                resultado.criados += len(lote)
+                lote = []
+        if lote:
+            Advertencia.objects.bulk_create(lote)
+            resultado.criados += len(lote)
+
+        # bulk_create não dispara os signals do resumo nem os da versão dos dados
+        resumo_advertencias.reconstruir(empresa.pk)
+        cache_dados.registrar_alteracao(empresa.pk, Advertencia, TipoAdvertencia)
+    return resultado
+
+
+# FUNCIONÁRIOS
+# Colunas: nome, cpf, cargo, data_admissao, setor, situacao (opcionais: setor, situacao, ativo)
+# O CPF identifica o funcionário na empresa: reimportar a planilha atualiza os cadastros.
+
+CAMPOS_OPCIONAIS_FUNCIONARIO = ('setor', 'situacao', 'ativo')
+VALORES_VERDADEIROS = {'1', 's', 'sim', 'true', 'x', 'ativo'}
+
+
+def _situacoes():
+    situacoes = {}
+    for codigo, rotulo in Funcionario.SITUACAO_CHOICES:
+        situacoes[codigo.lower()] = codigo
+        situacoes[_normalizar_cabecalho(rotulo)] = codigo
+    return situacoes
+
+
+def _gravar_funcionarios(empresa, lote, colunas, setores, situacoes, resultado):
+    por_cpf = {}
+    for numero, linha in lote:
+        cpf = normalizar_cpf(linha.get('cpf'))
+        nome, cargo = texto(linha.get('nome')), texto(linha.get('cargo'))
+        if len(cpf) != 11:
+            resultado.erro(numero, f"CPF inválido: '{texto(linha.get('cpf'))}'")
+            continue
+        if not nome or not cargo:
+            resultado.erro(numero, "nome e cargo são obrigatórios")
+            continue
+        try:
+            data_admissao = converter_data(linha.get('data_admissao') or linha.get('admissao'))
+        except ValueError as erro:
+            resultado.erro(numero, str(erro))
+            continue
+        funcionario = Funcionario(empresa=empresa, cpf=cpf, nome=nome, cargo=cargo, data_admissao=data_admissao)
+
+        if 'setor' in colunas:
+            setor = texto(linha.get('setor'))
+            if setor and setor.lower() not in setores:
+                setores[setor.lower()] = Setor.objects.create(empresa=empresa, nome=setor).pk
+            funcionario.setor_id = setores.get(setor.lower())
+        if 'situacao' in colunas:
+            situacao = texto(linha.get('situacao'))
+            if situacao:
+                if _normalizar_cabecalho(situacao) not in situacoes:
+                    resultado.erro(numero, f"situação desconhecida: '{situacao}'")
+                    continue
+                funcionario.situacao = situacoes[_normalizar_cabecalho(situacao)]
+        if 'ativo' in colunas:
+            funcionario.ativo = texto(linha.get('ativo')).lower() in VALORES_VERDADEIROS
+        # CPF repetido na planilha: vale a última linha
+        por_cpf[cpf] = funcionario
+
+    if resultado.erros or not por_cpf:
+        return
+    existentes = set(Funcionario.objects.filter(empresa=empresa, cpf__in=por_cpf).values_list('cpf', flat=True))
+    Funcionario.objects.bulk_create(
+        por_cpf.values(), update_conflicts=True, unique_fields=['empresa', 'cpf'],
+        update_fields=['nome', 'cargo', 'data_admissao', 'atualizado_em', *colunas],
+    )
+    resultado.atualizados += len(existentes)
+    resultado.criados += len(por_cpf) - len(existentes)
+
+
+def importar_funcionarios(empresa, linhas):
+    resultado = Resultado()
+    setores = {nome.strip().lower(): pk for pk, nome in Setor.objects.filter(empresa=empresa).values_list('pk', 'nome')}
+    situacoes = _situacoes()
+    try:
+        with transaction.atomic():
+            for lote in em_lotes(linhas):
+                colunas = [campo for campo in CAMPOS_OPCIONAIS_FUNCIONARIO if campo in lote[0][1]]
+                _gravar_funcionarios(empresa, lote, colunas, setores, situacoes, resultado)
+            if resultado.erros:
+                raise _Desfazer
+    except _Desfazer:
+        resultado.criados = resultado.atualizados = 0
+        return resultado
+
+    # bulk_create não dispara os signals: recalcula a conformidade da empresa de uma vez
+    atualizar_pendencias(empresa.pk)
+    cache_dados.registrar_alteracao(empresa.pk, Funcionario, Setor)
+    return resultado
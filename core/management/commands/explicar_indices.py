@@ -0,0 +1,138 @@
+import random
+import uuid
+from datetime import date, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import (
+    Empresa, Funcionario, Localizacao, TipoAdvertencia, Advertencia,
+    Extintor, InspecaoExtintor, Equipamento
+)
+
+
+# Sem conseguir a trava logo (tabela em uso), desiste em vez de enfileirar o tráfego atrás dela
+ESPERA_TRAVA = '2s'
+
+
+class Command(BaseCommand):
+    help = 'Semeia dados fictícios e mostra o EXPLAIN das consultas das views com e sem os índices compostos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresas', type=int, default=20, help='Quantidade de empresas fictícias')
+        parser.add_argument('--por-empresa', type=int, default=500, help='Registros de cada tabela por empresa')
+        parser.add_argument('--sem-indices', action='store_true',
+                            help='Compara com os planos sem os índices compostos (apaga-os dentro da transação)')
+        parser.add_argument('--confirmo', action='store_true',
+                            help='Obrigatório com --sem-indices: o DROP INDEX trava as tabelas até o fim do comando')
+
+    def handle(self, *args, **options):
+        sem_indices = options['sem_indices']
+        if sem_indices:
+            self.checar_remocao(options['confirmo'])
+        # Tudo roda dentro de uma transação desfeita no final: nada fica gravado no banco
+        with transaction.atomic():
+            empresa, extintor = self.semear(options['empresas'], options['por_empresa'])
+            self.analisar()
+            depois = self.planos(empresa, extintor)
+
+            antes = {}
+            if sem_indices:
+                self.remover_indices()
+                self.analisar()
+                antes = self.planos(empresa, extintor)
+
+            for titulo in depois:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {titulo}'))
+                if sem_indices:
+                    self.stdout.write(self.style.WARNING('-- ANTES (só índices de FK)'))
+                    self.stdout.write(antes[titulo])
+                self.stdout.write(self.style.SUCCESS('-- DEPOIS (índices compostos)'))
+                self.stdout.write(depois[titulo])
+            transaction.set_rollback(True)
+
+    def checar_remocao(self, confirmo):
+        """Apagar índices, mesmo numa transação desfeita, trava (ACCESS EXCLUSIVE) as tabelas do core"""
+        if connection.vendor == 'sqlite':
+            return
+        if not settings.DEBUG:
+            raise CommandError('--sem-indices não roda com DEBUG=False: use um banco de desenvolvimento.')
+        if not confirmo:
+            raise CommandError(
+                f'--sem-indices apaga os índices das tabelas do core em {connection.settings_dict["HOST"] or "localhost"}'
+                f'/{connection.settings_dict["NAME"]} e as mantém travadas até o fim do comando. '
+                'Use um banco de desenvolvimento e repita com --confirmo.'
+            )
+
+    def semear(self, qtd_empresas, por_empresa):
+        hoje = date.today()
+        rnd = random.Random(42)
+        for _ in range(qtd_empresas):
+            empresa = Empresa.objects.create(
+                nome_fantasia='EXPLAIN', razao_social='EXPLAIN', cnpj=uuid.uuid4().hex[:18],
+                telefone='-', email_contato='explain@example.com', endereco='-'
+            )
+            local = Localizacao.objects.create(empresa=empresa, nome='Galpão')
+            tipo_adv = TipoAdvertencia.objects.create(empresa=empresa, titulo='Atraso')
+            funcionarios = Funcionario.objects.bulk_create([
+                Funcionario(empresa=empresa, nome=f'Funcionário {i}', cpf=f'{i:011d}', cargo='Operador',
+                            data_admissao=hoje - timedelta(days=rnd.randint(0, 3000)), ativo=rnd.random() > 0.1)
+                for i in range(por_empresa)
+            ])
+            Advertencia.objects.bulk_create([
+                Advertencia(empresa=empresa, funcionario=rnd.choice(funcionarios), tipo=tipo_adv,
+                            data_incidente=hoje - timedelta(days=rnd.randint(0, 1500)))
+                for _ in range(por_empresa)
+            ])
+            extintores = Extintor.objects.bulk_create([
+                Extintor(empresa=empresa, codigo_patrimonial=f'EXT-{i:05d}', numero_serie=str(i), classe='ABC',
+                         agente='PQS', capacidade=6, localizacao=local, classe_risco='Leve',
+                         data_ultima_manutencao=hoje - timedelta(days=rnd.randint(0, 365)),
+                         data_proxima_manutencao=hoje + timedelta(days=rnd.randint(-30, 365)),
+                         data_teste_hidrostatico=hoje + timedelta(days=rnd.randint(0, 1800)),
+                         situacao=rnd.choice(['ATIVO'] * 8 + ['MANUTENCAO', 'RESERVA']), altura_instalacao=1.6)
+                for i in range(por_empresa)
+            ])
+            InspecaoExtintor.objects.bulk_create([
+                InspecaoExtintor(extintor=ext, responsavel='EXPLAIN', data_inspecao=hoje - timedelta(days=30 * m))
+                for ext in extintores for m in range(6)
+            ])
+            Equipamento.objects.bulk_create([
+                Equipamento(empresa=empresa, tipo=rnd.choice(Equipamento.TIPOS_EQUIPAMENTO)[0], nome=f'Equip {i}',
+                            localizacao=local, data_validade=hoje + timedelta(days=rnd.randint(-30, 365)))
+                for i in range(por_empresa)
+            ])
+        return empresa, extintores[0]
+
+    def planos(self, empresa, extintor):
+        hoje = date.today()
+        consultas = {
+            'dashboard_extintores: situacao': Extintor.objects.filter(empresa=empresa, situacao='ATIVO'),
+            'dashboard_extintores: recarga em 30 dias': Extintor.objects.filter(
+                empresa=empresa, data_proxima_manutencao__range=(hoje, hoje + timedelta(days=30))),
+            'exportar_extintores: ordem patrimonial': Extintor.objects.filter(empresa=empresa).order_by('codigo_patrimonial'),
+            'historico_extintor: inspeções': InspecaoExtintor.objects.filter(extintor=extintor).order_by('-data_inspecao'),
+            'dashboard_advertencias: por data': Advertencia.objects.filter(empresa=empresa).order_by('-data_incidente'),
+            'AdvertenciaForm: funcionários ativos': Funcionario.objects.filter(empresa=empresa, ativo=True),
+            'exportar_funcionarios: por nome': Funcionario.objects.filter(empresa=empresa).order_by('nome'),
+            'dashboard_equipamentos: tipo': Equipamento.objects.filter(empresa=empresa, tipo='HIDRANTE'),
+        }
+        return {titulo: qs.explain() for titulo, qs in consultas.items()}
+
+    def analisar(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def remover_indices(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"SET LOCAL lock_timeout = '{ESPERA_TRAVA}'")
+            for model in apps.get_app_config('core').get_models():
+                for index in model._meta.indexes:
+                    cursor.execute(editor.sql_delete_index % {
+                        'name': editor.quote_name(index.name),
+                        'table': editor.quote_name(model._meta.db_table),
+                    })
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.estoque import fechar_saldos
+from core.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Grava o fechamento mensal do estoque de EPIs (saldo e consumo por mês) dos meses já encerrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de uma empresa específica')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.all()
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+        for empresa in empresas:
+            meses = fechar_saldos(empresa.pk)
+            if meses:
+                self.stdout.write(f'{empresa.nome_fantasia}: {meses} mês(es) fechado(s)')
+        self.stdout.write(self.style.SUCCESS('Fechamento de estoque concluído.'))
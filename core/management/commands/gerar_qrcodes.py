@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Empresa
+from core.qrcodes import endereco_base, gerar_em_lote
+
+
+class Command(BaseCommand):
+    help = 'Gera (em paralelo) os QR Codes que faltam ou estão desatualizados nas etiquetas de extintores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de uma empresa específica')
+        parser.add_argument('--base-url', default=None, help='Endereço público do sistema (padrão: SITE_URL)')
+        parser.add_argument('--processos', type=int, default=None, help='Tamanho do pool (padrão: nº de CPUs)')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'] or endereco_base()
+        if not base_url:
+            raise CommandError('Informe --base-url ou configure SITE_URL.')
+        empresas = Empresa.objects.all()
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+        for empresa in empresas:
+            gerados = gerar_em_lote(empresa.pk, base_url, processos=options['processos'])
+            if gerados:
+                self.stdout.write(f'{empresa.nome_fantasia}: {gerados} QR Code(s) gerado(s)')
+        self.stdout.write(self.style.SUCCESS('QR Codes atualizados.'))
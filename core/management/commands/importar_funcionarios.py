@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacao import ErroImportacao, importar_funcionarios, ler_planilha
+from core.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Importa funcionários de uma planilha (.csv ou .xlsx); CPFs já cadastrados são atualizados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho da planilha')
+        parser.add_argument('--empresa', type=int, required=True, help='ID da empresa')
+
+    def handle(self, *args, **options):
+        try:
+            empresa = Empresa.objects.get(pk=options['empresa'])
+        except Empresa.DoesNotExist:
+            raise CommandError(f"Empresa {options['empresa']} não encontrada")
+        with open(options['arquivo'], 'rb') as arquivo:
+            try:
+                resultado = importar_funcionarios(empresa, ler_planilha(arquivo, options['arquivo']))
+            except ErroImportacao as erro:
+                raise CommandError(str(erro))
+        if resultado.erros:
+            for linha, mensagem in resultado.erros:
+                self.stderr.write(f'Linha {linha}: {mensagem}')
+            raise CommandError(f'{len(resultado.erros)} linha(s) com erro; nada foi importado.')
+        self.stdout.write(self.style.SUCCESS(f'{resultado.criados} funcionário(s) criado(s), {resultado.atualizados} atualizado(s).'))
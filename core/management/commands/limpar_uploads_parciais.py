@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import VALIDADE, limpar_expirados
+
+
+class Command(BaseCommand):
+    help = 'Apaga uploads em partes que não viraram anexo dentro do prazo (rodar diariamente via cron)'
+
+    def handle(self, *args, **options):
+        total = limpar_expirados()
+        self.stdout.write(self.style.SUCCESS(f'{total} upload(s) com mais de {VALIDADE} removido(s).'))
@@ -0,0 +1,86 @@
+"""
+Latência por requisição sem e com reaproveitamento de conexão com o banco.
+
+Cada "requisição" segue o ciclo que o Django aplica às conexões: request_started,
+algumas consultas curtas (sessão, usuário, perfil numa página típica) e request_finished,
+onde a conexão é fechada ou mantida conforme CONN_MAX_AGE. A primeira rodada usa
+CONN_MAX_AGE=0 (uma conexão nova por requisição, o comportamento antigo); a segunda usa
+o que está em settings.DATABASES.
+
+Para medir sem depender da WAN, suba um pgbouncer local em modo transação (pool_mode =
+transaction) na frente de um Postgres e aponte as variáveis para ele:
+
+    DB_HOST=127.0.0.1 DB_PORT=6432 DB_SSLMODE=disable python manage.py medir_conexoes
+
+Com DB_SSLMODE=require contra o pooler do Supabase a diferença inclui o handshake TLS.
+"""
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Compara a latência por requisição com CONN_MAX_AGE=0 e com a configuração atual do banco'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=200)
+        parser.add_argument('--consultas', type=int, default=3, help='Consultas por requisição')
+        parser.add_argument('--banco', default='default')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def _rodada(self, conexao, requisicoes, consultas):
+        tempos = []
+        for _ in range(requisicoes):
+            inicio = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            with conexao.cursor() as cursor:
+                for _ in range(consultas):
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        conexao.close()
+        return tempos
+
+    def _resumo(self, tempos):
+        return {
+            'media_ms': round(statistics.fmean(tempos), 2),
+            'p50_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(statistics.quantiles(tempos, n=20)[18], 2) if len(tempos) > 1 else round(tempos[0], 2),
+            'max_ms': round(max(tempos), 2),
+        }
+
+    def handle(self, *args, **options):
+        conexao = connections[options['banco']]
+        configuracao = conexao.settings_dict
+        original = configuracao['CONN_MAX_AGE'], dict(configuracao.get('OPTIONS', {}))
+        conexao.close()
+
+        resultado = {'vendor': conexao.vendor, 'host': configuracao.get('HOST') or '', 'requisicoes': options['requisicoes']}
+        try:
+            # Antes: conexão nova a cada requisição, sem pool
+            configuracao['CONN_MAX_AGE'] = 0
+            configuracao['OPTIONS'] = {k: v for k, v in original[1].items() if k != 'pool'}
+            resultado['antes'] = self._resumo(self._rodada(conexao, options['requisicoes'], options['consultas']))
+        finally:
+            configuracao['CONN_MAX_AGE'], configuracao['OPTIONS'] = original
+
+        resultado['depois'] = self._resumo(self._rodada(conexao, options['requisicoes'], options['consultas']))
+        resultado['depois']['modo'] = 'pool' if 'pool' in original[1] else f'CONN_MAX_AGE={original[0]}'
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+            return
+        self.stdout.write(f"{resultado['vendor']} {resultado['host']} - {resultado['requisicoes']} requisições")
+        for rodada in ('antes', 'depois'):
+            dados = resultado[rodada]
+            self.stdout.write(
+                f"{rodada:>6}: média {dados['media_ms']} ms | p50 {dados['p50_ms']} ms | "
+                f"p95 {dados['p95_ms']} ms | máx {dados['max_ms']} ms"
+            )
+        ganho = resultado['antes']['p50_ms'] - resultado['depois']['p50_ms']
+        self.stdout.write(self.style.SUCCESS(f"p50 {ganho:.2f} ms menor por requisição ({resultado['depois']['modo']})"))
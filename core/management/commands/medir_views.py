@@ -0,0 +1,333 @@
+"""
+Mede todas as views GET de saas_sst/urls.py com empresas fictícias de vários tamanhos.
+
+Para cada tamanho (padrão 100, 1.000 e 10.000 funcionários e extintores) uma empresa é
+semeada com bulk_create e cada rota é chamada pelo test client com um usuário dela:
+consultas ao banco, tempo e tamanho da resposta vão para um relatório JSON. Como em
+explicar_indices, tudo roda numa transação desfeita no final, com MEDIA_ROOT temporário
+e caches em memória só do comando: nada fica gravado nem contamina o cache real.
+
+Uma view que passa do orçamento de consultas, ou cujas consultas crescem com o tamanho
+da empresa (N+1), aparece marcada. Os dois critérios valem para a primeira requisição,
+com os caches vazios (`consultas`), e para a repetida, com eles cheios (`consultas_repetida`):
+o cache de um dashboard não pode esconder um N+1 de quem o preenche. Com --estrito o
+comando termina com erro, para rodar em CI:
+
+    python manage.py medir_views --tamanhos 100,1000 --saida medicoes.json --estrito
+
+Os mesmos critérios rodam em core/tests.py (manage.py test core) com empresas pequenas.
+"""
+import json
+import logging
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import date, timedelta
+from fnmatch import fnmatch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from core import resumo_advertencias
+from core.conformidade import atualizar_pendencias
+from core.models import (
+    EPI, Advertencia, ControleVacina, Empresa, EntregaEPI, Equipamento, Extintor, Funcionario,
+    InspecaoEquipamento, InspecaoExtintor, Localizacao, PerfilUsuario, Setor, TipoAdvertencia, TipoEPI,
+    TreinamentoFuncionario, Vacina
+)
+
+ORCAMENTO_PADRAO = 20
+# Views que legitimamente precisam de mais consultas que o padrão
+ORCAMENTOS = {}
+# Diferença de consultas entre o menor e o maior tamanho aceita antes de acusar N+1
+FOLGA_CRESCIMENTO = 2
+# Requisições conferidas: (campo da medição, nome no relatório)
+CRITERIOS = [('consultas', 'primeira requisição'), ('consultas_repetida', 'requisição repetida')]
+
+# Rotas que não fazem sentido num GET medido: sem página, destrutivas ou com parâmetro sem modelo
+IGNORADAS = {
+    'logout': 'encerra a sessão do cliente',
+    'servir_midia': 'depende de um arquivo enviado',
+    'parte_upload': 'depende de um upload iniciado',
+}
+
+# Parâmetro da URL -> modelo do registro de exemplo
+PARAMETROS = {'func_id': Funcionario, 'extintor_id': Extintor}
+# <pk> pelo primeiro trecho da rota, com exceções pelo nome da view
+PK_POR_PREFIXO = {
+    'funcionarios': Funcionario, 'estoque': EPI, 'advertencias': Advertencia,
+    'extintores': Extintor, 'equipamentos': Equipamento,
+}
+PK_POR_VIEW = {'devolver_epi_func': EntregaEPI}
+
+
+def rotas():
+    """[(nome, URLPattern, rota)] de saas_sst/urls.py, sem includes (admin)"""
+    for padrao in get_resolver().url_patterns:
+        if isinstance(padrao, URLPattern) and padrao.name:
+            yield padrao.name, padrao, str(padrao.pattern)
+
+
+def isolamento(midia):
+    """MEDIA_ROOT temporário, caches em memória só da medição e nenhuma thread de imagens"""
+    return override_settings(
+        MEDIA_ROOT=midia, UPLOADS_PARCIAIS_DIR=f'{midia}/parciais', IMAGENS_EM_SEGUNDO_PLANO=False,
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        CACHES={alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': f'medir_views_{alias}'} for alias in settings.CACHES},
+    )
+
+
+def url_exemplo(nome, padrao, rota, exemplos):
+    """URL da rota com os registros de exemplo da empresa semeada, ou None se não há como montá-la"""
+    argumentos = {}
+    for parametro in padrao.pattern.converters:
+        if parametro == 'pk':
+            modelo = PK_POR_VIEW.get(nome) or PK_POR_PREFIXO.get(rota.split('/', 1)[0])
+        else:
+            modelo = PARAMETROS.get(parametro)
+        if modelo is None:
+            return None
+        argumentos[parametro] = exemplos[modelo]
+    return reverse(nome, kwargs=argumentos)
+
+
+class Command(BaseCommand):
+    help = 'Mede consultas, tempo e tamanho da resposta de cada view com empresas de 100 a 10.000 registros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', default='100,1000,10000',
+                            help='Funcionários e extintores por empresa, separados por vírgula')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Requisições por view e tamanho')
+        parser.add_argument('--views', default='*', help='Padrões (fnmatch) dos nomes de rota, separados por vírgula')
+        parser.add_argument('--orcamento', type=int, default=ORCAMENTO_PADRAO,
+                            help='Máximo de consultas por requisição (exceto ORCAMENTOS)')
+        parser.add_argument('--saida', help='Arquivo para o relatório JSON')
+        parser.add_argument('--json', action='store_true', help='Relatório JSON na saída padrão')
+        parser.add_argument('--estrito', action='store_true', help='Falha se alguma view estourar o orçamento ou crescer')
+
+    def handle(self, *args, **options):
+        try:
+            tamanhos = sorted({int(t) for t in options['tamanhos'].split(',') if t.strip()})
+        except ValueError:
+            raise CommandError('--tamanhos deve ser uma lista de inteiros, ex.: 100,1000')
+        if not tamanhos or options['repeticoes'] < 1:
+            raise CommandError('Informe ao menos um tamanho e uma repetição.')
+        padroes = [p.strip() for p in options['views'].split(',') if p.strip()]
+
+        midia = tempfile.mkdtemp(prefix='medir_views_')
+        medicoes = []
+        # 404/405 das rotas só-POST são esperados aqui; sem eles no log o relatório fica legível
+        logging.disable(logging.WARNING)
+        try:
+            with isolamento(midia), transaction.atomic():
+                for tamanho in tamanhos:
+                    inicio = time.perf_counter()
+                    usuario, exemplos = self.semear(tamanho)
+                    self.stderr.write(f'{tamanho}: semeado em {time.perf_counter() - inicio:.1f} s')
+                    medicoes += self.medir(usuario, exemplos, tamanho, padroes, options)
+                transaction.set_rollback(True)
+        finally:
+            logging.disable(logging.NOTSET)
+            shutil.rmtree(midia, ignore_errors=True)
+
+        relatorio = self.relatorio(medicoes, tamanhos, options)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        if options['json']:
+            self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        else:
+            self.tabela(relatorio, tamanhos)
+
+        if options['estrito'] and relatorio['problemas']:
+            raise CommandError(f"{len(relatorio['problemas'])} view(s) fora do orçamento de consultas.")
+
+    # --- DADOS ---
+
+    def semear(self, n):
+        """Empresa com n funcionários e n extintores e o prontuário/histórico ao redor deles"""
+        hoje = date.today()
+        empresa = Empresa.objects.create(
+            nome_fantasia=f'Medição {n}', razao_social=f'Medição {n}', cnpj=uuid.uuid4().hex[:18],
+            telefone='-', email_contato='medicao@example.com', endereco='-',
+        )
+        usuario = User.objects.create_user(f'medir_views_{uuid.uuid4().hex[:12]}')
+        PerfilUsuario.objects.create(usuario=usuario, empresa=empresa, is_admin=True)
+
+        tipos_epi = TipoEPI.objects.bulk_create([TipoEPI(empresa=empresa, nome=f'Tipo {i}') for i in range(5)])
+        vacinas = Vacina.objects.bulk_create([
+            Vacina(empresa=empresa, nome=f'Vacina {i}', meses_reforco=12 * i) for i in range(3)
+        ])
+        setores = Setor.objects.bulk_create([Setor(empresa=empresa, nome=f'Setor {i}') for i in range(10)])
+        for setor in setores[:3]:
+            # Alguns setores com exigências, para o painel de conformidade ter pendências
+            setor.vacinas_padrao.set(vacinas)
+            setor.epis_obrigatorios.set(tipos_epi[:2])
+        locais = Localizacao.objects.bulk_create([Localizacao(empresa=empresa, nome=f'Local {i}') for i in range(20)])
+        tipos_adv = TipoAdvertencia.objects.bulk_create([
+            TipoAdvertencia(empresa=empresa, titulo=f'Motivo {i}') for i in range(4)
+        ])
+
+        funcionarios = Funcionario.objects.bulk_create([
+            Funcionario(empresa=empresa, nome=f'Funcionário {i:05d}', cpf=f'{n % 1000:03d}{i:08d}', cargo='Operador',
+                        setor=setores[i % len(setores)], data_admissao=hoje - timedelta(days=i % 3000))
+            for i in range(n)
+        ], batch_size=1000)
+        epis = EPI.objects.bulk_create([
+            EPI(empresa=empresa, tipo=tipos_epi[i % len(tipos_epi)], local=locais[i % len(locais)],
+                codigo_unico=f'EPI-{i:05d}', tamanho='M', ca=f'{10000 + i}', quantidade=50,
+                data_validade=hoje + timedelta(days=(i * 7) % 700 - 30))
+            for i in range(max(10, n // 10))
+        ], batch_size=1000)
+        EntregaEPI.objects.bulk_create([
+            EntregaEPI(funcionario=f, epi=epis[i % len(epis)], data_entrega=hoje - timedelta(days=i % 365),
+                       ca_registrado=epis[i % len(epis)].ca, validade_ca=epis[i % len(epis)].data_validade)
+            for i, f in enumerate(funcionarios)
+        ], batch_size=1000)
+        ControleVacina.objects.bulk_create([
+            ControleVacina(funcionario=f, vacina=vacinas[i % len(vacinas)], data_aplicacao=hoje - timedelta(days=i % 700))
+            for i, f in enumerate(funcionarios)
+        ], batch_size=1000)
+        TreinamentoFuncionario.objects.bulk_create([
+            TreinamentoFuncionario(funcionario=f, nome_treinamento='NR-35', data_realizacao=hoje - timedelta(days=400),
+                                   data_validade=hoje + timedelta(days=(i % 60) - 30))
+            for i, f in enumerate(funcionarios)
+        ], batch_size=1000)
+        Advertencia.objects.bulk_create([
+            Advertencia(empresa=empresa, funcionario=funcionarios[(i * 7) % n], tipo=tipos_adv[i % len(tipos_adv)],
+                        data_incidente=hoje - timedelta(days=i % 730))
+            for i in range(max(1, n // 5))
+        ], batch_size=1000)
+
+        extintores = Extintor.objects.bulk_create([
+            Extintor(empresa=empresa, codigo_patrimonial=f'EXT-{i:05d}', numero_serie=str(i), classe='ABC',
+                     agente='PQS', capacidade=6, localizacao=locais[i % len(locais)], classe_risco='Leve',
+                     data_ultima_manutencao=hoje - timedelta(days=i % 365),
+                     data_proxima_manutencao=hoje + timedelta(days=i % 365 - 30),
+                     data_teste_hidrostatico=hoje + timedelta(days=i % 1800),
+                     ultima_inspecao=hoje - timedelta(days=i % 60) if i % 3 else None, altura_instalacao=1.6)
+            for i in range(n)
+        ], batch_size=1000)
+        InspecaoExtintor.objects.bulk_create([
+            InspecaoExtintor(extintor=ext, responsavel='Medição', data_inspecao=ext.ultima_inspecao)
+            for ext in extintores if ext.ultima_inspecao
+        ], batch_size=1000)
+        equipamentos = Equipamento.objects.bulk_create([
+            Equipamento(empresa=empresa, tipo=Equipamento.TIPOS_EQUIPAMENTO[i % 7][0], nome=f'Equip {i:05d}',
+                        localizacao=locais[i % len(locais)], data_validade=hoje + timedelta(days=i % 400 - 30))
+            for i in range(max(10, n // 10))
+        ], batch_size=1000)
+        InspecaoEquipamento.objects.bulk_create([
+            InspecaoEquipamento(equipamento=eq, responsavel='Medição', data_inspecao=hoje - timedelta(days=30 * m))
+            for eq in equipamentos for m in range(3)
+        ], batch_size=1000)
+
+        # bulk_create não dispara os signals que mantêm os agregados
+        atualizar_pendencias(empresa.pk)
+        resumo_advertencias.reconstruir(empresa.pk)
+
+        exemplos = {
+            Funcionario: funcionarios[0].pk, Extintor: extintores[0].pk, Equipamento: equipamentos[0].pk,
+            EPI: epis[0].pk, Advertencia: Advertencia.objects.filter(empresa=empresa).values_list('pk', flat=True).first(),
+            EntregaEPI: EntregaEPI.objects.filter(funcionario=funcionarios[0]).values_list('pk', flat=True).first(),
+        }
+        return usuario, exemplos
+
+    # --- MEDIÇÃO ---
+
+    def medir(self, usuario, exemplos, tamanho, padroes, options):
+        cliente = Client(raise_request_exception=False)
+        cliente.force_login(usuario)
+        medicoes, vistas = [], set()
+        for nome, padrao, rota in rotas():
+            if nome in vistas or not any(fnmatch(nome, p) for p in padroes):
+                continue
+            vistas.add(nome)
+            url = None if nome in IGNORADAS else url_exemplo(nome, padrao, rota, exemplos)
+            if url is None:
+                medicoes.append({'view': nome, 'tamanho': tamanho,
+                                 'ignorada': IGNORADAS.get(nome, 'parâmetro da rota sem registro de exemplo')})
+                continue
+
+            # Primeira requisição sempre com o cache vazio; as seguintes mostram o efeito dele
+            for cache in caches.all():
+                cache.clear()
+            tempos, consultas, status, tamanho_resposta = [], [], None, 0
+            for _ in range(options['repeticoes']):
+                with ExitStack() as pilha:
+                    capturas = [pilha.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    inicio = time.perf_counter()
+                    resposta = cliente.get(url)
+                    corpo = b''.join(resposta.streaming_content) if resposta.streaming else resposta.content
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                consultas.append(sum(len(captura) for captura in capturas))
+                status, tamanho_resposta = resposta.status_code, len(corpo)
+
+            orcamento = ORCAMENTOS.get(nome, options['orcamento'])
+            repetidas = tempos[1:] or tempos
+            medicoes.append({
+                'view': nome, 'url': url, 'tamanho': tamanho, 'status': status,
+                'consultas': consultas[0], 'consultas_repetida': consultas[-1], 'orcamento': orcamento,
+                'primeira_ms': round(tempos[0], 2), 'mediana_ms': round(statistics.median(repetidas), 2),
+                'max_ms': round(max(repetidas), 2), 'bytes': tamanho_resposta,
+            })
+        return medicoes
+
+    # --- RELATÓRIO ---
+
+    def relatorio(self, medicoes, tamanhos, options):
+        problemas = []
+        por_view = {}
+        for medicao in medicoes:
+            if 'ignorada' in medicao:
+                continue
+            por_view.setdefault(medicao['view'], []).append(medicao)
+            for campo, requisicao in CRITERIOS:
+                if medicao[campo] > medicao['orcamento']:
+                    problemas.append({'view': medicao['view'], 'tamanho': medicao['tamanho'], 'motivo':
+                                      f"{medicao[campo]} consultas na {requisicao} (orçamento {medicao['orcamento']})"})
+            if medicao['status'] >= 500:
+                problemas.append({'view': medicao['view'], 'tamanho': medicao['tamanho'],
+                                  'motivo': f"status {medicao['status']}"})
+        for view, lista in por_view.items():
+            for campo, requisicao in CRITERIOS:
+                menor, maior = lista[0][campo], lista[-1][campo]
+                if len(lista) > 1 and maior - menor > FOLGA_CRESCIMENTO:
+                    problemas.append({'view': view, 'tamanho': lista[-1]['tamanho'], 'motivo':
+                                      f'consultas na {requisicao} crescem com a empresa ({menor} -> {maior}): provável N+1'})
+        return {
+            'gerado_em': timezone.now().isoformat(), 'banco': connection.vendor,
+            'tamanhos': tamanhos, 'repeticoes': options['repeticoes'],
+            'medicoes': medicoes, 'problemas': problemas,
+        }
+
+    def tabela(self, relatorio, tamanhos):
+        linhas = {}
+        for medicao in relatorio['medicoes']:
+            linhas.setdefault(medicao['view'], {})[medicao['tamanho']] = medicao
+        self.stdout.write(f"{'view':<28}" + ''.join(f'{t:>26}' for t in tamanhos))
+        self.stdout.write(f"{'':<28}" + ''.join(f"{'consultas/ms/KB':>26}" for _ in tamanhos))
+        for view, por_tamanho in linhas.items():
+            celulas = []
+            for tamanho in tamanhos:
+                medicao = por_tamanho.get(tamanho)
+                if medicao is None or 'ignorada' in medicao:
+                    celulas.append(f"{'-':>26}")
+                else:
+                    celulas.append(f"{medicao['consultas']:>8} {medicao['mediana_ms']:>9.1f} {medicao['bytes'] / 1024:>7.1f}")
+            self.stdout.write(f'{view:<28}' + ''.join(celulas))
+        for problema in relatorio['problemas']:
+            self.stdout.write(self.style.ERROR(f"{problema['view']} ({problema['tamanho']}): {problema['motivo']}"))
+        if not relatorio['problemas']:
+            self.stdout.write(self.style.SUCCESS('Todas as views dentro do orçamento de consultas.'))
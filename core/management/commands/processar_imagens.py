@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.imagens import processar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Gera miniaturas e versões web das fotos de inspeção que ainda não foram processadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, help='Máximo de registros nesta execução')
+
+    def handle(self, *args, **options):
+        total = processar_pendentes(limite=options['limite'])
+        self.stdout.write(self.style.SUCCESS(f'{total} arquivo(s) processado(s).'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.conformidade import atualizar_pendencias
+from core.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a matriz de conformidade (exigências do setor x prontuário) de todas as empresas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de uma empresa específica')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.filter(ativo=True)
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+        for empresa in empresas:
+            total = atualizar_pendencias(empresa.pk)
+            self.stdout.write(f'{empresa.nome_fantasia}: {total} pendência(s)')
+        self.stdout.write(self.style.SUCCESS('Conformidade recalculada.'))
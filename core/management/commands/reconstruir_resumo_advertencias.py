@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Empresa
+from core.resumo_advertencias import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela de resumo das advertências (empresa, mês, setor, motivo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de uma empresa específica')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.all()
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+        for empresa in empresas:
+            reconstruir(empresa.pk)
+            self.stdout.write(f'{empresa.nome_fantasia}: resumo recalculado')
+        self.stdout.write(self.style.SUCCESS('Resumo de advertências atualizado.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Vencimento
+from core.vencimentos import JANELA_AVISO, varrer_vencimentos
+
+
+class Command(BaseCommand):
+    help = 'Varre vencimentos (vacinas, treinamentos, EPIs, extintores e equipamentos) de todas as empresas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completa', action='store_true', help="Ignora a marca d'água e reprocessa tudo")
+        parser.add_argument('--dias', type=int, default=JANELA_AVISO, help='Janela de aviso em dias')
+
+    def handle(self, *args, **options):
+        resultado = varrer_vencimentos(completa=options['completa'], janela_dias=options['dias'])
+        nomes = dict(Vencimento.ORIGENS)
+        for origem, (gravados, removidos) in resultado.items():
+            self.stdout.write(f'{nomes[origem]}: {gravados} alerta(s) gravado(s), {removidos} removido(s)')
+        self.stdout.write(self.style.SUCCESS('Varredura concluída.'))
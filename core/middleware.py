@@ -0,0 +1,132 @@
+import time
+from fnmatch import fnmatch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import FileResponse
+
+from .models import PerfilUsuario
+from .roteador import ALIAS_REPLICA, usar_replica
+
+# Usuário -> empresa no cache compartilhado (Redis), sob uma versão por usuário que os signals de
+# PerfilUsuario/Empresa trocam no commit: nenhum worker lê o vínculo antigo depois da mudança.
+VALIDADE_CACHE_EMPRESA = 3600
+
+
+def _chave_versao_usuario(usuario_id):
+    return f'versao_empresa_usuario:{usuario_id}'
+
+
+def _consultar_empresa(usuario_id):
+    perfil = PerfilUsuario.objects.select_related('empresa').filter(usuario_id=usuario_id).first()
+    return perfil.empresa if perfil else None
+
+
+def resolver_empresa(usuario):
+    """Retorna a empresa do usuário (ou None), consultando o banco só na falta do cache"""
+    if not usuario.is_authenticated:
+        return None
+    if not settings.CACHE_EMPRESA_USUARIO:
+        return _consultar_empresa(usuario.pk)
+    chave_versao = _chave_versao_usuario(usuario.pk)
+    versao = cache.get(chave_versao)
+    if versao is None:
+        cache.add(chave_versao, time.time_ns(), None)
+        versao = cache.get(chave_versao) or time.time_ns()
+    chave = f'empresa_usuario:{usuario.pk}:{versao}'
+    # Tupla para distinguir "usuário sem empresa" de "fora do cache"
+    item = cache.get(chave)
+    if item is None:
+        item = (_consultar_empresa(usuario.pk),)
+        cache.set(chave, item, VALIDADE_CACHE_EMPRESA)
+    return item[0]
+
+
+def invalidar_usuarios(usuario_ids):
+    """Nova versão do vínculo usuário -> empresa quando a transação fizer commit"""
+    usuario_ids = list(usuario_ids)
+    if not usuario_ids:
+        return
+
+    def gravar():
+        agora = time.time_ns()
+        cache.set_many({_chave_versao_usuario(usuario_id): agora for usuario_id in usuario_ids}, None)
+
+    # Antes do commit outra requisição leria o perfil antigo e o guardaria sob a versão nova
+    transaction.on_commit(gravar)
+
+
+def invalidar_empresa(empresa_id):
+    invalidar_usuarios(PerfilUsuario.objects.filter(empresa_id=empresa_id).values_list('usuario_id', flat=True))
+
+
+class EmpresaMiddleware:
+    """Disponibiliza request.empresa (o tenant do usuário logado) para todas as views"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.empresa = resolver_empresa(request.user)
+        return self.get_response(request)
+
+
+COOKIE_PRIMARIO = 'ler_primario_ate'
+METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _na_replica(conteudo):
+    """Percorre o conteúdo em streaming com usar_replica ligado só enquanto cada bloco é gerado"""
+    iterador = iter(conteudo)
+    while True:
+        token = usar_replica.set(True)
+        try:
+            bloco = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            usar_replica.reset(token)
+        yield bloco
+
+
+class ReplicaLeituraMiddleware:
+    """Views de consulta (settings.VIEWS_REPLICA) leem da réplica (core.roteador).
+
+    Depois de um POST o navegador fica no primário por REPLICA_JANELA_ESCRITA segundos
+    (cookie), para enxergar o que acabou de gravar mesmo com atraso na replicação.
+    Nas respostas em streaming (exportações) as consultas só rodam quando o servidor
+    percorre o conteúdo, então a réplica é ligada de novo a cada bloco gerado.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            resposta = self.get_response(request)
+        finally:
+            token = getattr(request, '_token_replica', None)
+            if token is not None:
+                usar_replica.reset(token)
+        if token is not None and resposta.streaming and not isinstance(resposta, FileResponse):
+            resposta.streaming_content = _na_replica(resposta.streaming_content)
+        if request.method not in METODOS_LEITURA and ALIAS_REPLICA in settings.DATABASES:
+            janela = settings.REPLICA_JANELA_ESCRITA
+            resposta.set_cookie(COOKIE_PRIMARIO, str(int(time.time()) + janela), max_age=janela,
+                                httponly=True, samesite='Lax')
+        return resposta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (ALIAS_REPLICA not in settings.DATABASES or request.method not in METODOS_LEITURA
+                or self._escreveu_ha_pouco(request)):
+            return None
+        if any(fnmatch(view_func.__name__, padrao) for padrao in settings.VIEWS_REPLICA):
+            request._token_replica = usar_replica.set(True)
+        return None
+
+    def _escreveu_ha_pouco(self, request):
+        try:
+            return int(request.COOKIES.get(COOKIE_PRIMARIO, 0)) > time.time()
+        except ValueError:
+            return False
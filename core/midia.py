@@ -0,0 +1,152 @@
+"""
+Entrega de arquivos enviados (media) com checagem de empresa.
+
+Todo arquivo em MEDIA_ROOT pertence a um registro de algum modelo (ver DONOS); o acesso
+só é liberado se esse registro for da empresa do usuário. A resposta leva ETag e
+Last-Modified (304 quando o navegador já tem a cópia) e aceita Range (PDFs grandes
+abertos por partes). Com MIDIA_ACCEL configurado, o Django só autoriza e o nginx
+(X-Accel-Redirect) ou o Apache (X-Sendfile) entrega os bytes.
+
+Os arquivos saem da mesma origem do sistema, com o nome escolhido por quem enviou: só
+imagens e PDF abrem no navegador; o resto vai como download (application/octet-stream)
+e toda resposta leva CSP sandbox, para um .html/.svg enviado nunca rodar com a sessão.
+"""
+import mimetypes
+import re
+from calendar import timegm
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import (
+    ControleVacina, EntregaEPI, TreinamentoFuncionario, Extintor, FotoInspecao,
+    Equipamento, ArquivoInspecao, Afastamento, AcidenteTrabalho
+)
+
+# (modelo, campo do arquivo, caminho até a empresa); variantes antes do original, cujo prefixo as contém
+DONOS = [
+    (ControleVacina, 'comprovante', 'funcionario__empresa'),
+    (EntregaEPI, 'termo_assinado', 'funcionario__empresa'),
+    (TreinamentoFuncionario, 'certificado', 'funcionario__empresa'),
+    (Extintor, 'qrcode_imagem', 'empresa'),
+    (FotoInspecao, 'miniatura', 'inspecao__extintor__empresa'),
+    (FotoInspecao, 'versao_web', 'inspecao__extintor__empresa'),
+    (FotoInspecao, 'imagem', 'inspecao__extintor__empresa'),
+    (Equipamento, 'imagem', 'empresa'),
+    (ArquivoInspecao, 'miniatura', 'inspecao__equipamento__empresa'),
+    (ArquivoInspecao, 'versao_web', 'inspecao__equipamento__empresa'),
+    (ArquivoInspecao, 'arquivo', 'inspecao__equipamento__empresa'),
+    (Afastamento, 'laudo', 'funcionario__empresa'),
+    (AcidenteTrabalho, 'arquivo_evidencia', 'funcionario__empresa'),
+]
+
+TAMANHO_BLOCO = 64 * 1024
+# Tipos abertos no navegador; SVG fica de fora (pode levar script)
+TIPOS_INLINE = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf'}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def localizar_arquivo(caminho, empresa):
+    """FieldFile do registro da empresa dono do caminho, ou Http404"""
+    for modelo, campo, caminho_empresa in DONOS:
+        if not caminho.startswith(modelo._meta.get_field(campo).upload_to):
+            continue
+        registro = modelo.objects.filter(**{campo: caminho, caminho_empresa: empresa}).only('pk', campo).first()
+        if registro:
+            return getattr(registro, campo)
+    raise Http404("Arquivo não encontrado.")
+
+
+def _ler_trecho(arquivo, inicio, tamanho):
+    with arquivo:
+        arquivo.seek(inicio)
+        while tamanho > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, tamanho))
+            if not bloco:
+                break
+            tamanho -= len(bloco)
+            yield bloco
+
+
+def _intervalo(request, tamanho, etag):
+    """(início, fim) do cabeçalho Range, None se ausente/ignorado, ou False se impossível de atender"""
+    cabecalho = request.META.get('HTTP_RANGE', '')
+    encontrado = RANGE_RE.match(cabecalho.strip())
+    if not encontrado or request.META.get('HTTP_IF_RANGE', etag) != etag:
+        # Múltiplos intervalos ou If-Range desatualizado: manda o arquivo inteiro
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim) if fim else tamanho - 1, tamanho - 1)
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+def _cabecalhos_seguranca(resposta, arquivo, content_type):
+    """Disposition/nosniff/sandbox; vale também para as respostas do nginx e do X-Sendfile"""
+    nome = quote(arquivo.name.rsplit('/', 1)[-1])
+    disposicao = 'inline' if content_type in TIPOS_INLINE else 'attachment'
+    resposta['Content-Disposition'] = f"{disposicao}; filename*=UTF-8''{nome}"
+    resposta['X-Content-Type-Options'] = 'nosniff'
+    resposta['Content-Security-Policy'] = 'sandbox'
+    return resposta
+
+
+def _conteudo(request, arquivo, tamanho, etag, content_type):
+    acelerador = getattr(settings, 'MIDIA_ACCEL', '')
+    if acelerador == 'nginx':
+        resposta = HttpResponse(content_type=content_type)
+        resposta['X-Accel-Redirect'] = settings.MIDIA_ACCEL_PREFIXO + quote(arquivo.name)
+        return resposta
+    if acelerador == 'sendfile':
+        resposta = HttpResponse(content_type=content_type)
+        resposta['X-Sendfile'] = arquivo.path
+        return resposta
+
+    intervalo = _intervalo(request, tamanho, etag)
+    if intervalo is False:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{tamanho}'
+        return resposta
+    if intervalo:
+        inicio, fim = intervalo
+        resposta = StreamingHttpResponse(
+            _ler_trecho(arquivo.storage.open(arquivo.name, 'rb'), inicio, fim - inicio + 1),
+            status=206, content_type=content_type,
+        )
+        resposta['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        resposta['Content-Length'] = str(fim - inicio + 1)
+    else:
+        resposta = FileResponse(arquivo.storage.open(arquivo.name, 'rb'), content_type=content_type)
+    resposta['Accept-Ranges'] = 'bytes'
+    return resposta
+
+
+def responder_arquivo(request, arquivo, content_type=None, max_age=3600):
+    """Resposta para um FieldFile já autorizado, com validação condicional e Range"""
+    try:
+        tamanho = arquivo.storage.size(arquivo.name)
+        modificado = timegm(arquivo.storage.get_modified_time(arquivo.name).utctimetuple())
+    except (OSError, NotImplementedError):
+        raise Http404("Arquivo não encontrado.")
+    etag = f'"{modificado:x}-{tamanho:x}"'
+    content_type = content_type or mimetypes.guess_type(arquivo.name)[0]
+    if content_type not in TIPOS_INLINE:
+        content_type = 'application/octet-stream'
+    resposta = get_conditional_response(request, etag=etag, last_modified=modificado)
+    if resposta is None:
+        resposta = _conteudo(request, arquivo, tamanho, etag, content_type)
+    _cabecalhos_seguranca(resposta, arquivo, content_type)
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(modificado)
+    # Arquivos de uma empresa: só o navegador do usuário guarda cópia, nunca proxies compartilhados
+    resposta['Cache-Control'] = f'private, max-age={max_age}'
+    return resposta
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:38
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def preencher_ultima_inspecao(apps, schema_editor):
+    Extintor = apps.get_model('core', 'Extintor')
+    InspecaoExtintor = apps.get_model('core', 'InspecaoExtintor')
+    ultima = (
+        InspecaoExtintor.objects.filter(extintor=OuterRef('pk'))
+        .values('extintor')
+        .annotate(ultima=Max('data_inspecao'))
+        .values('ultima')
+    )
+    Extintor.objects.update(ultima_inspecao=Subquery(ultima))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_acidentetrabalho_afastamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extintor',
+            name='ultima_inspecao',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Última Inspeção'),
+        ),
+        migrations.RunPython(preencher_ultima_inspecao, migrations.RunPython.noop),
+    ]
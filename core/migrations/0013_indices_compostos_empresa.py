@@ -0,0 +1,103 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class IndiceConcorrente(AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY no PostgreSQL; nos outros bancos (SQLite local) um AddIndex comum"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # Índices nas tabelas grandes de cada empresa: CONCURRENTLY não bloqueia as escritas durante
+    # o build, mas não roda dentro de transação (como na 0024)
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_extintor_ultima_inspecao'),
+    ]
+
+    operations = [
+        IndiceConcorrente(
+            model_name='acidentetrabalho',
+            index=models.Index(fields=['funcionario', '-data_acidente'], name='acid_func_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='advertencia',
+            index=models.Index(fields=['empresa', '-data_incidente'], name='adv_empresa_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='advertencia',
+            index=models.Index(fields=['funcionario', 'tipo'], name='adv_func_tipo_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='afastamento',
+            index=models.Index(fields=['funcionario', '-data_inicio'], name='afast_func_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='controlevacina',
+            index=models.Index(fields=['funcionario', 'data_proximo_reforco'], name='vacina_func_reforco_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='entregaepi',
+            index=models.Index(fields=['funcionario', '-data_entrega'], name='entrega_func_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='epi',
+            index=models.Index(fields=['empresa', 'quantidade'], name='epi_empresa_qtd_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='equipamento',
+            index=models.Index(fields=['empresa', 'tipo'], name='equip_empresa_tipo_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='equipamento',
+            index=models.Index(fields=['empresa', 'data_validade'], name='equip_empresa_validade_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='extintor',
+            index=models.Index(fields=['empresa', 'situacao'], name='ext_empresa_situacao_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='extintor',
+            index=models.Index(fields=['empresa', 'data_proxima_manutencao'], name='ext_empresa_recarga_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='extintor',
+            index=models.Index(fields=['empresa', 'data_teste_hidrostatico'], name='ext_empresa_hidro_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='extintor',
+            index=models.Index(fields=['empresa', 'codigo_patrimonial'], name='ext_empresa_codigo_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='funcionario',
+            index=models.Index(fields=['empresa', 'nome'], name='func_empresa_nome_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='funcionario',
+            index=models.Index(fields=['empresa', 'ativo'], name='func_empresa_ativo_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='inspecaoequipamento',
+            index=models.Index(fields=['equipamento', '-data_inspecao'], name='insp_equip_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='inspecaoextintor',
+            index=models.Index(fields=['extintor', '-data_inspecao'], name='insp_ext_data_idx'),
+        ),
+        IndiceConcorrente(
+            model_name='treinamentofuncionario',
+            index=models.Index(fields=['funcionario', '-data_realizacao'], name='trein_func_data_idx'),
+        ),
+    ]
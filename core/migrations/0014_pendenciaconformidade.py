@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_indices_compostos_empresa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendenciaConformidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VACINA', 'Vacina não aplicada'), ('REFORCO', 'Reforço de vacina vencido'), ('EPI', 'EPI obrigatório não entregue'), ('NR', 'Treinamento de NR ausente'), ('NR_VENCIDA', 'Treinamento de NR vencido')], max_length=20)),
+                ('descricao', models.CharField(max_length=255, verbose_name='Exigência')),
+                ('vencimento', models.DateField(blank=True, null=True)),
+                ('calculado_em', models.DateTimeField(auto_now_add=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+                ('funcionario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pendencias', to='core.funcionario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'tipo'], name='pend_empresa_tipo_idx')],
+            },
+        ),
+    ]
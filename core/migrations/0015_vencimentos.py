@@ -0,0 +1,105 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_pendenciaconformidade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VarreduraVencimentos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('executada_em', models.DateTimeField()),
+                ('alertas_gravados', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Vencimento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem', models.CharField(choices=[('VACINA', 'Reforço de Vacina'), ('TREINAMENTO', 'Validade de Treinamento'), ('EPI', 'Validade de EPI em Estoque'), ('CA_ENTREGA', 'CA de EPI Entregue'), ('EXT_RECARGA', 'Recarga de Extintor'), ('EXT_HIDRO', 'Teste Hidrostático'), ('EQUIPAMENTO', 'Manutenção de Equipamento')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('descricao', models.CharField(max_length=255)),
+                ('data_vencimento', models.DateField()),
+                ('situacao', models.CharField(choices=[('A_VENCER', 'A vencer'), ('VENCIDO', 'Vencido')], max_length=10)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='controlevacina',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='entregaepi',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='epi',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='equipamento',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='extintor',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='treinamentofuncionario',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='controlevacina',
+            index=models.Index(fields=['data_proximo_reforco'], name='vacina_reforco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entregaepi',
+            index=models.Index(fields=['validade_ca'], name='entrega_validade_ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epi',
+            index=models.Index(fields=['data_validade'], name='epi_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipamento',
+            index=models.Index(fields=['data_validade'], name='equip_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extintor',
+            index=models.Index(fields=['data_proxima_manutencao'], name='ext_recarga_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extintor',
+            index=models.Index(fields=['data_teste_hidrostatico'], name='ext_hidro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treinamentofuncionario',
+            index=models.Index(fields=['data_validade'], name='trein_validade_idx'),
+        ),
+        migrations.AddField(
+            model_name='vencimento',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa'),
+        ),
+        migrations.AddIndex(
+            model_name='vencimento',
+            index=models.Index(fields=['empresa', 'data_vencimento'], name='venc_empresa_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vencimento',
+            constraint=models.UniqueConstraint(fields=('origem', 'objeto_id'), name='vencimento_origem_objeto_uniq'),
+        ),
+    ]
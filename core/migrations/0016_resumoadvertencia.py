@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def preencher_resumo(apps, schema_editor):
+    Advertencia = apps.get_model('core', 'Advertencia')
+    ResumoAdvertencia = apps.get_model('core', 'ResumoAdvertencia')
+    linhas = (Advertencia.objects.annotate(mes=TruncMonth('data_incidente'))
+              .values('empresa_id', 'mes', 'funcionario__setor_id', 'tipo_id')
+              .annotate(total=Count('id'))
+              .order_by())
+    ResumoAdvertencia.objects.bulk_create([
+        ResumoAdvertencia(empresa_id=linha['empresa_id'], mes=linha['mes'], setor_id=linha['funcionario__setor_id'],
+                          tipo_id=linha['tipo_id'], total=linha['total'])
+        for linha in linhas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_vencimentos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoAdvertencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês (1º dia)')),
+                ('total', models.IntegerField(default=0)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+                ('setor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.setor')),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.tipoadvertencia')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'mes'], name='resumo_adv_empresa_mes_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
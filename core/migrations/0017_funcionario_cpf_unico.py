@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:49
+
+from collections import defaultdict
+
+from django.db import migrations
+
+# Quantos pares em colisão a mensagem de erro lista
+LISTAR_COLISOES = 50
+
+
+def normalizar_cpfs(apps, schema_editor):
+    """Deixa só os dígitos do CPF antes da 0018 criar a unicidade por empresa.
+
+    Se dois cadastros da mesma empresa tiverem o mesmo CPF depois de normalizado, a
+    migração para sem alterar nada e lista os pares (empresa, CPF): juntar cadastros
+    duplicados (entregas, advertências, vacinas...) é decisão de quem conhece os dados.
+    """
+    Funcionario = apps.get_model('core', 'Funcionario')
+    por_cpf = defaultdict(list)
+    alterados = []
+    for funcionario in Funcionario.objects.only('pk', 'empresa_id', 'cpf').order_by('pk').iterator(chunk_size=2000):
+        cpf = ''.join(c for c in funcionario.cpf if c.isdigit())
+        por_cpf[(funcionario.empresa_id, cpf)].append(funcionario.pk)
+        if cpf != funcionario.cpf:
+            funcionario.cpf = cpf
+            alterados.append(funcionario)
+
+    colisoes = [(chave, pks) for chave, pks in por_cpf.items() if len(pks) > 1]
+    if colisoes:
+        linhas = [f'  empresa {empresa_id}, CPF {cpf or "(vazio)"}: funcionários {pks}'
+                  for (empresa_id, cpf), pks in sorted(colisoes)[:LISTAR_COLISOES]]
+        if len(colisoes) > LISTAR_COLISOES:
+            linhas.append(f'  ... e mais {len(colisoes) - LISTAR_COLISOES}')
+        raise RuntimeError(
+            f'{len(colisoes)} CPF(s) repetido(s) na mesma empresa depois de normalizar. Junte ou corrija '
+            'esses cadastros e rode o migrate de novo:\n'
+            + '\n'.join(linhas)
+        )
+    Funcionario.objects.bulk_update(alterados, ['cpf'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_resumoadvertencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_cpfs, migrations.RunPython.noop),
+    ]
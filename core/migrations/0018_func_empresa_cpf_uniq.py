@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_funcionario_cpf_unico'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='funcionario',
+            constraint=models.UniqueConstraint(fields=('empresa', 'cpf'), name='func_empresa_cpf_uniq'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    """Abre o livro com o saldo atual de cada EPI (não há histórico anterior)"""
+    EPI = apps.get_model('core', 'EPI')
+    MovimentoEstoque = apps.get_model('core', 'MovimentoEstoque')
+    MovimentoEstoque.objects.bulk_create([
+        MovimentoEstoque(empresa_id=empresa_id, epi_id=pk, tipo='AJUSTE', quantidade=quantidade,
+                         saldo_apos=quantidade, observacao='Saldo inicial')
+        for pk, empresa_id, quantidade in EPI.objects.exclude(quantidade=0).values_list('pk', 'empresa_id', 'quantidade')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_func_empresa_cpf_uniq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('ENTREGA', 'Entrega a Funcionário'), ('DEVOLUCAO', 'Devolução'), ('AJUSTE', 'Ajuste de Inventário')], max_length=10)),
+                ('quantidade', models.IntegerField(help_text='Positiva para entradas, negativa para saídas')),
+                ('saldo_apos', models.IntegerField()),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('observacao', models.CharField(blank=True, max_length=255)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+                ('entrega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos', to='core.entregaepi')),
+                ('epi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentos', to='core.epi')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['epi', '-data'], name='mov_epi_data_idx'), models.Index(fields=['empresa', 'data'], name='mov_empresa_data_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês (1º dia)')),
+                ('entradas', models.IntegerField(default=0)),
+                ('entregas', models.IntegerField(default=0)),
+                ('devolucoes', models.IntegerField(default=0)),
+                ('ajustes', models.IntegerField(default=0)),
+                ('saldo_final', models.IntegerField()),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+                ('epi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='core.epi')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'mes'], name='saldo_empresa_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('epi', 'mes'), name='saldo_epi_mes_uniq')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
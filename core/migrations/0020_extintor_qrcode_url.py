@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_movimentoestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extintor',
+            name='qrcode_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_extintor_qrcode_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivoinspecao',
+            name='miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='inspecoes_equipamentos/mini/'),
+        ),
+        migrations.AddField(
+            model_name='arquivoinspecao',
+            name='processado_em',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='arquivoinspecao',
+            name='versao_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='inspecoes_equipamentos/web/'),
+        ),
+        migrations.AddField(
+            model_name='fotoinspecao',
+            name='miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='inspecoes_extintores/mini/'),
+        ),
+        migrations.AddField(
+            model_name='fotoinspecao',
+            name='processado_em',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fotoinspecao',
+            name='versao_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='inspecoes_extintores/web/'),
+        ),
+    ]
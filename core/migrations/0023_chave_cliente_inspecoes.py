@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_uploadparcial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspecaoequipamento',
+            name='chave_cliente',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='inspecaoextintor',
+            name='chave_cliente',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
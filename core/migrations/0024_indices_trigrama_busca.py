@@ -0,0 +1,52 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:02
+
+from django.db import migrations
+
+# Índices GIN pg_trgm na mesma expressão que o icontains gera no PostgreSQL
+# (UPPER(col::text) LIKE UPPER('%termo%')), usados por core.busca e pelos filtros das listas.
+COLUNAS = [
+    ('core_funcionario', 'nome'),
+    ('core_funcionario', 'cargo'),
+    ('core_funcionario', 'cpf'),
+    ('core_epi', 'ca'),
+    ('core_epi', 'codigo_unico'),
+    ('core_tipoepi', 'nome'),
+    ('core_extintor', 'codigo_patrimonial'),
+    ('core_extintor', 'numero_serie'),
+    ('core_equipamento', 'nome'),
+    ('core_equipamento', 'especificacao'),
+    ('core_localizacao', 'nome'),
+]
+
+
+def criar_indices(apps, schema_editor):
+    # Só PostgreSQL; no SQLite a busca funciona sem índice (tabelas pequenas de teste)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for tabela, coluna in COLUNAS:
+        # CONCURRENTLY: não bloqueia escrita nas tabelas grandes durante o deploy
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {tabela}_{coluna}_trgm '
+            f'ON {tabela} USING gin ((UPPER({coluna}::text)) gin_trgm_ops)'
+        )
+
+
+def remover_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabela, coluna in COLUNAS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {tabela}_{coluna}_trgm')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0023_chave_cliente_inspecoes'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
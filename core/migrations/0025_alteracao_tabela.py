@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# Tabelas registradas por core.cache_dados na data desta migração
+TABELAS = [
+    'funcionario', 'setor', 'advertencia', 'tipoadvertencia', 'localizacao', 'extintor',
+    'inspecaoextintor', 'fotoinspecao', 'equipamento', 'inspecaoequipamento', 'arquivoinspecao',
+]
+
+
+def registrar_empresas(apps, schema_editor):
+    # Sem linha a tela não tem ETag; começa em "agora" para as empresas que já existem
+    Empresa = apps.get_model('core', 'Empresa')
+    AlteracaoTabela = apps.get_model('core', 'AlteracaoTabela')
+    agora = timezone.now()
+    AlteracaoTabela.objects.bulk_create([
+        AlteracaoTabela(empresa_id=empresa_id, tabela=tabela, alterado_em=agora)
+        for empresa_id in Empresa.objects.values_list('pk', flat=True) for tabela in TABELAS
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_indices_trigrama_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoTabela',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabela', models.CharField(help_text='model_name do modelo alterado', max_length=60)),
+                ('alterado_em', models.DateTimeField()),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'tabela'), name='alteracao_empresa_tabela_uniq')],
+            },
+        ),
+        migrations.RunPython(registrar_empresas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def juntar_duplicadas(apps, schema_editor):
+    """Linhas repetidas da mesma chave (criadas por dois somar() simultâneos) viram uma só com a soma"""
+    ResumoAdvertencia = apps.get_model('core', 'ResumoAdvertencia')
+    repetidas = (ResumoAdvertencia.objects.values('empresa_id', 'mes', 'setor_id', 'tipo_id')
+                 .annotate(linhas=Count('id'), manter=Min('id'), soma=Sum('total'))
+                 .filter(linhas__gt=1).order_by())
+    for chave in repetidas:
+        filtro = {campo: chave[campo] for campo in ('empresa_id', 'mes', 'setor_id', 'tipo_id')}
+        ResumoAdvertencia.objects.filter(**filtro).exclude(pk=chave['manter']).delete()
+        ResumoAdvertencia.objects.filter(pk=chave['manter']).update(total=chave['soma'])
+    ResumoAdvertencia.objects.filter(total__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_alteracao_tabela'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumoadvertencia',
+            constraint=models.UniqueConstraint(fields=('empresa', 'mes', 'setor', 'tipo'), name='resumo_adv_chave_uniq', nulls_distinct=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_resumo_adv_chave_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionario',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
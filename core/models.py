@@ -1,9 +1,15 @@
 import os
-from django.db import models
+import uuid
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from datetime import date, timedelta
 from django.utils import timezone
 
+def normalizar_cpf(valor):
+    """CPF guardado só com dígitos, para a unicidade por empresa não depender da máscara"""
+    return ''.join(c for c in str(valor or '') if c.isdigit())
+
 # 1. EMPRESA
 class Empresa(models.Model):
     nome_fantasia = models.CharField(max_length=255)
@@ -92,8 +98,28 @@ class Funcionario(models.Model):
     
     # Mantemos o 'ativo' para lógica interna do sistema (ex: login), mas a 'situacao' é o que manda no RH
     ativo = models.BooleanField(default=True, verbose_name="Cadastro Ativo no Sistema?")
+    # Lido pela varredura de vencimentos: desligar o funcionário tira os alertas do prontuário dele
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'nome'], name='func_empresa_nome_idx'),
+            models.Index(fields=['empresa', 'ativo'], name='func_empresa_ativo_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'cpf'], name='func_empresa_cpf_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.cpf = normalizar_cpf(self.cpf)
+        super().save(*args, **kwargs)
 
     def __str__(self): return f"{self.nome} - {self.cargo}"
+
+    @property
+    def cpf_formatado(self):
+        c = self.cpf
+        return f"{c[:3]}.{c[3:6]}.{c[6:9]}-{c[9:]}" if len(c) == 11 else c
     
     @property
     def cor_status(self):
@@ -128,9 +154,16 @@ class EPI(models.Model):
     ca = models.CharField(max_length=50, verbose_name="C.A.")
     quantidade = models.IntegerField(default=0)
     data_validade = models.DateField(null=True, blank=True, verbose_name="Validade")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self): return f"{self.tipo.nome} - {self.tamanho}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'quantidade'], name='epi_empresa_qtd_idx'),
+            models.Index(fields=['data_validade'], name='epi_validade_idx'),
+        ]
+
 # 7. ADVERTÊNCIAS
 class TipoAdvertencia(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
@@ -148,14 +181,42 @@ class Advertencia(models.Model):
     reincidente = models.BooleanField(default=False, verbose_name="É reincidente?")
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', '-data_incidente'], name='adv_empresa_data_idx'),
+            models.Index(fields=['funcionario', 'tipo'], name='adv_func_tipo_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.pk:
+        if self.pk:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Trava o funcionário: dois registros simultâneos não podem ambos se achar o primeiro
+            list(Funcionario.objects.select_for_update().filter(pk=self.funcionario_id).values_list('pk', flat=True))
             historico = Advertencia.objects.filter(funcionario=self.funcionario, tipo=self.tipo).exists()
             if historico: self.reincidente = True
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
     def __str__(self): return f"{self.funcionario.nome} - {self.tipo.titulo}"
 
+class ResumoAdvertencia(models.Model):
+    """Totais pré-agregados por (empresa, mês, setor, motivo), mantidos por core.resumo_advertencias"""
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    mes = models.DateField(verbose_name="Mês (1º dia)")
+    setor = models.ForeignKey(Setor, on_delete=models.CASCADE, null=True, blank=True)
+    tipo = models.ForeignKey(TipoAdvertencia, on_delete=models.CASCADE)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'mes'], name='resumo_adv_empresa_mes_idx'),
+        ]
+        constraints = [
+            # Uma linha por chave, inclusive sem setor: somar() depende disso para não contar em dobro
+            models.UniqueConstraint(fields=['empresa', 'mes', 'setor', 'tipo'], name='resumo_adv_chave_uniq',
+                                    nulls_distinct=False),
+        ]
+
 # 8. NOVOS MODELOS: PRONTUÁRIO DO FUNCIONÁRIO (VACINAS, EPIs, TREINAMENTOS)
 
 # 8.1 CONTROLE DE VACINAS
@@ -165,6 +226,13 @@ class ControleVacina(models.Model):
     data_aplicacao = models.DateField(verbose_name="Data da Aplicação")
     data_proximo_reforco = models.DateField(null=True, blank=True, verbose_name="Próximo Reforço")
     comprovante = models.FileField(upload_to='vacinas_comprovantes/', blank=True, null=True, verbose_name="Comprovante (Foto/PDF)")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['funcionario', 'data_proximo_reforco'], name='vacina_func_reforco_idx'),
+            models.Index(fields=['data_proximo_reforco'], name='vacina_reforco_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Calcula o reforço automaticamente se não for informado e a vacina tiver periodicidade
@@ -193,6 +261,13 @@ class EntregaEPI(models.Model):
     
     data_devolucao = models.DateField(null=True, blank=True, verbose_name="Data de Devolução/Troca")
     termo_assinado = models.FileField(upload_to='epis_termos/', blank=True, null=True, verbose_name="Ficha Assinada")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['funcionario', '-data_entrega'], name='entrega_func_data_idx'),
+            models.Index(fields=['validade_ca'], name='entrega_validade_ca_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.pk:
@@ -208,6 +283,13 @@ class TreinamentoFuncionario(models.Model):
     data_realizacao = models.DateField(verbose_name="Data Realização")
     data_validade = models.DateField(null=True, blank=True, verbose_name="Validade")
     certificado = models.FileField(upload_to='treinamentos_certificados/', blank=True, null=True, verbose_name="Certificado (PDF/Foto)")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['funcionario', '-data_realizacao'], name='trein_func_data_idx'),
+            models.Index(fields=['data_validade'], name='trein_validade_idx'),
+        ]
     
     def __str__(self): return self.nome_treinamento
 
@@ -261,10 +343,31 @@ class Extintor(models.Model):
     acesso_livre = models.BooleanField(default=True, verbose_name="Acesso Desobstruído?")
 
     qrcode_imagem = models.ImageField(upload_to='qrcodes_extintores/', blank=True, null=True, verbose_name="QR Code Registrado")
+    # Endereço gravado no QR atual; a imagem só é refeita se o endereço mudar (ver core.qrcodes)
+    qrcode_url = models.CharField(max_length=500, blank=True, editable=False)
+
+    # Cópia da data da inspeção mais recente (mantida por InspecaoExtintor.save/delete)
+    ultima_inspecao = models.DateField(null=True, blank=True, editable=False, verbose_name="Última Inspeção")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'situacao'], name='ext_empresa_situacao_idx'),
+            models.Index(fields=['empresa', 'data_proxima_manutencao'], name='ext_empresa_recarga_idx'),
+            models.Index(fields=['empresa', 'data_teste_hidrostatico'], name='ext_empresa_hidro_idx'),
+            models.Index(fields=['empresa', 'codigo_patrimonial'], name='ext_empresa_codigo_idx'),
+            models.Index(fields=['data_proxima_manutencao'], name='ext_recarga_idx'),
+            models.Index(fields=['data_teste_hidrostatico'], name='ext_hidro_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo_patrimonial} ({self.get_agente_display()})"
 
+    def atualizar_ultima_inspecao(self):
+        """Recalcula a data da última inspeção a partir do histórico"""
+        self.ultima_inspecao = self.inspecoes.aggregate(ultima=models.Max('data_inspecao'))['ultima']
+        Extintor.objects.filter(pk=self.pk).update(ultima_inspecao=self.ultima_inspecao)
+
     @property
     def alerta_manutencao(self):
         """Retorna True se faltar 30 dias ou menos para recarga"""
@@ -291,6 +394,22 @@ class InspecaoExtintor(models.Model):
     mangueira_integra = models.BooleanField(default=True, verbose_name="Mangueira Íntegra?")
     
     observacoes = models.TextField(blank=True)
+    # Chave gerada no celular para inspeções feitas offline: reenviar o lote não duplica (core.sincronizacao)
+    chave_cliente = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['extintor', '-data_inspecao'], name='insp_ext_data_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.extintor.atualizar_ultima_inspecao()
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        self.extintor.atualizar_ultima_inspecao()
+        return resultado
     
     def __str__(self):
         return f"Inspeção {self.extintor.codigo_patrimonial} em {self.data_inspecao}"
@@ -299,9 +418,21 @@ class FotoInspecao(models.Model):
     inspecao = models.ForeignKey(InspecaoExtintor, on_delete=models.CASCADE, related_name='fotos')
     imagem = models.ImageField(upload_to='inspecoes_extintores/', verbose_name="Foto")
     data_upload = models.DateTimeField(auto_now_add=True)
+    # Versões reduzidas geradas em segundo plano (core.imagens); o original é preservado como evidência
+    miniatura = models.ImageField(upload_to='inspecoes_extintores/mini/', blank=True, null=True, editable=False)
+    versao_web = models.ImageField(upload_to='inspecoes_extintores/web/', blank=True, null=True, editable=False)
+    processado_em = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     def __str__(self):
         return f"Foto da inspeção {self.inspecao.id}"
+
+    @property
+    def url_miniatura(self):
+        return (self.miniatura or self.imagem).url
+
+    @property
+    def url_web(self):
+        return (self.versao_web or self.imagem).url
     
 
 class Equipamento(models.Model):
@@ -329,6 +460,14 @@ class Equipamento(models.Model):
     ativo = models.BooleanField(default=True, verbose_name="Ativo?")
     
     imagem = models.ImageField(upload_to='outros_equipamentos/', blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'tipo'], name='equip_empresa_tipo_idx'),
+            models.Index(fields=['empresa', 'data_validade'], name='equip_empresa_validade_idx'),
+            models.Index(fields=['data_validade'], name='equip_validade_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.nome}"
@@ -356,6 +495,12 @@ class InspecaoEquipamento(models.Model):
     teste_funcional = models.BooleanField(default=True, verbose_name="Teste de Funcionamento OK?")
     
     observacoes = models.TextField(blank=True)
+    chave_cliente = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['equipamento', '-data_inspecao'], name='insp_equip_data_idx'),
+        ]
     
     def __str__(self):
         return f"Inspeção {self.equipamento} em {self.data_inspecao}"
@@ -364,10 +509,22 @@ class ArquivoInspecao(models.Model):
     inspecao = models.ForeignKey(InspecaoEquipamento, on_delete=models.CASCADE, related_name='arquivos')
     arquivo = models.FileField(upload_to='inspecoes_equipamentos/', verbose_name="Arquivo/Foto")
     data_upload = models.DateTimeField(auto_now_add=True)
+    # Versões reduzidas das imagens, geradas em segundo plano (core.imagens)
+    miniatura = models.ImageField(upload_to='inspecoes_equipamentos/mini/', blank=True, null=True, editable=False)
+    versao_web = models.ImageField(upload_to='inspecoes_equipamentos/web/', blank=True, null=True, editable=False)
+    processado_em = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     def __str__(self):
         return f"Arquivo da inspeção {self.inspecao.id}"
 
+    @property
+    def url_miniatura(self):
+        return (self.miniatura or self.arquivo).url
+
+    @property
+    def url_web(self):
+        return (self.versao_web or self.arquivo).url
+
     @property
     def eh_imagem(self):
         """Retorna True se a extensão for de imagem"""
@@ -384,6 +541,11 @@ class Afastamento(models.Model):
     laudo = models.FileField(upload_to='afastamentos_laudos/', blank=True, null=True, verbose_name="Laudo Médico (PDF/Foto)")
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['funcionario', '-data_inicio'], name='afast_func_data_idx'),
+        ]
+
     def __str__(self):
         return f"Afastamento {self.funcionario.nome} - {self.data_inicio}"
 
@@ -403,5 +565,165 @@ class AcidenteTrabalho(models.Model):
     arquivo_evidencia = models.FileField(upload_to='acidentes_arquivos/', blank=True, null=True, verbose_name="Fotos/CAT")
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['funcionario', '-data_acidente'], name='acid_func_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"Acidente {self.funcionario.nome} em {self.data_acidente}"
+
+# 12. PENDÊNCIAS DE CONFORMIDADE (calculadas por core.conformidade)
+class PendenciaConformidade(models.Model):
+    TIPOS = [
+        ('VACINA', 'Vacina não aplicada'),
+        ('REFORCO', 'Reforço de vacina vencido'),
+        ('EPI', 'EPI obrigatório não entregue'),
+        ('NR', 'Treinamento de NR ausente'),
+        ('NR_VENCIDA', 'Treinamento de NR vencido'),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    funcionario = models.ForeignKey(Funcionario, on_delete=models.CASCADE, related_name='pendencias')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    descricao = models.CharField(max_length=255, verbose_name="Exigência")
+    vencimento = models.DateField(null=True, blank=True)
+    calculado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'tipo'], name='pend_empresa_tipo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.funcionario_id} - {self.get_tipo_display()}: {self.descricao}"
+
+# 13. ALERTAS DE VENCIMENTO (gerados pelo comando varrer_vencimentos)
+class Vencimento(models.Model):
+    ORIGENS = [
+        ('VACINA', 'Reforço de Vacina'),
+        ('TREINAMENTO', 'Validade de Treinamento'),
+        ('EPI', 'Validade de EPI em Estoque'),
+        ('CA_ENTREGA', 'CA de EPI Entregue'),
+        ('EXT_RECARGA', 'Recarga de Extintor'),
+        ('EXT_HIDRO', 'Teste Hidrostático'),
+        ('EQUIPAMENTO', 'Manutenção de Equipamento'),
+    ]
+    SITUACOES = [('A_VENCER', 'A vencer'), ('VENCIDO', 'Vencido')]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    origem = models.CharField(max_length=20, choices=ORIGENS)
+    objeto_id = models.BigIntegerField()
+    descricao = models.CharField(max_length=255)
+    data_vencimento = models.DateField()
+    situacao = models.CharField(max_length=10, choices=SITUACOES)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origem', 'objeto_id'], name='vencimento_origem_objeto_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'data_vencimento'], name='venc_empresa_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_origem_display()}: {self.descricao} ({self.data_vencimento})"
+
+
+class VarreduraVencimentos(models.Model):
+    """Marca d'água da última varredura concluída (uma linha)"""
+    executada_em = models.DateTimeField()
+    alertas_gravados = models.IntegerField(default=0)
+
+
+# 14. LIVRO DE MOVIMENTOS DO ESTOQUE DE EPIs (mantido por core.estoque)
+class MovimentoEstoque(models.Model):
+    """Registro imutável de cada alteração em EPI.quantidade"""
+    TIPOS = [
+        ('ENTRADA', 'Entrada'),
+        ('ENTREGA', 'Entrega a Funcionário'),
+        ('DEVOLUCAO', 'Devolução'),
+        ('AJUSTE', 'Ajuste de Inventário'),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    epi = models.ForeignKey(EPI, on_delete=models.CASCADE, related_name='movimentos')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    quantidade = models.IntegerField(help_text="Positiva para entradas, negativa para saídas")
+    saldo_apos = models.IntegerField()
+    data = models.DateTimeField(default=timezone.now)
+    entrega = models.ForeignKey(EntregaEPI, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimentos')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    observacao = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['epi', '-data'], name='mov_epi_data_idx'),
+            models.Index(fields=['empresa', 'data'], name='mov_empresa_data_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Movimentos de estoque não podem ser alterados; registre um ajuste.")
+        super().save(*args, **kwargs)
+
+    def __str__(self): return f"{self.get_tipo_display()} {self.quantidade:+d} ({self.epi_id})"
+
+
+class SaldoEstoque(models.Model):
+    """Fechamento mensal por EPI: saldo no fim do mês e totais do mês por tipo de movimento"""
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    epi = models.ForeignKey(EPI, on_delete=models.CASCADE, related_name='saldos')
+    mes = models.DateField(verbose_name="Mês (1º dia)")
+    entradas = models.IntegerField(default=0)
+    entregas = models.IntegerField(default=0)
+    devolucoes = models.IntegerField(default=0)
+    ajustes = models.IntegerField(default=0)
+    saldo_final = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['epi', 'mes'], name='saldo_epi_mes_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'mes'], name='saldo_empresa_mes_idx'),
+        ]
+
+
+# 15. UPLOADS EM PARTES (core.uploads)
+class UploadParcial(models.Model):
+    """Arquivo recebido em partes pelo celular; vira o anexo de um registro quando concluído"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    nome_arquivo = models.CharField(max_length=255)
+    tamanho = models.BigIntegerField()
+    recebido = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Hash do arquivo inteiro informado pelo cliente")
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.recebido}/{self.tamanho})"
+
+    @property
+    def caminho(self):
+        return os.path.join(settings.UPLOADS_PARCIAIS_DIR, f'{self.pk}.part')
+
+
+
+# 16. ÚLTIMA ALTERAÇÃO POR EMPRESA E TABELA (core.cache_dados)
+class AlteracaoTabela(models.Model):
+    """Instante da última gravação numa tabela da empresa; base do ETag/Last-Modified das telas"""
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    tabela = models.CharField(max_length=60, help_text="model_name do modelo alterado")
+    alterado_em = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'tabela'], name='alteracao_empresa_tabela_uniq'),
+        ]
+
     def __str__(self):
-        return f"Acidente {self.funcionario.nome} em {self.data_acidente}"
\ No newline at end of file
+        return f"{self.empresa_id} {self.tabela}: {self.alterado_em}"
@@ -0,0 +1,109 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+ITENS_POR_PAGINA = 50
+
+
+def _codificar(valores):
+    texto = json.dumps(valores, default=str)
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def _decodificar(cursor, tamanho):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != tamanho:
+        return None
+    return valores
+
+
+def _inverter(ordenacao):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordenacao]
+
+
+def filtro_apos(ordenacao, valores):
+    """(a, b, pk) > (va, vb, vpk) respeitando a direção de cada coluna"""
+    filtro = Q()
+    for i, campo in enumerate(ordenacao):
+        cond = Q(**{f"{campo.lstrip('-')}__{'lt' if campo.startswith('-') else 'gt'}": valores[i]})
+        for anterior, valor in zip(ordenacao[:i], valores):
+            cond &= Q(**{anterior.lstrip('-'): valor})
+        filtro |= cond
+    return filtro
+
+
+def _filtrar(queryset, ordenacao, valores):
+    """queryset depois do cursor, ou None se os valores não servem para as colunas (cursor adulterado)"""
+    try:
+        return queryset.filter(filtro_apos(ordenacao, valores))
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+class Pagina:
+    def __init__(self, itens, request, ordenacao, tem_anterior, tem_proxima):
+        self.itens = itens
+        # Só os parâmetros da URL: a página pode ir para o cache (core.cache_dados)
+        self._params = request.GET
+        self._ordenacao = ordenacao
+        self.tem_anterior = tem_anterior and bool(itens)
+        self.tem_proxima = tem_proxima and bool(itens)
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def _url(self, parametro, obj):
+        params = self._params.copy()
+        params.pop('apos', None)
+        params.pop('antes', None)
+        params[parametro] = _codificar([getattr(obj, campo.lstrip('-')) for campo in self._ordenacao])
+        return f'?{params.urlencode()}'
+
+    @property
+    def url_anterior(self):
+        return self._url('antes', self.itens[0]) if self.tem_anterior else None
+
+    @property
+    def url_proxima(self):
+        return self._url('apos', self.itens[-1]) if self.tem_proxima else None
+
+    @property
+    def url_primeira(self):
+        params = self._params.copy()
+        params.pop('apos', None)
+        params.pop('antes', None)
+        return f'?{params.urlencode()}'
+
+
+def paginar(request, queryset, ordenacao, por_pagina=ITENS_POR_PAGINA):
+    """
+    Paginação por cursor (keyset): filtra pela chave da última linha vista em vez de usar OFFSET.
+    `ordenacao` deve terminar em 'pk' (ou '-pk') para ser estável.
+    Os demais parâmetros da URL (filtros) são preservados nos links.
+    """
+    apos = _decodificar(request.GET.get('apos', ''), len(ordenacao))
+    antes = _decodificar(request.GET.get('antes', ''), len(ordenacao)) if apos is None else None
+
+    if antes is not None:
+        invertida = _inverter(ordenacao)
+        filtro = _filtrar(queryset, invertida, antes)
+        if filtro is not None:
+            itens = list(filtro.order_by(*invertida)[:por_pagina + 1])
+            tem_anterior = len(itens) > por_pagina
+            itens = itens[:por_pagina][::-1]
+            return Pagina(itens, request, ordenacao, tem_anterior, True)
+
+    if apos is not None:
+        filtro = _filtrar(queryset, ordenacao, apos)
+        # Cursor adulterado: volta para a primeira página
+        apos, queryset = (None, queryset) if filtro is None else (apos, filtro)
+    itens = list(queryset.order_by(*ordenacao)[:por_pagina + 1])
+    return Pagina(itens[:por_pagina], request, ordenacao, apos is not None, len(itens) > por_pagina)
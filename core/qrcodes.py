@@ -0,0 +1,136 @@
+"""
+QR Codes das etiquetas de extintores.
+
+O PNG é gravado em Extintor.qrcode_imagem junto com o endereço que ele codifica
+(qrcode_url); só é refeito quando esse endereço muda (troca de domínio, rota nova).
+A geração em lote desenha as imagens num pool de processos e grava tudo no processo
+principal, com um bulk_update no fim. A folha de etiquetas não gera nada durante a
+requisição: embute os PNGs já gravados e manda os que faltam para uma thread do processo
+(ou para o comando gerar_qrcodes, com IMAGENS_EM_SEGUNDO_PLANO desligado).
+"""
+import base64
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import django
+import qrcode
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.urls import reverse
+
+from .models import Extintor
+
+logger = logging.getLogger(__name__)
+
+# Abaixo disso não compensa subir processos
+MINIMO_PARA_POOL = 20
+
+_fila = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qrcodes')
+_agendadas = set()
+_trava = threading.Lock()
+
+
+def endereco_base(request=None):
+    """SITE_URL quando configurado (mesmo QR para qualquer host de acesso); senão o host da requisição"""
+    if settings.SITE_URL or request is None:
+        return settings.SITE_URL
+    return request.build_absolute_uri('/')
+
+
+def url_destino(extintor_id, base_url):
+    return base_url.rstrip('/') + reverse('extintor_mobile', args=[extintor_id])
+
+
+def desenhar_png(url):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=2)
+    qr.add_data(url)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _gravar(extintor, url, png):
+    """Troca o arquivo do extintor (sem salvar o modelo)"""
+    if extintor.qrcode_imagem:
+        extintor.qrcode_imagem.delete(save=False)
+    extintor.qrcode_imagem.save(f'qrcode_extintor_{extintor.pk}.png', ContentFile(png), save=False)
+    extintor.qrcode_url = url
+
+
+def garantir_qrcode(extintor, base_url):
+    """Gera o QR de um extintor se ainda não existir ou se o endereço mudou"""
+    url = url_destino(extintor.pk, base_url)
+    if extintor.qrcode_imagem and extintor.qrcode_url == url:
+        return False
+    _gravar(extintor, url, desenhar_png(url))
+    Extintor.objects.filter(pk=extintor.pk).update(qrcode_imagem=extintor.qrcode_imagem.name, qrcode_url=url)
+    return True
+
+
+def imagem_inline(extintor, base_url):
+    """PNG gravado como data URI, para a folha inteira sair numa resposta; None se falta ou está desatualizado"""
+    if not extintor.qrcode_imagem or extintor.qrcode_url != url_destino(extintor.pk, base_url):
+        return None
+    try:
+        with extintor.qrcode_imagem.open('rb') as arquivo:
+            dados = arquivo.read()
+    except OSError:
+        return None
+    return 'data:image/png;base64,' + base64.b64encode(dados).decode()
+
+
+def pendentes(empresa_id, base_url):
+    """Extintores da empresa sem imagem ou com QR apontando para outro endereço"""
+    extintores = Extintor.objects.filter(empresa_id=empresa_id).only('pk', 'qrcode_imagem', 'qrcode_url')
+    return [ext for ext in extintores if not ext.qrcode_imagem or ext.qrcode_url != url_destino(ext.pk, base_url)]
+
+
+def gerar_em_lote(empresa_id, base_url, processos=None):
+    """Gera os QR Codes que faltam (ou estão desatualizados). Retorna quantos foram gravados"""
+    extintores = pendentes(empresa_id, base_url)
+    if not extintores:
+        return 0
+    urls = [url_destino(ext.pk, base_url) for ext in extintores]
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(urls) < MINIMO_PARA_POOL:
+        imagens = map(desenhar_png, urls)
+    else:
+        # initializer: com spawn/forkserver o filho precisa do Django configurado para importar este módulo
+        with ProcessPoolExecutor(max_workers=processos, initializer=django.setup) as pool:
+            imagens = list(pool.map(desenhar_png, urls, chunksize=max(1, len(urls) // 32)))
+    for ext, url, png in zip(extintores, urls, imagens):
+        _gravar(ext, url, png)
+    Extintor.objects.bulk_update(extintores, ['qrcode_imagem', 'qrcode_url'], batch_size=500)
+    return len(extintores)
+
+
+def _gerar_em_segundo_plano(empresa_id, base_url):
+    try:
+        gerar_em_lote(empresa_id, base_url, processos=1)
+    except Exception:
+        logger.exception("Falha ao gerar os QR Codes da empresa %s", empresa_id)
+    finally:
+        with _trava:
+            _agendadas.discard((empresa_id, base_url))
+        # A thread tem conexão própria com o banco; não deixar aberta
+        connections.close_all()
+
+
+def agendar_lote(empresa_id, base_url):
+    """Gera os pendentes da empresa numa thread do processo, fora da requisição.
+
+    Uma vez por empresa de cada vez; False se a fila está desligada (IMAGENS_EM_SEGUNDO_PLANO).
+    """
+    if not getattr(settings, 'IMAGENS_EM_SEGUNDO_PLANO', True):
+        return False
+    with _trava:
+        if (empresa_id, base_url) in _agendadas:
+            return True
+        _agendadas.add((empresa_id, base_url))
+    _fila.submit(_gerar_em_segundo_plano, empresa_id, base_url)
+    return True
@@ -0,0 +1,48 @@
+"""
+Rollup das advertências por (empresa, mês, setor, motivo).
+
+O painel lê algumas dezenas de linhas daqui em vez de agrupar todo o histórico.
+O setor é o do funcionário no momento do registro; `reconstruir` recalcula tudo
+a partir das advertências (ex.: depois de mudanças de setor ou importações em lote).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+
+from .models import Advertencia, Funcionario, ResumoAdvertencia
+
+
+def chave(advertencia):
+    setor_id = Funcionario.objects.filter(pk=advertencia.funcionario_id).values_list('setor_id', flat=True).first()
+    return (advertencia.empresa_id, advertencia.data_incidente.replace(day=1), setor_id, advertencia.tipo_id)
+
+
+def somar(chave_resumo, delta):
+    empresa_id, mes, setor_id, tipo_id = chave_resumo
+    filtro = {'empresa_id': empresa_id, 'mes': mes, 'setor_id': setor_id, 'tipo_id': tipo_id}
+    with transaction.atomic():
+        atualizados = ResumoAdvertencia.objects.filter(**filtro).update(total=F('total') + delta)
+        if not atualizados and delta > 0:
+            try:
+                with transaction.atomic():
+                    ResumoAdvertencia.objects.create(total=delta, **filtro)
+            except IntegrityError:
+                # Outra transação criou a linha depois do update (resumo_adv_chave_uniq): soma nela
+                ResumoAdvertencia.objects.filter(**filtro).update(total=F('total') + delta)
+        elif delta < 0:
+            ResumoAdvertencia.objects.filter(total__lte=0, **filtro).delete()
+
+
+def reconstruir(empresa_id):
+    linhas = (Advertencia.objects.filter(empresa_id=empresa_id)
+              .annotate(mes=TruncMonth('data_incidente'))
+              .values('mes', 'funcionario__setor_id', 'tipo_id')
+              .annotate(total=Count('id'))
+              .order_by())
+    with transaction.atomic():
+        ResumoAdvertencia.objects.filter(empresa_id=empresa_id).delete()
+        ResumoAdvertencia.objects.bulk_create([
+            ResumoAdvertencia(empresa_id=empresa_id, mes=linha['mes'], setor_id=linha['funcionario__setor_id'],
+                              tipo_id=linha['tipo_id'], total=linha['total'])
+            for linha in linhas
+        ])
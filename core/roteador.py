@@ -0,0 +1,34 @@
+"""
+Leituras das telas de consulta numa réplica do banco.
+
+Dashboards, históricos, listas e exportações só leem, e são a maior parte do tráfego.
+Quando settings.DATABASES tem o alias 'replica', o ReplicaLeituraMiddleware liga
+`usar_replica` durante essas views (settings.VIEWS_REPLICA) e o roteador manda as
+leituras para lá. Escritas, migrações e qualquer leitura dentro de transaction.atomic
+continuam no primário.
+"""
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_REPLICA = 'replica'
+
+usar_replica = ContextVar('usar_replica', default=False)
+
+
+class RoteadorReplica:
+    def db_for_read(self, model, **hints):
+        # Dentro de uma transação a leitura fica no primário, junto do que ela acabou de gravar
+        if usar_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica é cópia do mesmo banco
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS_REPLICA
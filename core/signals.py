@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .conformidade import atualizar_pendencias
+from . import cache_dados
+from . import imagens
+from . import resumo_advertencias
+from . import vencimentos
+from .middleware import invalidar_empresa, invalidar_usuarios
+from .models import (
+    Empresa, PerfilUsuario, Funcionario, Setor, Advertencia,
+    ControleVacina, EntregaEPI, TreinamentoFuncionario, FotoInspecao, ArquivoInspecao,
+    TipoAdvertencia, Extintor, InspecaoExtintor, Equipamento, InspecaoEquipamento, Localizacao, EPI,
+    NormaRegulamentadora, TipoEPI, Vacina
+)
+
+
+@receiver([post_save, post_delete], sender=Empresa)
+def invalidar_cache_empresa(sender, instance, **kwargs):
+    invalidar_empresa(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_cache_perfil(sender, instance, **kwargs):
+    invalidar_usuarios([instance.usuario_id])
+
+
+# --- CONFORMIDADE: recalcula só a linha do funcionário afetado ---
+
+@receiver(post_save, sender=Funcionario)
+def conformidade_funcionario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_pendencias(instance.empresa_id, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ControleVacina)
+@receiver([post_save, post_delete], sender=EntregaEPI)
+@receiver([post_save, post_delete], sender=TreinamentoFuncionario)
+def conformidade_prontuario(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    empresa_id = Funcionario.objects.filter(pk=instance.funcionario_id).values_list('empresa_id', flat=True).first()
+    if empresa_id:
+        atualizar_pendencias(empresa_id, [instance.funcionario_id])
+
+
+# Campo do Setor que liga cada exigência
+CAMPO_EXIGENCIA = {Vacina: 'vacinas_padrao', TipoEPI: 'epis_obrigatorios', NormaRegulamentadora: 'nrs_obrigatorias'}
+
+
+def _setores_que_exigem(exigencia):
+    return list(Setor.objects.filter(**{CAMPO_EXIGENCIA[type(exigencia)]: exigencia.pk}).values_list('pk', flat=True))
+
+
+def _recalcular_setores(setor_ids):
+    """Pendências dos funcionários desses setores (de qualquer empresa: as NRs são compartilhadas)"""
+    por_empresa = defaultdict(list)
+    for empresa_id, pk in Funcionario.objects.filter(setor_id__in=setor_ids).values_list('empresa_id', 'pk'):
+        por_empresa[empresa_id].append(pk)
+    for empresa_id, funcionario_ids in por_empresa.items():
+        atualizar_pendencias(empresa_id, funcionario_ids)
+
+
+@receiver(m2m_changed, sender=Setor.vacinas_padrao.through)
+@receiver(m2m_changed, sender=Setor.epis_obrigatorios.through)
+@receiver(m2m_changed, sender=Setor.nrs_obrigatorias.through)
+def conformidade_setor(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            atualizar_pendencias(instance.empresa_id, list(instance.funcionario_set.values_list('pk', flat=True)))
+        return
+    # Pelo lado da exigência (vacina.setor_set.add(...)): pk_set são os setores; no clear, só antes de limpar
+    if action == 'pre_clear':
+        instance._setores_conformidade = _setores_que_exigem(instance)
+    elif action in ('post_add', 'post_remove'):
+        _recalcular_setores(pk_set)
+    elif action == 'post_clear':
+        _recalcular_setores(getattr(instance, '_setores_conformidade', []))
+
+
+# Exigência apagada: as linhas do M2M somem em cascata sem m2m_changed
+@receiver(pre_delete, sender=Vacina)
+@receiver(pre_delete, sender=TipoEPI)
+@receiver(pre_delete, sender=NormaRegulamentadora)
+def conformidade_exigencia_antes(sender, instance, **kwargs):
+    instance._setores_conformidade = _setores_que_exigem(instance)
+
+
+@receiver(post_delete, sender=Vacina)
+@receiver(post_delete, sender=TipoEPI)
+@receiver(post_delete, sender=NormaRegulamentadora)
+def conformidade_exigencia_apagada(sender, instance, **kwargs):
+    _recalcular_setores(getattr(instance, '_setores_conformidade', []))
+
+
+# --- RESUMO DE ADVERTÊNCIAS: +1 ao registrar, -1 ao apagar ---
+
+@receiver(pre_save, sender=Advertencia)
+def resumo_advertencia_antes(sender, instance, raw=False, **kwargs):
+    instance._chave_resumo = None
+    if instance.pk and not raw:
+        antiga = Advertencia.objects.filter(pk=instance.pk).first()
+        instance._chave_resumo = resumo_advertencias.chave(antiga) if antiga else None
+
+
+@receiver(post_save, sender=Advertencia)
+def resumo_advertencia_salva(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    nova = resumo_advertencias.chave(instance)
+    antiga = getattr(instance, '_chave_resumo', None)
+    if created or antiga is None:
+        resumo_advertencias.somar(nova, 1)
+    elif antiga != nova:
+        resumo_advertencias.somar(antiga, -1)
+        resumo_advertencias.somar(nova, 1)
+
+
+@receiver(pre_delete, sender=Advertencia)
+def resumo_advertencia_apagada(sender, instance, **kwargs):
+    # pre_delete: numa exclusão em cascata o funcionário ainda existe para resolver o setor
+    resumo_advertencias.somar(resumo_advertencias.chave(instance), -1)
+
+
+# --- FOTOS DE INSPEÇÃO: miniaturas geradas fora da requisição ---
+
+@receiver(post_save, sender=FotoInspecao)
+@receiver(post_save, sender=ArquivoInspecao)
+def agendar_variantes(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        imagens.agendar(instance)
+
+
+# --- VENCIMENTOS: registro apagado não espera a próxima varredura para perder o alerta ---
+
+@receiver(post_delete, sender=ControleVacina)
+@receiver(post_delete, sender=TreinamentoFuncionario)
+@receiver(post_delete, sender=EPI)
+@receiver(post_delete, sender=EntregaEPI)
+@receiver(post_delete, sender=Extintor)
+@receiver(post_delete, sender=Equipamento)
+def vencimentos_apagado(sender, instance, **kwargs):
+    vencimentos.remover_alertas(instance)
+
+
+# --- VERSÃO DOS DADOS DA EMPRESA: cache dos dashboards e ETag das telas (core.cache_dados) ---
+# Só os modelos que aparecem nas telas em cache, cada um com sender: um receiver sem sender
+# tiraria o fast delete (DELETE direto, sem carregar as linhas) de todos os modelos.
+
+@receiver([post_save, post_delete], sender=Funcionario)
+@receiver([post_save, post_delete], sender=Setor)
+@receiver([post_save, post_delete], sender=Advertencia)
+@receiver([post_save, post_delete], sender=TipoAdvertencia)
+@receiver([post_save, post_delete], sender=Extintor)
+@receiver([post_save, post_delete], sender=InspecaoExtintor)
+@receiver([post_save, post_delete], sender=FotoInspecao)
+@receiver([post_save, post_delete], sender=Equipamento)
+@receiver([post_save, post_delete], sender=InspecaoEquipamento)
+@receiver([post_save, post_delete], sender=ArquivoInspecao)
+@receiver([post_save, post_delete], sender=Localizacao)
+def versao_dados_empresa(sender, instance, raw=False, **kwargs):
+    # A inspeção muda ultima_inspecao do extintor com update(): a página do extintor depende das duas tabelas
+    if not raw:
+        cache_dados.registrar_alteracao(cache_dados.empresa_de(instance), sender)
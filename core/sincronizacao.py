@@ -0,0 +1,202 @@
+"""
+Sincronização em lote das inspeções feitas sem sinal.
+
+O inspetor percorre subsolos e casas de máquinas sem rede; o celular guarda cada
+inspeção com uma chave UUID gerada no aparelho e, quando volta a ter sinal, envia tudo
+num único POST (sincronizar_inspecoes) junto com o token da última sincronização:
+
+    {"token": "...",
+     "inspecoes_extintor": [{"chave": "<uuid>", "extintor": 12, "data_inspecao": "2026-10-02",
+                             "lacre_intacto": true, ..., "fotos": ["<id do upload>"]}],
+     "inspecoes_equipamento": [{"chave": "<uuid>", "equipamento": 7, ..., "arquivos": [...]}]}
+
+Fotos e arquivos são ids de uploads em partes já concluídos (core.uploads). Cada registro
+passa pelo mesmo formulário da tela; se algum falhar nada é gravado. Os válidos entram
+numa transação com bulk_create e chaves já recebidas são ignoradas, então reenviar o
+lote depois de uma queda não duplica inspeções. Os .part dos uploads só vão para o media
+no commit: um lote desfeito pode ser reenviado com os mesmos uploads. A resposta traz os
+extintores alterados desde o token e o token novo.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache_dados, imagens, uploads
+from .forms import InspecaoEquipamentoForm, InspecaoExtintorForm
+from .models import (
+    ArquivoInspecao, Equipamento, Extintor, FotoInspecao, InspecaoEquipamento, InspecaoExtintor
+)
+
+LIMITE_LOTE = 500
+
+# Releitura a cada sync: pega alterações de transações que ainda não tinham feito commit
+# quando o token anterior foi emitido. Repetir um extintor é inofensivo para o aparelho.
+SOBREPOSICAO = timedelta(seconds=30)
+
+CAMPOS_EXTINTOR = [
+    'id', 'codigo_patrimonial', 'numero_serie', 'classe', 'agente', 'capacidade', 'situacao',
+    'data_proxima_manutencao', 'data_teste_hidrostatico', 'ultima_inspecao', 'sinalizacao_ok',
+    'acesso_livre', 'atualizado_em',
+]
+
+# (chave no JSON, modelo, formulário, campo do item inspecionado, modelo do item,
+#  chave dos anexos no JSON, campo de uploads do formulário, modelo do anexo, campo do arquivo)
+TIPOS = [
+    ('inspecoes_extintor', InspecaoExtintor, InspecaoExtintorForm, 'extintor', Extintor,
+     'fotos', 'fotos_enviadas', FotoInspecao, 'imagem'),
+    ('inspecoes_equipamento', InspecaoEquipamento, InspecaoEquipamentoForm, 'equipamento', Equipamento,
+     'arquivos', 'arquivos_enviados', ArquivoInspecao, 'arquivo'),
+]
+
+
+class ErroSincronizacao(Exception):
+    def __init__(self, erros):
+        self.erros = erros
+        super().__init__(f"{len(erros)} registro(s) com erro.")
+
+
+def _chave(valor):
+    try:
+        return uuid.UUID(str(valor))
+    except ValueError:
+        return None
+
+
+def _validar(empresa, usuario, tipo, registros, erros, ignoradas, uploads_usados):
+    """[(inspeção não salva, uploads)] dos registros novos do tipo; problemas vão para `erros`"""
+    chave_json, modelo, formulario, campo_item, modelo_item, chave_anexos, campo_enviados, _, _ = tipo
+    # Itens travados antes de procurar as chaves: um reenvio simultâneo do mesmo lote espera
+    # este terminar e então enxerga as chaves já gravadas
+    itens = modelo_item.objects.select_for_update().filter(
+        empresa=empresa, pk__in=[r.get(campo_item) for r in registros if isinstance(r.get(campo_item), int)]
+    ).order_by('pk').in_bulk()
+    chaves = [_chave(registro.get('chave')) for registro in registros]
+    recebidas = set(modelo.objects.filter(chave_cliente__in=[c for c in chaves if c])
+                    .values_list('chave_cliente', flat=True))
+
+    novos = []
+    for registro, chave in zip(registros, chaves):
+        if chave is None:
+            erros.append({'tipo': chave_json, 'chave': str(registro.get('chave')), 'erros': {'chave': ['UUID inválido.']}})
+            continue
+        if chave in recebidas:
+            ignoradas.append(str(chave))
+            continue
+        recebidas.add(chave)
+        item = itens.get(registro.get(campo_item))
+        if item is None:
+            erros.append({'tipo': chave_json, 'chave': str(chave), 'erros': {campo_item: ['Não encontrado.']}})
+            continue
+
+        dados = dict(registro)
+        dados.setdefault('responsavel', usuario.get_username())
+        dados[campo_enviados] = registro.get(chave_anexos) or []
+        form = formulario(empresa.pk, dados)
+        if not form.is_valid():
+            erros.append({'tipo': chave_json, 'chave': str(chave),
+                          'erros': {campo: [str(msg) for msg in msgs] for campo, msgs in form.errors.items()}})
+            continue
+        anexos = list(form.cleaned_data[campo_enviados])
+        if uploads_usados.intersection(upload.pk for upload in anexos):
+            erros.append({'tipo': chave_json, 'chave': str(chave), 'erros': {chave_anexos: ['Upload usado em outra inspeção.']}})
+            continue
+        uploads_usados.update(upload.pk for upload in anexos)
+
+        inspecao = form.save(commit=False)
+        setattr(inspecao, campo_item, item)
+        inspecao.chave_cliente = chave
+        novos.append((inspecao, anexos))
+    return novos
+
+
+def _gravar(tipo, novos):
+    _, modelo, _, _, _, _, _, modelo_anexo, campo_arquivo = tipo
+    # bulk_create não passa por InspecaoExtintor.save(): a última inspeção é atualizada em _atualizar_extintores
+    modelo.objects.bulk_create([inspecao for inspecao, _ in novos], batch_size=LIMITE_LOTE)
+    anexos = []
+    for inspecao, enviados in novos:
+        for upload in enviados:
+            anexo = modelo_anexo(inspecao=inspecao)
+            # O .part só vai para o upload_to no commit: se o lote desfizer, o reenvio encontra os uploads
+            uploads.anexar_no_commit(upload, anexo, campo_arquivo)
+            anexos.append(anexo)
+    modelo_anexo.objects.bulk_create(anexos, batch_size=LIMITE_LOTE)
+    for anexo in anexos:
+        # Sem post_save no bulk_create: agenda as miniaturas como o signal faria (depois de mover o arquivo)
+        imagens.agendar(anexo)
+
+
+def _atualizar_extintores(inspecoes):
+    """Mesmo efeito do save() + registrar_inspecao, com um bulk_update para o lote"""
+    mais_recente = {}
+    for inspecao in inspecoes:
+        atual = mais_recente.get(inspecao.extintor_id)
+        if atual is None or inspecao.data_inspecao >= atual.data_inspecao:
+            mais_recente[inspecao.extintor_id] = inspecao
+
+    agora = timezone.now()
+    alterados = []
+    for inspecao in mais_recente.values():
+        extintor = inspecao.extintor
+        # Uma inspeção antiga que só sincronizou agora não sobrescreve o estado atual
+        if extintor.ultima_inspecao and inspecao.data_inspecao < extintor.ultima_inspecao:
+            continue
+        extintor.ultima_inspecao = inspecao.data_inspecao
+        extintor.sinalizacao_ok = inspecao.sinalizacao_visivel
+        extintor.acesso_livre = inspecao.acesso_livre
+        extintor.atualizado_em = agora
+        alterados.append(extintor)
+    Extintor.objects.bulk_update(
+        alterados, ['ultima_inspecao', 'sinalizacao_ok', 'acesso_livre', 'atualizado_em'], batch_size=LIMITE_LOTE
+    )
+
+
+def alteracoes(empresa, token):
+    """Extintores alterados desde o token (todos, sem token ou com token inválido) e o token novo"""
+    agora = timezone.now()
+    extintores = Extintor.objects.filter(empresa=empresa)
+    try:
+        desde = parse_datetime(token) if token else None
+    except (TypeError, ValueError):
+        desde = None
+    alterados = extintores.filter(atualizado_em__gt=desde - SOBREPOSICAO) if desde else extintores
+    resposta = {
+        'token': agora.isoformat(),
+        'extintores': list(alterados.order_by('pk').values(*CAMPOS_EXTINTOR, localizacao_nome=F('localizacao__nome'))),
+    }
+    if desde:
+        # Sem exclusão lógica no modelo: a lista de ids deixa o aparelho descartar os removidos
+        resposta['ids_extintores'] = list(extintores.order_by('pk').values_list('pk', flat=True))
+    return resposta
+
+
+def sincronizar(empresa, usuario, dados):
+    """Aplica o lote inteiro ou nada. Levanta ErroSincronizacao com a lista de problemas"""
+    lotes = [(tipo, dados.get(tipo[0]) or []) for tipo in TIPOS]
+    if any(not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros) for _, registros in lotes):
+        raise ErroSincronizacao([{'erros': {'__all__': ['Formato inválido: listas de objetos esperadas.']}}])
+    if sum(len(registros) for _, registros in lotes) > LIMITE_LOTE:
+        raise ErroSincronizacao([{'erros': {'__all__': [f'No máximo {LIMITE_LOTE} inspeções por sincronização.']}}])
+
+    erros, ignoradas, uploads_usados = [], [], set()
+    with transaction.atomic():
+        validados = [(tipo, _validar(empresa, usuario, tipo, registros, erros, ignoradas, uploads_usados))
+                     for tipo, registros in lotes]
+        if erros:
+            raise ErroSincronizacao(erros)
+        aplicadas = {}
+        for tipo, novos in validados:
+            _gravar(tipo, novos)
+            aplicadas[tipo[0]] = [str(inspecao.chave_cliente) for inspecao, _ in novos]
+        _atualizar_extintores([inspecao for inspecao, _ in validados[0][1]])
+        if any(novos for _, novos in validados):
+            cache_dados.registrar_alteracao(empresa.pk, Extintor, InspecaoExtintor, FotoInspecao,
+                                            InspecaoEquipamento, ArquivoInspecao)
+
+    resposta = {'aplicadas': aplicadas, 'ignoradas': ignoradas}
+    resposta.update(alteracoes(empresa, dados.get('token')))
+    return resposta
@@ -1,3 +1,642 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from core import estoque, importacao, paginacao, resumo_advertencias, sincronizacao, uploads
+from core.middleware import COOKIE_PRIMARIO, resolver_empresa
+from core.management.commands import medir_views
+from core.management.commands.medir_views import IGNORADAS, ORCAMENTO_PADRAO, ORCAMENTOS, rotas, url_exemplo
+from core.models import (
+    Empresa, FotoInspecao, Afastamento, Funcionario, PerfilUsuario, TipoEPI, Localizacao, EPI, EntregaEPI,
+    MovimentoEstoque, SaldoEstoque, Setor, TipoAdvertencia, Advertencia, ResumoAdvertencia, Extintor,
+    InspecaoExtintor, UploadParcial, Vacina, NormaRegulamentadora, PendenciaConformidade
+)
+from core.roteador import ALIAS_REPLICA, usar_replica
+
+# Empresas semeadas como no medir_views, pequenas para o teste rodar em segundos
+TAMANHO_PEQUENO = 5
+TAMANHO_GRANDE = 40
+
+
+def nova_empresa(nome='Empresa'):
+    """(usuário admin, empresa) vazios"""
+    empresa = Empresa.objects.create(
+        nome_fantasia=nome, razao_social=nome, cnpj=uuid.uuid4().hex[:18],
+        telefone='-', email_contato='teste@example.com', endereco='-',
+    )
+    usuario = User.objects.create_user(f'teste_{uuid.uuid4().hex[:12]}')
+    PerfilUsuario.objects.create(usuario=usuario, empresa=empresa, is_admin=True)
+    return usuario, empresa
+
+
+class MidiaTemporariaMixin:
+    """MEDIA_ROOT (e a pasta dos uploads parciais) num diretório descartável"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.midia = tempfile.mkdtemp(prefix='tests_core_')
+        cls.midia_settings = override_settings(
+            MEDIA_ROOT=cls.midia, UPLOADS_PARCIAIS_DIR=cls.midia + '/parciais', IMAGENS_EM_SEGUNDO_PLANO=False,
+        )
+        cls.midia_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.midia_settings.disable()
+        shutil.rmtree(cls.midia, ignore_errors=True)
+
+
+class OrcamentoConsultasTests(TestCase):
+    """Cada view GET cabe no orçamento de consultas e não cresce com a empresa (N+1).
+
+    Mesmos critérios do comando medir_views: a primeira requisição, com os caches vazios,
+    e a repetida, com eles cheios.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.midia = tempfile.mkdtemp(prefix='tests_core_')
+        cls.isolamento = medir_views.isolamento(cls.midia)
+        cls.isolamento.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.isolamento.disable()
+        shutil.rmtree(cls.midia, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        comando = medir_views.Command()
+        cls.pequena = comando.semear(TAMANHO_PEQUENO)
+        cls.grande = comando.semear(TAMANHO_GRANDE)
+
+    def cliente(self, empresa):
+        usuario, _ = empresa
+        cliente = Client(raise_request_exception=False)
+        cliente.force_login(usuario)
+        return cliente
+
+    def consultas(self, cliente, url):
+        """(consultas da primeira requisição com caches vazios, consultas da repetida, status)"""
+        for cache in caches.all():
+            cache.clear()
+        contagens = []
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as capturadas:
+                resposta = self.consumir(cliente.get(url))
+            contagens.append(len(capturadas))
+        return contagens[0], contagens[1], resposta.status_code
+
+    def rotas_medidas(self):
+        for nome, padrao, rota in rotas():
+            if nome in IGNORADAS:
+                continue
+            url_pequena = url_exemplo(nome, padrao, rota, self.pequena[1])
+            if url_pequena is not None:
+                yield nome, url_pequena, url_exemplo(nome, padrao, rota, self.grande[1])
+
+    def test_orcamento_e_crescimento(self):
+        pequena, grande = self.cliente(self.pequena), self.cliente(self.grande)
+        for nome, url_pequena, url_grande in self.rotas_medidas():
+            with self.subTest(view=nome):
+                fria, repetida, status = self.consultas(pequena, url_pequena)
+                self.assertLess(status, 500)
+                orcamento = ORCAMENTOS.get(nome, ORCAMENTO_PADRAO)
+                self.assertLessEqual(fria, orcamento, 'primeira requisição acima do orçamento')
+                self.assertLessEqual(repetida, orcamento, 'requisição repetida acima do orçamento')
+
+                # Mesmas consultas com 8x mais registros
+                for cache in caches.all():
+                    cache.clear()
+                with self.assertNumQueries(fria):
+                    self.consumir(grande.get(url_grande))
+                with self.assertNumQueries(repetida):
+                    self.consumir(grande.get(url_grande))
+
+    def consumir(self, resposta):
+        if resposta.streaming:
+            b''.join(resposta.streaming_content)
+        return resposta
+
+
+def jpeg():
+    saida = BytesIO()
+    Image.new('RGB', (8, 8)).save(saida, 'JPEG')
+    return saida.getvalue()
+
+
+class UploadsTests(MidiaTemporariaMixin, TestCase):
+    """Upload em partes só aceita as extensões previstas e conteúdo que o campo de destino aceita"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, cls.empresa = nova_empresa()
+
+    def enviar(self, nome, conteudo):
+        upload = uploads.iniciar(self.empresa, self.usuario, nome, len(conteudo))
+        return uploads.receber_parte(upload, 0, BytesIO(conteudo), len(conteudo))
+
+    def test_extensao_fora_da_lista(self):
+        for nome in ('pagina.html', 'desenho.svg', 'sem_extensao'):
+            with self.subTest(nome=nome), self.assertRaises(uploads.ErroUpload) as erro:
+                uploads.iniciar(self.empresa, self.usuario, nome, 10)
+            self.assertEqual(erro.exception.status, 415)
+
+    def test_conteudo_validado_para_o_campo(self):
+        html = b'<html><script>alert(1)</script></html>'
+        for nome, modelo, campo in [('foto.jpg', FotoInspecao, 'imagem'), ('laudo.pdf', Afastamento, 'laudo'),
+                                    ('laudo.png', Afastamento, 'laudo')]:
+            with self.subTest(nome=nome):
+                upload = self.enviar(nome, html)
+                with self.assertRaises(uploads.ErroUpload):
+                    with uploads.anexo(upload, modelo, campo):
+                        pass
+        uploads.validar(self.enviar('foto.jpg', jpeg()), FotoInspecao, 'imagem')
+        uploads.validar(self.enviar('laudo.pdf', b'%PDF-1.4\n'), Afastamento, 'laudo')
+
+
+@override_settings(CACHE_EMPRESA_USUARIO=True)
+class ResolverEmpresaTests(TestCase):
+    """Vínculo usuário -> empresa em cache, trocado no commit da alteração do perfil ou da empresa"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, cls.empresa = nova_empresa('A')
+        _, cls.outra = nova_empresa('B')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_cache_e_mudanca_de_empresa(self):
+        self.assertEqual(resolver_empresa(self.usuario), self.empresa)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver_empresa(self.usuario), self.empresa)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PerfilUsuario.objects.filter(usuario=self.usuario).update(empresa=self.outra)
+            perfil = PerfilUsuario.objects.get(usuario=self.usuario)
+            perfil.save()
+            # Antes do commit a versão não muda
+            self.assertEqual(resolver_empresa(self.usuario), self.empresa)
+        self.assertEqual(resolver_empresa(self.usuario), self.outra)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            perfil.delete()
+        self.assertIsNone(resolver_empresa(self.usuario))
+
+    def test_alteracao_da_empresa(self):
+        resolver_empresa(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empresa.nome_fantasia = 'A renomeada'
+            self.empresa.save()
+        self.assertEqual(resolver_empresa(self.usuario).nome_fantasia, 'A renomeada')
+
+
+class ReplicaLeituraTests(TransactionTestCase):
+    """Views de consulta leem da réplica; depois de um POST, do primário; exportações, durante o streaming.
+
+    TransactionTestCase: o roteador mantém no primário toda leitura dentro de atomic, e o
+    TestCase roda cada teste dentro de um. Sem DB_REPLICA_HOST a réplica é criada aqui como
+    espelho do banco de teste (TEST.MIRROR), numa conexão própria: as consultas de cada
+    alias são contadas separadamente.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bancos_originais = connections.settings
+        if ALIAS_REPLICA not in connections.settings:
+            replica = {**connections[DEFAULT_DB_ALIAS].settings_dict}
+            replica['TEST'] = {**replica['TEST'], 'MIRROR': DEFAULT_DB_ALIAS}
+            bancos = {**connections.settings, ALIAS_REPLICA: replica}
+            cls.bancos = override_settings(DATABASES=bancos)
+            cls.bancos.enable()
+            connections.settings = bancos
+        # Só agora o alias existe: declarado na classe, o runner o procuraria antes de setUpClass
+        cls.databases = {DEFAULT_DB_ALIAS, ALIAS_REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if connections.settings is not cls.bancos_originais:
+            connections[ALIAS_REPLICA].close()
+            del connections[ALIAS_REPLICA]
+            connections.settings = cls.bancos_originais
+            cls.bancos.disable()
+
+    def setUp(self):
+        usuario, self.empresa = nova_empresa()
+        Funcionario.objects.create(empresa=self.empresa, nome='Ana', cpf='11122233344', cargo='Operadora',
+                                   data_admissao='2024-01-02')
+        self.cliente = Client()
+        self.cliente.force_login(usuario)
+
+    def consultas_funcionario(self, capturadas):
+        return [q['sql'] for q in capturadas if 'core_funcionario' in q['sql']]
+
+    def medir(self, requisicao):
+        """(resposta consumida, consultas a core_funcionario na réplica, no primário)"""
+        with CaptureQueriesContext(connections[ALIAS_REPLICA]) as replica, \
+                CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primario:
+            resposta = requisicao()
+            if resposta.streaming:
+                resposta.conteudo = b''.join(resposta.streaming_content)
+        return resposta, self.consultas_funcionario(replica), self.consultas_funcionario(primario)
+
+    def test_view_de_consulta_le_da_replica(self):
+        resposta, replica, primario = self.medir(lambda: self.cliente.get(reverse('lista_funcionarios')))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(replica)
+        self.assertEqual(primario, [])
+
+    def test_depois_do_post_le_do_primario(self):
+        resposta = self.cliente.post(reverse('criar_setor'), {'nome': 'Manutenção'})
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+        resposta, replica, primario = self.medir(lambda: self.cliente.get(reverse('lista_funcionarios')))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(replica, [])
+        self.assertTrue(primario)
+
+    def test_exportacao_le_da_replica_durante_o_streaming(self):
+        resposta, replica, primario = self.medir(lambda: self.cliente.get(reverse('exportar_funcionarios')))
+        self.assertTrue(resposta.streaming)
+        self.assertIn(b'Ana', resposta.conteudo)
+        self.assertTrue(replica)
+        self.assertEqual(primario, [])
+        self.assertFalse(usar_replica.get())
+
+
+def inicio_mes(deslocamento):
+    """Primeiro dia do mês `deslocamento` meses a partir do atual"""
+    hoje = timezone.localdate()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 + deslocamento, 12)
+    return date(ano, mes + 1, 1)
+
+
+class EstoqueTests(TestCase):
+    """Livro de movimentos do estoque de EPIs, saldo com F() e fechamentos mensais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, cls.empresa = nova_empresa()
+        tipo = TipoEPI.objects.create(empresa=cls.empresa, nome='Luva')
+        local = Localizacao.objects.create(empresa=cls.empresa, nome='Almoxarifado')
+        cls.epis = [
+            EPI.objects.create(empresa=cls.empresa, tipo=tipo, local=local, codigo_unico=f'EPI-{i}', tamanho='M',
+                               ca=f'1000{i}', data_validade=date.today() + timedelta(days=365))
+            for i in range(2)
+        ]
+        cls.funcionarios = [
+            Funcionario.objects.create(empresa=cls.empresa, nome=f'Funcionário {i}', cpf=f'0000000000{i}',
+                                       cargo='Operador', data_admissao=date(2024, 1, 2))
+            for i in range(3)
+        ]
+
+    def saldo(self, epi):
+        return EPI.objects.get(pk=epi.pk).quantidade
+
+    def livro(self, epi):
+        return list(MovimentoEstoque.objects.filter(epi=epi).order_by('pk').values_list('quantidade', 'saldo_apos'))
+
+    def test_entradas_e_saidas(self):
+        epi = self.epis[0]
+        estoque.movimentar(epi, 'ENTRADA', 10, usuario=self.usuario)
+        entrega = estoque.entregar(EntregaEPI(funcionario=self.funcionarios[0], epi=epi, quantidade=3))
+        estoque.devolver(entrega)
+        estoque.movimentar(epi, 'AJUSTE', -2)
+        self.assertEqual(self.saldo(epi), 8)
+        self.assertEqual(self.livro(epi), [(10, 10), (-3, 7), (3, 10), (-2, 8)])
+
+        estoque.entregar_kit(self.empresa.pk, self.funcionarios, [(epi, 2)], date.today())
+        self.assertEqual(self.saldo(epi), 2)
+        self.assertEqual(self.livro(epi)[-3:], [(-2, 6), (-2, 4), (-2, 2)])
+        self.assertEqual(EntregaEPI.objects.filter(epi=epi).count(), 4)
+
+    def test_estoque_negativo_recusado(self):
+        epi, outro = self.epis
+        estoque.movimentar(epi, 'ENTRADA', 5)
+        estoque.movimentar(outro, 'ENTRADA', 100)
+        with self.assertRaises(estoque.EstoqueInsuficiente):
+            estoque.movimentar(epi, 'ENTREGA', 6)
+        # Kit: 3 funcionários x 2 = 6 > 5; nada do kit é gravado, nem do EPI que tinha saldo
+        with self.assertRaises(estoque.EstoqueInsuficiente):
+            estoque.entregar_kit(self.empresa.pk, self.funcionarios, [(outro, 1), (epi, 2)], date.today())
+        self.assertEqual((self.saldo(epi), self.saldo(outro)), (5, 100))
+        self.assertEqual(MovimentoEstoque.objects.filter(empresa=self.empresa).count(), 2)
+        self.assertFalse(EntregaEPI.objects.exists())
+
+    def test_movimento_imutavel(self):
+        movimento = estoque.movimentar(self.epis[0], 'ENTRADA', 1)
+        movimento.quantidade = 1000
+        with self.assertRaises(ValueError):
+            movimento.save()
+        self.assertEqual(MovimentoEstoque.objects.get(pk=movimento.pk).quantidade, 1)
+
+    def test_saldos_em_bate_com_o_livro_inteiro(self):
+        def instante(deslocamento, dia, hora):
+            return timezone.make_aware(datetime.combine(inicio_mes(deslocamento).replace(day=dia), time(hora)))
+
+        # Movimentos espalhados por três meses encerrados e pelo primeiro dia do mês atual
+        for i, (deslocamento, dia, hora) in enumerate([(-3, 5, 9), (-3, 28, 23), (-2, 1, 0), (-2, 15, 8),
+                                                       (-2, 15, 14), (-2, 27, 10), (-1, 10, 12), (0, 1, 0)]):
+            for epi in self.epis:
+                MovimentoEstoque.objects.create(
+                    empresa=self.empresa, epi=epi, tipo='ENTRADA' if i % 3 else 'AJUSTE',
+                    quantidade=(i + 1) * (epi.pk % 7 + 1), saldo_apos=0, data=instante(deslocamento, dia, hora),
+                )
+
+        def reproduzir(momento):
+            saldos = {}
+            for epi_id, quantidade in MovimentoEstoque.objects.filter(empresa=self.empresa, data__lt=momento) \
+                    .values_list('epi_id', 'quantidade'):
+                saldos[epi_id] = saldos.get(epi_id, 0) + quantidade
+            return saldos
+
+        momentos = [instante(-3, 20, 0), instante(-2, 15, 12), instante(-1, 1, 0), instante(-1, 20, 0), timezone.now()]
+        for momento in momentos:
+            self.assertEqual(estoque.saldos_em(self.empresa.pk, momento), reproduzir(momento))
+        self.assertEqual(estoque.fechar_saldos(self.empresa.pk), 3)
+        self.assertEqual(SaldoEstoque.objects.filter(empresa=self.empresa).count(), 6)
+        for momento in momentos:
+            with self.subTest(momento=momento):
+                self.assertEqual(estoque.saldos_em(self.empresa.pk, momento), reproduzir(momento))
+        self.assertEqual(estoque.fechar_saldos(self.empresa.pk), 0)
+
+
+class ImportacaoAdvertenciasTests(TestCase):
+    """Reincidência calculada sobre o histórico todo, em ordem de data, mesmo com planilha mais antiga"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.empresa = nova_empresa()
+        setor = Setor.objects.create(empresa=cls.empresa, nome='Produção')
+        cls.funcionarios = [
+            Funcionario.objects.create(empresa=cls.empresa, nome=f'Funcionário {i}', cpf=f'1234567890{i}',
+                                       cargo='Operador', setor=setor if i else None, data_admissao=date(2020, 1, 2))
+            for i in range(3)
+        ]
+        atraso = TipoAdvertencia.objects.create(empresa=cls.empresa, titulo='Atraso')
+        epi = TipoAdvertencia.objects.create(empresa=cls.empresa, titulo='Sem EPI')
+        # Histórico já gravado pelo formulário, todo em 2025
+        for funcionario, tipo, data in [(0, atraso, date(2025, 3, 10)), (0, atraso, date(2025, 5, 2)),
+                                        (1, atraso, date(2025, 4, 1)), (1, epi, date(2025, 6, 20)),
+                                        (2, epi, date(2025, 1, 15))]:
+            Advertencia.objects.create(empresa=cls.empresa, funcionario=cls.funcionarios[funcionario], tipo=tipo,
+                                       data_incidente=data)
+
+    def test_planilha_anterior_ao_historico(self):
+        cpf = [funcionario.cpf for funcionario in self.funcionarios]
+        planilha = [
+            {'cpf': cpf[0], 'motivo': 'Atraso', 'data': '10/01/2024'},
+            {'cpf': cpf[0], 'motivo': 'atraso', 'data': '2024-01-10'},     # mesmo dia da anterior
+            {'cpf': cpf[1], 'motivo': 'Atraso', 'data': '01/04/2025'},     # mesmo dia da gravada
+            {'cpf': cpf[1], 'motivo': 'Sem EPI', 'data': '20/02/2024'},
+            {'cpf': cpf[2], 'motivo': 'Sem EPI', 'data': '15/01/2026'},    # depois da gravada
+            {'cpf': cpf[2], 'motivo': 'Briga', 'data': '01/08/2023'},      # motivo novo
+            {'cpf': cpf[2], 'motivo': 'Briga', 'data': '01/07/2023'},
+        ]
+        resultado = importacao.importar_advertencias(self.empresa, enumerate(planilha, start=2))
+        self.assertEqual(resultado.erros, [])
+        self.assertEqual(resultado.criados, len(planilha))
+
+        primeiras = {}
+        for funcionario_id, tipo_id, data, reincidente in (Advertencia.objects.filter(empresa=self.empresa)
+                                                           .values_list('funcionario_id', 'tipo_id',
+                                                                        'data_incidente', 'reincidente')):
+            primeiras.setdefault((funcionario_id, tipo_id), []).append((data, reincidente))
+        self.assertEqual(len(primeiras), 5)
+        for par, advertencias in primeiras.items():
+            with self.subTest(par=par):
+                nao_reincidentes = [data for data, reincidente in advertencias if not reincidente]
+                self.assertEqual(len(nao_reincidentes), 1)
+                self.assertEqual(nao_reincidentes[0], min(data for data, _ in advertencias))
+
+        def resumo():
+            return sorted(ResumoAdvertencia.objects.filter(empresa=self.empresa)
+                          .values_list('mes', 'setor_id', 'tipo_id', 'total'), key=str)
+        importado = resumo()
+        resumo_advertencias.reconstruir(self.empresa.pk)
+        self.assertEqual(importado, resumo())
+        self.assertEqual(sum(total for *_, total in importado), Advertencia.objects.filter(empresa=self.empresa).count())
+
+
+class SincronizacaoTests(MidiaTemporariaMixin, TestCase):
+    """Reenviar o mesmo lote não grava nada de novo, inclusive depois de um lote desfeito"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, cls.empresa = nova_empresa()
+        local = Localizacao.objects.create(empresa=cls.empresa, nome='Subsolo')
+        cls.extintor = Extintor.objects.create(
+            empresa=cls.empresa, codigo_patrimonial='EXT-01', numero_serie='1', classe='ABC', agente='PQS',
+            capacidade=6, localizacao=local, classe_risco='Leve', data_ultima_manutencao=date(2026, 1, 5),
+            data_proxima_manutencao=date(2027, 1, 5), data_teste_hidrostatico=date(2030, 1, 5), altura_instalacao=1.6,
+        )
+
+    def setUp(self):
+        self.cliente = Client()
+        self.cliente.force_login(self.usuario)
+        conteudo = jpeg()
+        upload = uploads.iniciar(self.empresa, self.usuario, 'foto.jpg', len(conteudo))
+        self.upload = uploads.receber_parte(upload, 0, BytesIO(conteudo), len(conteudo))
+        self.lote = json.dumps({'inspecoes_extintor': [{
+            'chave': str(uuid.uuid4()), 'extintor': self.extintor.pk, 'data_inspecao': '2026-10-02',
+            'lacre_intacto': True, 'manometro_pressao_ok': True, 'sinalizacao_visivel': True,
+            'acesso_livre': True, 'mangueira_integra': True, 'fotos': [str(self.upload.pk)],
+        }]})
+
+    def sincronizar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.cliente.post(reverse('sincronizar_inspecoes'), self.lote, content_type='application/json')
+
+    def gravado(self):
+        return (InspecaoExtintor.objects.filter(extintor=self.extintor).count(),
+                FotoInspecao.objects.filter(inspecao__extintor=self.extintor).count())
+
+    def test_reenvio_e_ignorado(self):
+        resposta = self.sincronizar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()['aplicadas']['inspecoes_extintor']), 1)
+        foto = FotoInspecao.objects.get(inspecao__extintor=self.extintor)
+        self.assertTrue(os.path.exists(foto.imagem.path))
+        self.assertFalse(UploadParcial.objects.filter(pk=self.upload.pk).exists())
+
+        resposta = self.sincronizar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['aplicadas']['inspecoes_extintor'], [])
+        self.assertEqual(len(resposta.json()['ignoradas']), 1)
+        self.assertEqual(self.gravado(), (1, 1))
+
+    def test_lote_desfeito_mantem_os_uploads(self):
+        with mock.patch.object(sincronizacao, '_atualizar_extintores', side_effect=RuntimeError('queda')):
+            with self.assertRaises(RuntimeError):
+                self.sincronizar()
+        self.assertEqual(self.gravado(), (0, 0))
+        self.assertTrue(os.path.exists(self.upload.caminho))
+        self.assertTrue(UploadParcial.objects.filter(pk=self.upload.pk).exists())
+
+        resposta = self.sincronizar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.gravado(), (1, 1))
+        self.assertTrue(os.path.exists(FotoInspecao.objects.get(inspecao__extintor=self.extintor).imagem.path))
+        self.assertFalse(os.path.exists(self.upload.caminho))
+
+
+class PaginacaoTests(TestCase):
+    """Paginação por cursor com muitos empates na ordenação, nos dois sentidos, e cursor adulterado"""
+    POR_PAGINA = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.empresa = nova_empresa()
+        # 40 funcionários com só 3 nomes e 4 datas: quase toda fronteira de página cai num empate
+        Funcionario.objects.bulk_create([
+            Funcionario(empresa=cls.empresa, nome='ABC'[i % 3], cpf=f'{i:011d}', cargo='Operador',
+                        data_admissao=date(2024, 1, 1) + timedelta(days=i % 4))
+            for i in range(40)
+        ])
+
+    def setUp(self):
+        self.funcionarios = Funcionario.objects.filter(empresa=self.empresa)
+
+    def pagina(self, ordenacao, consulta=''):
+        request = RequestFactory().get('/funcionarios/' + consulta)
+        return paginacao.paginar(request, self.funcionarios, ordenacao, por_pagina=self.POR_PAGINA)
+
+    def pks(self, pagina):
+        return [funcionario.pk for funcionario in pagina]
+
+    def test_ida_e_volta_sem_perder_nem_repetir(self):
+        for ordenacao in (['nome', 'pk'], ['-data_admissao', '-pk'], ['nome', '-data_admissao', 'pk']):
+            with self.subTest(ordenacao=ordenacao):
+                esperado = list(self.funcionarios.order_by(*ordenacao).values_list('pk', flat=True))
+                paginas = [self.pagina(ordenacao)]
+                while paginas[-1].url_proxima:
+                    paginas.append(self.pagina(ordenacao, paginas[-1].url_proxima))
+                self.assertEqual([pk for pagina in paginas for pk in self.pks(pagina)], esperado)
+                self.assertFalse(paginas[0].tem_anterior)
+
+                # Voltando pelos links "anterior" a partir da última página
+                volta = [paginas[-1]]
+                while volta[-1].url_anterior:
+                    volta.append(self.pagina(ordenacao, volta[-1].url_anterior))
+                self.assertEqual([self.pks(pagina) for pagina in reversed(volta)],
+                                 [self.pks(pagina) for pagina in paginas])
+
+    def test_cursor_adulterado_volta_para_a_primeira_pagina(self):
+        ordenacao = ['-data_admissao', '-pk']
+        primeira = self.pks(self.pagina(ordenacao))
+        adulterados = [
+            'nao-e-base64!', paginacao._codificar({'pk': 1}), paginacao._codificar([1]),
+            paginacao._codificar(['não é data', 1]), paginacao._codificar(['2024-01-02', 'x']),
+            paginacao._codificar([[1], None]),
+        ]
+        for parametro in ('apos', 'antes'):
+            for cursor in adulterados:
+                with self.subTest(parametro=parametro, cursor=cursor):
+                    pagina = self.pagina(ordenacao, f'?{parametro}={cursor}')
+                    self.assertEqual(self.pks(pagina), primeira)
+                    self.assertFalse(pagina.tem_anterior)
+
+
+class ImportacaoFuncionariosTests(TestCase):
+    """CPF identifica o funcionário na empresa, com ou sem máscara; uma linha com erro desfaz a planilha toda"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.empresa = nova_empresa()
+        cls.existente = Funcionario.objects.create(empresa=cls.empresa, nome='Ana', cpf='12345678901',
+                                                   cargo='Operadora', data_admissao=date(2020, 1, 2))
+
+    def importar(self, linhas):
+        return importacao.importar_funcionarios(self.empresa, enumerate(linhas, start=2))
+
+    def test_reimportar_cpf_em_outro_formato_atualiza(self):
+        formatos = [('123.456.789-01', 'Supervisora'), ('12345678901', 'Gerente'), (' 123 456 789 01 ', 'Diretora')]
+        for cpf, cargo in formatos:
+            with self.subTest(cpf=cpf):
+                resultado = self.importar([
+                    {'nome': 'Ana Souza', 'cpf': cpf, 'cargo': cargo, 'data_admissao': '02/01/2020'},
+                ])
+                self.assertEqual((resultado.erros, resultado.criados, resultado.atualizados), ([], 0, 1))
+                self.existente.refresh_from_db()
+                self.assertEqual((self.existente.nome, self.existente.cargo), ('Ana Souza', cargo))
+                self.assertEqual(Funcionario.objects.filter(empresa=self.empresa).count(), 1)
+
+        resultado = self.importar([{'nome': 'Bruno', 'cpf': '987.654.321-00', 'cargo': 'Operador',
+                                    'data_admissao': '2024-03-01'}])
+        self.assertEqual((resultado.criados, resultado.atualizados), (1, 0))
+        self.assertEqual(Funcionario.objects.get(empresa=self.empresa, nome='Bruno').cpf, '98765432100')
+
+    def test_linha_com_erro_nao_grava_nada(self):
+        # Mais de um lote (importacao.TAMANHO_LOTE): o primeiro já foi gravado quando o erro aparece
+        linhas = [{'nome': f'Novo {i}', 'cpf': f'{i:011d}', 'cargo': 'Operador', 'data_admissao': '01/02/2024',
+                   'setor': 'Expedição'} for i in range(importacao.TAMANHO_LOTE)]
+        linhas.append({'nome': 'Ana Souza', 'cpf': '123.456.789-01', 'cargo': 'Gerente', 'data_admissao': '01/02/2024',
+                       'setor': 'Expedição'})
+        linhas.append({'nome': 'Errado', 'cpf': '111.222.333-44', 'cargo': 'Operador', 'data_admissao': '31/02/2024',
+                       'setor': 'Expedição'})
+        resultado = self.importar(linhas)
+        self.assertEqual([numero for numero, _ in resultado.erros], [len(linhas) + 1])
+        self.assertEqual((resultado.criados, resultado.atualizados), (0, 0))
+        self.assertEqual(list(Funcionario.objects.filter(empresa=self.empresa)), [self.existente])
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.cargo, 'Operadora')
+        self.assertFalse(Setor.objects.filter(empresa=self.empresa).exists())
+
+
+class ConformidadeSinaisTests(TestCase):
+    """Exigências ligadas pelo lado da vacina/EPI/NR, ou apagadas, recalculam as pendências na hora"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.empresa = nova_empresa()
+        cls.setor = Setor.objects.create(empresa=cls.empresa, nome='Manutenção')
+        for i in range(2):
+            Funcionario.objects.create(empresa=cls.empresa, nome=f'Funcionário {i}', cpf=f'5555555555{i}',
+                                       cargo='Mecânico', setor=cls.setor, data_admissao=date(2024, 1, 2))
+        cls.exigencias = [
+            ('VACINA', Vacina.objects.create(empresa=cls.empresa, nome='Hepatite B')),
+            ('EPI', TipoEPI.objects.create(empresa=cls.empresa, nome='Capacete')),
+            ('NR', NormaRegulamentadora.objects.create(codigo='NR-35', titulo='Trabalho em Altura')),
+        ]
+
+    def pendencias(self, tipo):
+        return PendenciaConformidade.objects.filter(empresa=self.empresa, tipo=tipo).count()
+
+    def test_pelo_lado_da_exigencia(self):
+        for tipo, exigencia in self.exigencias:
+            with self.subTest(tipo=tipo):
+                exigencia.setor_set.add(self.setor)
+                self.assertEqual(self.pendencias(tipo), 2)
+                exigencia.setor_set.remove(self.setor)
+                self.assertEqual(self.pendencias(tipo), 0)
+                exigencia.setor_set.add(self.setor)
+                exigencia.setor_set.clear()
+                self.assertEqual(self.pendencias(tipo), 0)
+
+    def test_exigencia_apagada(self):
+        for tipo, exigencia in self.exigencias:
+            with self.subTest(tipo=tipo):
+                exigencia.setor_set.add(self.setor)
+                self.assertEqual(self.pendencias(tipo), 2)
+                exigencia.delete()
+                self.assertEqual(self.pendencias(tipo), 0)
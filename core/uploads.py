@@ -0,0 +1,230 @@
+"""
+Uploads em partes, retomáveis, para anexos grandes (laudos, CATs, fotos de inspeção).
+
+No campo a conexão do celular cai no meio do envio; com um único POST multipart tudo
+recomeça e o corpo inteiro passa pela memória/temporários do worker. Aqui o cliente cria
+um UploadParcial (nome, tamanho e SHA-256 do arquivo), envia partes com PUT a partir do
+deslocamento que o servidor já tem e, se cair, consulta onde parou e continua dali. Cada
+parte vai direto para o arquivo .part em blocos; ao completar o tamanho o hash do arquivo
+inteiro é conferido. Os formulários recebem só o id do upload concluído e o .part é movido
+para o upload_to do campo no save do modelo.
+
+Nome e extensão vêm do cliente: só as extensões de EXTENSOES entram, e antes de anexar o
+conteúdo passa pelas validações do campo de destino (uma foto tem de abrir no Pillow, um
+PDF tem de começar como PDF), para nada diferente do declarado chegar ao media.
+"""
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadParcial
+
+TAMANHO_BLOCO = 64 * 1024
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Anexos aceitos: fotos e PDF (laudos, CATs, certificados)
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+EXTENSOES = EXTENSOES_IMAGEM | {'.pdf'}
+
+# Uploads não anexados depois disso são apagados (comando limpar_uploads_parciais)
+VALIDADE = timedelta(days=1)
+
+
+class ErroUpload(Exception):
+    def __init__(self, mensagem, status=400):
+        self.status = status
+        super().__init__(mensagem)
+
+
+class ArquivoMontado(File):
+    """O .part com o nome original; temporary_file_path faz o FileSystemStorage mover em vez de copiar"""
+
+    def __init__(self, upload):
+        super().__init__(open(upload.caminho, 'rb'), name=upload.nome_arquivo)
+        self.caminho = upload.caminho
+
+    def temporary_file_path(self):
+        return self.caminho
+
+
+def iniciar(empresa, usuario, nome_arquivo, tamanho, sha256=''):
+    nome_arquivo = os.path.basename(str(nome_arquivo or '').replace('\\', '/'))[:255]
+    sha256 = str(sha256 or '').lower()
+    if not nome_arquivo:
+        raise ErroUpload("Informe o nome do arquivo.")
+    if os.path.splitext(nome_arquivo)[1].lower() not in EXTENSOES:
+        raise ErroUpload(f"Tipo de arquivo não aceito; envie {', '.join(sorted(EXTENSOES))}.", 415)
+    try:
+        tamanho = int(tamanho)
+    except (TypeError, ValueError):
+        raise ErroUpload("Tamanho inválido.")
+    if tamanho <= 0:
+        raise ErroUpload("Tamanho inválido.")
+    if sha256 and not SHA256_RE.match(sha256):
+        raise ErroUpload("SHA-256 inválido.")
+
+    upload = UploadParcial.objects.create(
+        empresa=empresa, usuario=usuario, nome_arquivo=nome_arquivo, tamanho=tamanho, sha256=sha256,
+    )
+    os.makedirs(settings.UPLOADS_PARCIAIS_DIR, exist_ok=True)
+    open(upload.caminho, 'wb').close()
+    return upload
+
+
+def receber_parte(upload, deslocamento, corpo, tamanho_parte, sha256_parte=''):
+    """Grava `tamanho_parte` bytes lidos de `corpo` a partir de `deslocamento`.
+
+    O deslocamento tem de ser exatamente o que já foi recebido (409 com o valor atual
+    caso contrário, para o cliente retomar dali). Parte incompleta ou com hash diferente
+    não avança o contador: o reenvio sobrescreve os mesmos bytes.
+    """
+    if upload.concluido_em:
+        raise ErroUpload("Upload já concluído.", 409)
+    if deslocamento != upload.recebido:
+        raise ErroUpload(f"Deslocamento esperado: {upload.recebido}.", 409)
+    if tamanho_parte <= 0 or deslocamento + tamanho_parte > upload.tamanho:
+        raise ErroUpload("Parte fora do tamanho do arquivo.", 416)
+    if tamanho_parte > settings.UPLOAD_PARTE_MAXIMA:
+        raise ErroUpload(f"Parte maior que {settings.UPLOAD_PARTE_MAXIMA} bytes.", 413)
+
+    resumo = hashlib.sha256()
+    gravados = 0
+    with open(upload.caminho, 'r+b') as destino:
+        destino.seek(deslocamento)
+        while gravados < tamanho_parte:
+            bloco = corpo.read(min(TAMANHO_BLOCO, tamanho_parte - gravados))
+            if not bloco:
+                break
+            destino.write(bloco)
+            resumo.update(bloco)
+            gravados += len(bloco)
+    if gravados != tamanho_parte:
+        raise ErroUpload(f"Parte incompleta ({gravados} de {tamanho_parte} bytes).")
+    if sha256_parte and resumo.hexdigest() != sha256_parte.lower():
+        raise ErroUpload("SHA-256 da parte não confere.", 422)
+
+    # Sem trava: uma parte reenviada em paralelo grava os mesmos bytes e só uma avança o contador
+    novo = deslocamento + tamanho_parte
+    if UploadParcial.objects.filter(pk=upload.pk, recebido=deslocamento).update(recebido=novo):
+        upload.recebido = novo
+        if novo == upload.tamanho:
+            concluir(upload)
+    else:
+        upload.refresh_from_db()
+    return upload
+
+
+def concluir(upload):
+    """Confere o arquivo inteiro; se o hash não bater, zera o upload para reenvio"""
+    if upload.sha256:
+        resumo = hashlib.sha256()
+        with open(upload.caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                resumo.update(bloco)
+        if resumo.hexdigest() != upload.sha256:
+            open(upload.caminho, 'wb').close()
+            UploadParcial.objects.filter(pk=upload.pk).update(recebido=0)
+            upload.recebido = 0
+            raise ErroUpload("SHA-256 do arquivo não confere; envie novamente.", 422)
+    upload.concluido_em = timezone.now()
+    UploadParcial.objects.filter(pk=upload.pk).update(concluido_em=upload.concluido_em)
+
+
+def estado(upload):
+    return {
+        'id': str(upload.pk), 'nome': upload.nome_arquivo, 'tamanho': upload.tamanho,
+        'recebido': upload.recebido, 'concluido': upload.concluido_em is not None,
+    }
+
+
+def concluidos(empresa_id):
+    """Uploads prontos para anexar (queryset dos campos de formulário)"""
+    return UploadParcial.objects.filter(empresa_id=empresa_id, concluido_em__isnull=False)
+
+
+def validar(upload, modelo, campo):
+    """Confere o conteúdo do upload contra a extensão e o campo `campo` de `modelo`; ErroUpload se não servir"""
+    extensao = os.path.splitext(upload.nome_arquivo)[1].lower()
+    arquivo = ArquivoMontado(upload)
+    try:
+        if extensao not in EXTENSOES:
+            raise forms.ValidationError("Tipo de arquivo não aceito.")
+        if extensao == '.pdf' and arquivo.read(5) != b'%PDF-':
+            raise forms.ValidationError("O arquivo não é um PDF válido.")
+        if extensao in EXTENSOES_IMAGEM:
+            forms.ImageField().clean(arquivo)
+        # ImageField do modelo: o Pillow abre e confere a imagem; FileField: nome e tamanho
+        modelo._meta.get_field(campo).formfield().clean(arquivo)
+    except forms.ValidationError as erro:
+        raise ErroUpload(f"{upload.nome_arquivo}: {' '.join(erro.messages)}", 422)
+    finally:
+        arquivo.close()
+
+
+@contextmanager
+def anexo(upload, modelo, campo):
+    """File para atribuir a `modelo.campo` dentro do bloco; na saída o upload é descartado.
+
+    O conteúdo é validado para o campo antes de entregar (ErroUpload se não servir). Com
+    upload None entrega None, para o mesmo código servir ao envio tradicional.
+    """
+    if upload is None:
+        yield None
+        return
+    validar(upload, modelo, campo)
+    arquivo = ArquivoMontado(upload)
+    try:
+        yield arquivo
+    finally:
+        arquivo.close()
+    descartar(upload)
+
+
+def anexar_no_commit(upload, instancia, campo):
+    """Dá a `instancia.campo` o nome final do upload e só move o .part quando a transação fizer commit.
+
+    Para gravações em lote (bulk_create) dentro de transaction.atomic: se a transação desfizer,
+    o .part e o UploadParcial continuam no lugar e o mesmo lote pode ser reenviado. Se o nome
+    já estiver ocupado na hora de mover, o storage escolhe outro e o registro é atualizado.
+    """
+    modelo = type(instancia)
+    validar(upload, modelo, campo)
+    campo_arquivo = modelo._meta.get_field(campo)
+    nome = campo_arquivo.generate_filename(instancia, upload.nome_arquivo)
+    # Com uma string o FileField não grava nada no pre_save
+    setattr(instancia, campo, nome)
+
+    def mover():
+        arquivo = ArquivoMontado(upload)
+        try:
+            final = campo_arquivo.storage.save(nome, arquivo, max_length=campo_arquivo.max_length)
+        finally:
+            arquivo.close()
+        if final != nome:
+            modelo.objects.filter(pk=instancia.pk).update(**{campo: final})
+            setattr(instancia, campo, final)
+        descartar(upload)
+
+    transaction.on_commit(mover)
+
+
+def descartar(upload):
+    if os.path.exists(upload.caminho):
+        os.remove(upload.caminho)
+    upload.delete()
+
+
+def limpar_expirados():
+    """Apaga uploads (e .part) mais velhos que VALIDADE que não viraram anexo. Retorna quantos"""
+    expirados = list(UploadParcial.objects.filter(criado_em__lt=timezone.now() - VALIDADE))
+    for upload in expirados:
+        descartar(upload)
+    return len(expirados)
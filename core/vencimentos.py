@@ -0,0 +1,168 @@
+"""
+Varredura incremental de vencimentos.
+
+Cada fonte é uma coluna de data de algum modelo. Numa execução só são lidos os registros
+alterados desde a última varredura (atualizado_em) ou cuja data cruzou um limiar desde
+então (entrou na janela de aviso ou venceu). O resultado fica em Vencimento, uma linha
+por objeto/origem, gravada com upsert em lote.
+
+Alterações no funcionário (desligamento, nome) também tornam candidatos os registros
+do prontuário dele. Um registro apagado perde o alerta na hora (remover_alertas, pelos
+signals); a varredura completa ainda procura órfãos deixados por exclusões sem signals.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import (
+    ControleVacina, TreinamentoFuncionario, EPI, EntregaEPI, Extintor, Equipamento,
+    Vencimento, VarreduraVencimentos
+)
+
+JANELA_AVISO = 30  # dias
+TAMANHO_LOTE = 1000
+
+
+class Fonte:
+    def __init__(self, origem, model, campo_data, campo_empresa, campos_descricao, formato, filtro=None,
+                 relacionados=()):
+        self.origem = origem
+        self.model = model
+        self.campo_data = campo_data
+        self.campo_empresa = campo_empresa
+        self.campos_descricao = campos_descricao
+        self.formato = formato
+        self.filtro = filtro or Q()
+        # FKs com atualizado_em das quais o filtro ou a descrição dependem
+        self.relacionados = relacionados
+
+    def candidatos(self, marca, hoje, janela):
+        """Registros que mudaram ou cruzaram um limiar desde a marca d'água (todos, se não houver marca)"""
+        qs = self.model.objects.filter(**{f'{self.campo_data}__isnull': False})
+        if marca is None:
+            return qs
+        desde = marca.date()
+        filtro = (
+            Q(atualizado_em__gt=marca)
+            | Q(**{f'{self.campo_data}__gt': desde + janela, f'{self.campo_data}__lte': hoje + janela})
+            | Q(**{f'{self.campo_data}__gte': desde, f'{self.campo_data}__lt': hoje})
+            | self.candidatos_extras(marca)
+        )
+        for relacionado in self.relacionados:
+            filtro |= Q(**{f'{relacionado}__atualizado_em__gt': marca})
+        return qs.filter(filtro)
+
+    def candidatos_extras(self, marca):
+        return Q(pk__in=[])
+
+
+class FonteVacina(Fonte):
+    """Só a dose mais recente de cada vacina conta; uma dose nova torna a anterior candidata"""
+
+    def candidatos_extras(self, marca):
+        return Q(Exists(ControleVacina.objects.filter(
+            funcionario=OuterRef('funcionario'), vacina=OuterRef('vacina'), atualizado_em__gt=marca
+        )))
+
+
+FONTES = [
+    FonteVacina(
+        'VACINA', ControleVacina, 'data_proximo_reforco', 'funcionario__empresa_id',
+        ['vacina__nome', 'funcionario__nome'], '{} - {}',
+        ~Q(Exists(ControleVacina.objects.filter(
+            funcionario=OuterRef('funcionario'), vacina=OuterRef('vacina'), data_aplicacao__gt=OuterRef('data_aplicacao')
+        ))) & ~Q(funcionario__situacao='DESLIGADO'),
+        relacionados=['funcionario'],
+    ),
+    Fonte(
+        'TREINAMENTO', TreinamentoFuncionario, 'data_validade', 'funcionario__empresa_id',
+        ['nome_treinamento', 'funcionario__nome'], '{} - {}', ~Q(funcionario__situacao='DESLIGADO'),
+        relacionados=['funcionario'],
+    ),
+    Fonte('EPI', EPI, 'data_validade', 'empresa_id', ['tipo__nome', 'ca'], '{} (CA {})', Q(quantidade__gt=0)),
+    Fonte(
+        'CA_ENTREGA', EntregaEPI, 'validade_ca', 'funcionario__empresa_id',
+        ['epi__tipo__nome', 'ca_registrado', 'funcionario__nome'], '{} (CA {}) - {}',
+        Q(data_devolucao__isnull=True) & ~Q(funcionario__situacao='DESLIGADO'),
+        relacionados=['funcionario'],
+    ),
+    Fonte('EXT_RECARGA', Extintor, 'data_proxima_manutencao', 'empresa_id', ['codigo_patrimonial'], '{}',
+          ~Q(situacao='CONDENADO')),
+    Fonte('EXT_HIDRO', Extintor, 'data_teste_hidrostatico', 'empresa_id', ['codigo_patrimonial'], '{}',
+          ~Q(situacao='CONDENADO')),
+    Fonte('EQUIPAMENTO', Equipamento, 'data_validade', 'empresa_id', ['nome', 'localizacao__nome'], '{} ({})',
+          Q(ativo=True)),
+]
+
+ORIGENS_POR_MODELO = defaultdict(list)
+for _fonte in FONTES:
+    ORIGENS_POR_MODELO[_fonte.model].append(_fonte.origem)
+
+
+def remover_alertas(instancia):
+    """Apaga os alertas de um registro excluído (post_delete), sem esperar a varredura"""
+    Vencimento.objects.filter(origem__in=ORIGENS_POR_MODELO[type(instancia)], objeto_id=instancia.pk).delete()
+
+
+def _processar(fonte, marca, hoje, janela):
+    candidatos = fonte.candidatos(marca, hoje, janela)
+    alertas = candidatos.filter(fonte.filtro).filter(**{f'{fonte.campo_data}__lte': hoje + janela})
+
+    # Candidatos que saíram da janela (renovados, devolvidos, desativados...) perdem o alerta
+    removidos, _ = (Vencimento.objects.filter(origem=fonte.origem, objeto_id__in=candidatos.values('pk'))
+                    .exclude(objeto_id__in=alertas.values('pk')).delete())
+    orfaos = 0
+    if marca is None:
+        # Só na varredura completa: as exclusões normais já apagaram o alerta (remover_alertas)
+        orfaos, _ = (Vencimento.objects.filter(origem=fonte.origem)
+                     .exclude(objeto_id__in=fonte.model.objects.values('pk')).delete())
+
+    gravados = 0
+    lote = []
+    campos = ['pk', fonte.campo_empresa, fonte.campo_data, *fonte.campos_descricao]
+    for linha in alertas.values_list(*campos).iterator(chunk_size=TAMANHO_LOTE):
+        pk, empresa_id, data_vencimento, *descricao = linha
+        lote.append(Vencimento(
+            empresa_id=empresa_id, origem=fonte.origem, objeto_id=pk,
+            descricao=fonte.formato.format(*descricao)[:255], data_vencimento=data_vencimento,
+            situacao='VENCIDO' if data_vencimento < hoje else 'A_VENCER',
+        ))
+        if len(lote) >= TAMANHO_LOTE:
+            gravados += _gravar(lote)
+            lote = []
+    if lote:
+        gravados += _gravar(lote)
+    return gravados, removidos + orfaos
+
+
+def _gravar(lote):
+    Vencimento.objects.bulk_create(
+        lote, update_conflicts=True, unique_fields=['origem', 'objeto_id'],
+        update_fields=['empresa', 'descricao', 'data_vencimento', 'situacao', 'atualizado_em'],
+    )
+    return len(lote)
+
+
+def varrer_vencimentos(completa=False, janela_dias=JANELA_AVISO):
+    """Executa a varredura e avança a marca d'água. Retorna {origem: (gravados, removidos)}"""
+    inicio = timezone.now()
+    hoje = timezone.localdate()
+    janela = timedelta(days=janela_dias)
+    ultima = VarreduraVencimentos.objects.order_by('-executada_em').first()
+    marca = None if completa or ultima is None else ultima.executada_em
+
+    resultado = {}
+    with transaction.atomic():
+        for fonte in FONTES:
+            resultado[fonte.origem] = _processar(fonte, marca, hoje, janela)
+        total = sum(gravados for gravados, _ in resultado.values())
+        if ultima is None:
+            VarreduraVencimentos.objects.create(executada_em=inicio, alertas_gravados=total)
+        else:
+            ultima.executada_em = inicio
+            ultima.alertas_gravados = total
+            ultima.save()
+    return resultado
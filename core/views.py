@@ -1,38 +1,50 @@
 import csv
-import qrcode
-from datetime import date, timedelta
-from io import BytesIO
+import json
+from datetime import date, datetime, time, timedelta
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.core.files.base import ContentFile
-from django.db.models import Count, Q
-from django.db.models.functions import TruncMonth
+from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
 
 # --- IMPORTAÇÃO DOS MODELOS ---
 from .models import (
     Empresa, Funcionario, Setor, NormaRegulamentadora,
     EPI, TipoEPI, Localizacao, Vacina,
-    Advertencia, TipoAdvertencia,
+    Advertencia, TipoAdvertencia, ResumoAdvertencia,
     Extintor, InspecaoExtintor, FotoInspecao,
     Equipamento, InspecaoEquipamento, ArquivoInspecao,
     # Prontuário
     ControleVacina, EntregaEPI, TreinamentoFuncionario,
-    Afastamento, AcidenteTrabalho
+    Afastamento, AcidenteTrabalho, PendenciaConformidade, UploadParcial
 )
 
+from . import busca
+from . import cache_dados
+from . import conformidade
+from . import estoque
+from .exportacao import exportar
+from . import importacao
+from .midia import localizar_arquivo, responder_arquivo
+from .paginacao import paginar
+from . import qrcodes
+from . import sincronizacao
+from . import uploads
+
 # --- IMPORTAÇÃO DOS FORMULÁRIOS ---
 from .forms import (
     CadastroSaaSForm, FuncionarioForm, SetorForm,
-    TipoEPIForm, LocalizacaoForm, EPIForm, VacinaForm,
-    TipoAdvertenciaForm, AdvertenciaForm, AdvertenciaFuncionarioForm,
+    TipoEPIForm, LocalizacaoForm, EPIForm, MovimentoEstoqueForm, VacinaForm,
+    TipoAdvertenciaForm, AdvertenciaForm, AdvertenciaFuncionarioForm, ImportacaoPlanilhaForm,
     ExtintorForm, InspecaoExtintorForm,
     EquipamentoForm, InspecaoEquipamentoForm,
     # Forms do Prontuário
-    ControleVacinaForm, EntregaEPIForm, TreinamentoFuncionarioForm,
+    ControleVacinaForm, EntregaEPIForm, EntregaKitForm, ItemKitFormSet, TreinamentoFuncionarioForm,
     AfastamentoForm, AcidenteTrabalhoForm
 )
 
@@ -51,20 +63,65 @@ def cadastro_view(request):
 
 @login_required
 def dashboard_view(request):
-    empresa = getattr(request.user.perfil, 'empresa', None)
+    empresa = request.empresa
     return render(request, 'dashboard.html', {'empresa': empresa})
 
 # --- FUNCIONÁRIOS ---
 
 @login_required
+@cache_dados.condicional(Funcionario, Setor)
 def lista_funcionarios(request):
-    empresa = request.user.perfil.empresa
-    funcionarios = Funcionario.objects.filter(empresa=empresa)
-    return render(request, 'funcionarios_lista.html', {'funcionarios': funcionarios})
+    empresa = request.empresa
+
+    def calcular():
+        funcionarios = Funcionario.objects.filter(empresa=empresa).select_related('setor')
+        pagina = paginar(request, funcionarios, ['nome', 'pk'])
+        return {'funcionarios': pagina, 'pagina': pagina}
+
+    return render(request, 'funcionarios_lista.html', cache_dados.contexto(request, 'lista_funcionarios', calcular))
+
+def _importar_planilha(request, importador, contexto):
+    """Formulário de upload comum às importações em lote (ver core/importacao.py)"""
+    resultado = None
+    if request.method == 'POST':
+        form = ImportacaoPlanilhaForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importador(request.empresa, importacao.ler_planilha(arquivo, arquivo.name))
+            except importacao.ErroImportacao as erro:
+                form.add_error('arquivo', str(erro))
+    else:
+        form = ImportacaoPlanilhaForm()
+    return render(request, 'importar_planilha.html', {'form': form, 'resultado': resultado, **contexto})
+
+@login_required
+def importar_funcionarios(request):
+    return _importar_planilha(request, importacao.importar_funcionarios, {
+        'titulo': 'Importar Funcionários',
+        'voltar': reverse('lista_funcionarios'),
+        'instrucoes': 'Colunas: <strong>nome</strong>, <strong>cpf</strong>, <strong>cargo</strong>, '
+                      '<strong>data_admissao</strong> e, opcionalmente, <strong>setor</strong>, <strong>situacao</strong> '
+                      'e <strong>ativo</strong>. Setores novos são criados. CPFs já cadastrados têm o cadastro atualizado.',
+    })
+
+@login_required
+def exportar_funcionarios(request):
+    empresa = request.empresa
+    funcionarios = Funcionario.objects.filter(empresa=empresa).select_related('setor').order_by('nome')
+    colunas = [
+        ('Nome', lambda f: f.nome),
+        ('CPF', lambda f: f.cpf_formatado),
+        ('Cargo', lambda f: f.cargo),
+        ('Setor', lambda f: f.setor.nome if f.setor else ''),
+        ('Admissão', lambda f: f.data_admissao),
+        ('Situação', lambda f: f.get_situacao_display()),
+    ]
+    return exportar(funcionarios, colunas, 'funcionarios', request.GET.get('formato', 'csv'))
 
 @login_required
 def criar_funcionario(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     if request.method == 'POST':
         form = FuncionarioForm(empresa.id, request.POST)
         if form.is_valid():
@@ -78,7 +135,7 @@ def criar_funcionario(request):
 
 @login_required
 def editar_funcionario(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=pk, empresa=empresa)
     
     if request.method == 'POST':
@@ -95,31 +152,68 @@ def editar_funcionario(request, pk):
 
 @login_required
 def detalhe_funcionario(request, pk):
-    empresa = request.user.perfil.empresa
-    funcionario = get_object_or_404(Funcionario, pk=pk, empresa=empresa)
-    
-    vacinas = funcionario.vacinas.all().order_by('data_proximo_reforco')
-    epis = funcionario.epis_entregues.all().order_by('-data_entrega')
-    treinamentos = funcionario.treinamentos.all().order_by('-data_realizacao')
-    advertencias = funcionario.advertencias.all().order_by('-data_incidente')
-    afastamentos = funcionario.afastamentos.all().order_by('-data_inicio')
-    acidentes = funcionario.acidentes.all().order_by('-data_acidente')
-    
+    empresa = request.empresa
+    # Seções curtas vêm pré-carregadas (1 consulta cada); o histórico de EPIs é buscado à parte, paginado
+    funcionarios = Funcionario.objects.select_related('setor').prefetch_related(
+        Prefetch('vacinas', queryset=ControleVacina.objects.select_related('vacina').order_by('data_proximo_reforco')),
+        Prefetch('treinamentos', queryset=TreinamentoFuncionario.objects.order_by('-data_realizacao')),
+        Prefetch('advertencias', queryset=Advertencia.objects.select_related('tipo').order_by('-data_incidente')),
+        Prefetch('afastamentos', queryset=Afastamento.objects.order_by('-data_inicio')),
+        Prefetch('acidentes', queryset=AcidenteTrabalho.objects.order_by('-data_acidente')),
+    )
+    funcionario = get_object_or_404(funcionarios, pk=pk, empresa=empresa)
+
     return render(request, 'funcionario_detalhe.html', {
         'funcionario': funcionario,
-        'vacinas': vacinas,
-        'epis': epis,
-        'treinamentos': treinamentos,
-        'advertencias': advertencias,
-        'afastamentos': afastamentos,
-        'acidentes': acidentes
+        'vacinas': funcionario.vacinas.all(),
+        'treinamentos': funcionario.treinamentos.all(),
+        'advertencias': funcionario.advertencias.all(),
+        'afastamentos': funcionario.afastamentos.all(),
+        'acidentes': funcionario.acidentes.all()
+    })
+
+@login_required
+def historico_epis_func(request, func_id):
+    """Fragmento HTML (linhas da tabela) com o histórico de EPIs, carregado pela página do prontuário"""
+    empresa = request.empresa
+    funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
+    epis = funcionario.epis_entregues.select_related('epi__tipo')
+    pagina = paginar(request, epis, ['-data_entrega', '-pk'], por_pagina=20)
+    return render(request, 'prontuario/epis_fragmento.html', {
+        'funcionario': funcionario, 'epis': pagina, 'pagina': pagina, 'today': date.today()
+    })
+
+@login_required
+def devolver_epi_func(request, func_id, pk):
+    empresa = request.empresa
+    entrega = get_object_or_404(EntregaEPI.objects.select_related('funcionario', 'epi'),
+                                pk=pk, funcionario_id=func_id, funcionario__empresa=empresa)
+    if request.method == 'POST' and not entrega.data_devolucao:
+        estoque.devolver(entrega, usuario=request.user, retornar_ao_estoque='retornar_ao_estoque' in request.POST)
+    return redirect('detalhe_funcionario', pk=func_id)
+
+# --- CONFORMIDADE ---
+
+@login_required
+def painel_conformidade(request):
+    empresa = request.empresa
+    # Reforços e NRs gravados com data futura só aparecem quando vencem
+    pendencias = conformidade.vigentes(PendenciaConformidade.objects.filter(empresa=empresa))
+    pendencias = pendencias.select_related('funcionario__setor')
+    tipo_filter = request.GET.get('tipo')
+    totais = dict(pendencias.values_list('tipo').annotate(total=Count('id')).order_by())
+    if tipo_filter: pendencias = pendencias.filter(tipo=tipo_filter)
+    pagina = paginar(request, pendencias, ['funcionario_id', 'pk'])
+    return render(request, 'conformidade/painel.html', {
+        'pendencias': pagina, 'pagina': pagina,
+        'totais': [(tipo, nome, totais.get(tipo, 0)) for tipo, nome in PendenciaConformidade.TIPOS]
     })
 
 # --- AÇÕES DO PRONTUÁRIO ---
 
 @login_required
 def adicionar_vacina_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
@@ -135,7 +229,7 @@ def adicionar_vacina_func(request, func_id):
 
 @login_required
 def adicionar_epi_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
@@ -143,21 +237,19 @@ def adicionar_epi_func(request, func_id):
         if form.is_valid():
             entrega = form.save(commit=False)
             entrega.funcionario = funcionario
-            epi_estoque = entrega.epi
-            if epi_estoque.quantidade >= entrega.quantidade:
-                epi_estoque.quantidade -= entrega.quantidade
-                epi_estoque.save()
-                entrega.save()
-                return redirect('detalhe_funcionario', pk=funcionario.id)
+            try:
+                estoque.entregar(entrega, usuario=request.user)
+            except estoque.EstoqueInsuficiente as erro:
+                form.add_error('quantidade', f'Estoque insuficiente ({erro.disponivel} disponível).')
             else:
-                form.add_error('quantidade', 'Estoque insuficiente.')
+                return redirect('detalhe_funcionario', pk=funcionario.id)
     else:
         form = EntregaEPIForm(empresa.id)
     return render(request, 'generic_form.html', {'form': form, 'titulo': f'Entregar EPI - {funcionario.nome}'})
 
 @login_required
 def adicionar_treinamento_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
@@ -173,7 +265,7 @@ def adicionar_treinamento_func(request, func_id):
 
 @login_required
 def adicionar_advertencia_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
@@ -190,45 +282,49 @@ def adicionar_advertencia_func(request, func_id):
 
 @login_required
 def adicionar_afastamento_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
-        form = AfastamentoForm(request.POST, request.FILES)
+        form = AfastamentoForm(empresa.id, request.POST, request.FILES)
         if form.is_valid():
             obj = form.save(commit=False)
             obj.funcionario = funcionario
-            obj.save()
+            with uploads.anexo(form.cleaned_data['laudo_enviado'], Afastamento, 'laudo') as arquivo:
+                if arquivo: obj.laudo = arquivo
+                obj.save()
             if not obj.data_retorno:
                 funcionario.situacao = 'AFASTADO'
                 funcionario.motivo_afastamento = obj.motivo
                 funcionario.save()
             return redirect('detalhe_funcionario', pk=funcionario.id)
     else:
-        form = AfastamentoForm()
+        form = AfastamentoForm(empresa.id)
     return render(request, 'generic_form.html', {'form': form, 'titulo': f'Registrar Afastamento - {funcionario.nome}'})
 
 @login_required
 def adicionar_acidente_func(request, func_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     funcionario = get_object_or_404(Funcionario, pk=func_id, empresa=empresa)
     
     if request.method == 'POST':
-        form = AcidenteTrabalhoForm(request.POST, request.FILES)
+        form = AcidenteTrabalhoForm(empresa.id, request.POST, request.FILES)
         if form.is_valid():
             obj = form.save(commit=False)
             obj.funcionario = funcionario
-            obj.save()
+            with uploads.anexo(form.cleaned_data['arquivo_enviado'], AcidenteTrabalho, 'arquivo_evidencia') as arquivo:
+                if arquivo: obj.arquivo_evidencia = arquivo
+                obj.save()
             return redirect('detalhe_funcionario', pk=funcionario.id)
     else:
-        form = AcidenteTrabalhoForm()
+        form = AcidenteTrabalhoForm(empresa.id)
     return render(request, 'generic_form.html', {'form': form, 'titulo': f'Registrar Acidente - {funcionario.nome}'})
 
 # --- SETORES E ESTOQUE ---
 
 @login_required
 def criar_setor(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     if request.method == 'POST':
         form = SetorForm(empresa, request.POST)
         if form.is_valid():
@@ -243,28 +339,105 @@ def criar_setor(request):
 
 @login_required
 def lista_epis(request):
-    empresa = request.user.perfil.empresa
-    epis = EPI.objects.filter(empresa=empresa)
-    return render(request, 'epis_lista.html', {'epis': epis})
+    empresa = request.empresa
+    epis = EPI.objects.filter(empresa=empresa).select_related('tipo', 'local')
+    pagina = paginar(request, epis, ['pk'])
+    return render(request, 'epis_lista.html', {'epis': pagina, 'pagina': pagina})
+
+@login_required
+def exportar_epis(request):
+    empresa = request.empresa
+    epis = EPI.objects.filter(empresa=empresa).select_related('tipo', 'local').order_by('tipo__nome', 'tamanho')
+    colunas = [
+        ('Código', lambda e: e.codigo_unico),
+        ('Tipo', lambda e: e.tipo.nome),
+        ('CA', lambda e: e.ca),
+        ('Tamanho', lambda e: e.tamanho),
+        ('Qtd', lambda e: e.quantidade),
+        ('Local', lambda e: e.local.nome),
+        ('Validade', lambda e: e.data_validade),
+    ]
+    return exportar(epis, colunas, 'epis', request.GET.get('formato', 'csv'))
 
 @login_required
 def criar_editar_epi(request, pk=None):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     epi = get_object_or_404(EPI, pk=pk, empresa=empresa) if pk else None
     if request.method == 'POST':
         form = EPIForm(empresa.id, request.POST, instance=epi)
         if form.is_valid():
             obj = form.save(commit=False)
             obj.empresa = empresa
-            obj.save()
+            if epi:
+                # A quantidade não é regravada: pode ter mudado por uma entrega desde que o form foi aberto
+                obj.save(update_fields=[*form.fields, 'atualizado_em'])
+            else:
+                with transaction.atomic():
+                    inicial, obj.quantidade = obj.quantidade, 0
+                    obj.save()
+                    if inicial:
+                        estoque.movimentar(obj, 'ENTRADA', inicial, usuario=request.user, observacao='Cadastro do item')
             return redirect('lista_epis')
     else:
         form = EPIForm(empresa.id, instance=epi)
     return render(request, 'epi_form.html', {'form': form})
 
+@login_required
+def movimentos_epi(request, pk):
+    empresa = request.empresa
+    epi = get_object_or_404(EPI.objects.select_related('tipo', 'local'), pk=pk, empresa=empresa)
+    form = MovimentoEstoqueForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            estoque.movimentar(epi, form.cleaned_data['tipo'], form.cleaned_data['quantidade'],
+                               usuario=request.user, observacao=form.cleaned_data['observacao'])
+        except estoque.EstoqueInsuficiente as erro:
+            form.add_error('quantidade', f'O saldo ficaria negativo ({erro.disponivel} disponível).')
+        else:
+            return redirect('movimentos_epi', pk=epi.pk)
+    movimentos = epi.movimentos.select_related('usuario', 'entrega__funcionario')
+    pagina = paginar(request, movimentos, ['-data', '-pk'])
+    return render(request, 'estoque/movimentos.html', {'epi': epi, 'form': form, 'movimentos': pagina, 'pagina': pagina})
+
+@login_required
+def relatorio_estoque(request):
+    """Saldo de cada EPI numa data e consumo mensal por tipo (últimos 12 meses)"""
+    empresa = request.empresa
+    try:
+        data_ref = date.fromisoformat(request.GET.get('data', ''))
+    except ValueError:
+        data_ref = timezone.localdate()
+    fim_do_dia = timezone.make_aware(datetime.combine(data_ref + timedelta(days=1), time.min))
+    saldos = estoque.saldos_em(empresa.id, fim_do_dia)
+    epis = EPI.objects.filter(empresa=empresa).select_related('tipo', 'local').order_by('tipo__nome', 'tamanho')
+    linhas = [(epi, saldos.get(epi.pk, 0)) for epi in epis]
+    consumo = estoque.consumo_mensal(empresa.id, (timezone.localdate() - timedelta(days=365)).replace(day=1))
+    return render(request, 'estoque/relatorio.html', {'linhas': linhas, 'data_ref': data_ref, 'consumo': consumo})
+
+@login_required
+def entregar_kit(request):
+    """Entrega o mesmo kit de EPIs a um setor (ou grupo de funcionários) de uma vez"""
+    empresa = request.empresa
+    form = EntregaKitForm(empresa.id, request.POST or None)
+    itens = ItemKitFormSet(request.POST or None, form_kwargs={'empresa_id': empresa.id}, prefix='itens')
+    if request.method == 'POST' and form.is_valid() and itens.is_valid():
+        destinatarios = form.cleaned_data['destinatarios']
+        kit = [(item['epi'], item['quantidade']) for item in itens.cleaned_data if item]
+        try:
+            entregas = estoque.entregar_kit(empresa.id, destinatarios, kit, form.cleaned_data['data_entrega'],
+                                            usuario=request.user)
+        except estoque.EstoqueInsuficiente as erro:
+            form.add_error(None, f'Estoque insuficiente de {erro.epi}: {erro.disponivel} disponível, '
+                                 f'{erro.solicitado} necessário para {len(destinatarios)} funcionário(s).')
+        else:
+            return render(request, 'estoque/entrega_kit.html', {
+                'concluido': True, 'entregas': len(entregas), 'destinatarios': destinatarios,
+            })
+    return render(request, 'estoque/entrega_kit.html', {'form': form, 'itens': itens})
+
 @login_required
 def deletar_epi(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     epi = get_object_or_404(EPI, pk=pk, empresa=empresa)
     if request.method == 'POST':
         epi.delete()
@@ -275,7 +448,7 @@ def deletar_epi(request, pk):
 
 @login_required
 def gerenciar_tipos(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     tipos = TipoEPI.objects.filter(empresa=empresa)
     form = TipoEPIForm(request.POST or None)
     if request.method == 'POST':
@@ -291,7 +464,7 @@ def gerenciar_tipos(request):
 
 @login_required
 def gerenciar_locais(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     locais = Localizacao.objects.filter(empresa=empresa)
     form = LocalizacaoForm(request.POST or None)
     if request.method == 'POST':
@@ -307,7 +480,7 @@ def gerenciar_locais(request):
 
 @login_required
 def gerenciar_vacinas(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     vacinas = Vacina.objects.filter(empresa=empresa)
     form = VacinaForm(request.POST or None)
     if request.method == 'POST':
@@ -330,7 +503,7 @@ def gerenciar_vacinas(request):
 
 @login_required
 def gerenciar_tipos_advertencia(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     tipos = TipoAdvertencia.objects.filter(empresa=empresa)
     if request.method == 'POST':
         form = TipoAdvertenciaForm(request.POST)
@@ -345,7 +518,7 @@ def gerenciar_tipos_advertencia(request):
 
 @login_required
 def nova_advertencia(request):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     if request.method == 'POST':
         form = AdvertenciaForm(empresa.id, request.POST)
         if form.is_valid():
@@ -358,54 +531,91 @@ def nova_advertencia(request):
     return render(request, 'advertencias/nova_advertencia.html', {'form': form})
 
 @login_required
+@cache_dados.condicional(Advertencia, TipoAdvertencia, Funcionario, Setor)
 def dashboard_advertencias(request):
-    empresa = request.user.perfil.empresa
-    advertencias = Advertencia.objects.filter(empresa=empresa).order_by('-data_incidente')
-    por_setor = advertencias.values('funcionario__setor__nome').annotate(total=Count('id')).order_by('-total')
-    por_tipo = advertencias.values('tipo__titulo').annotate(total=Count('id')).order_by('-total')
-    por_mes = advertencias.annotate(mes=TruncMonth('data_incidente')).values('mes').annotate(total=Count('id')).order_by('mes')
-    return render(request, 'advertencias/dashboard_adv.html', {
-        'advertencias': advertencias, 'por_setor': por_setor, 'por_tipo': por_tipo, 'por_mes': por_mes
+    empresa = request.empresa
+
+    def calcular():
+        # Gráficos vêm do resumo pré-agregado; só a lista lê a tabela de advertências (paginada)
+        resumo = ResumoAdvertencia.objects.filter(empresa=empresa)
+        por_setor = resumo.values('setor__nome').annotate(total=Sum('total')).order_by('-total')
+        por_tipo = resumo.values('tipo__titulo').annotate(total=Sum('total')).order_by('-total')
+        por_mes = resumo.values('mes').annotate(total=Sum('total')).order_by('mes')
+        advertencias = Advertencia.objects.filter(empresa=empresa).select_related('funcionario', 'tipo')
+        pagina = paginar(request, advertencias, ['-data_incidente', '-pk'])
+        return {
+            'advertencias': pagina, 'pagina': pagina,
+            'por_setor': list(por_setor), 'por_tipo': list(por_tipo), 'por_mes': list(por_mes),
+        }
+
+    return render(request, 'advertencias/dashboard_adv.html',
+                  cache_dados.contexto(request, 'dashboard_advertencias', calcular))
+
+@login_required
+def importar_advertencias(request):
+    return _importar_planilha(request, importacao.importar_advertencias, {
+        'titulo': 'Importar Advertências',
+        'voltar': reverse('dashboard_advertencias'),
+        'instrucoes': 'Colunas: <strong>data</strong>, <strong>cpf</strong> (ou <strong>funcionario</strong>, pelo nome), '
+                      '<strong>motivo</strong> e <strong>detalhes</strong> (opcional). Motivos ainda não cadastrados são '
+                      'criados. A reincidência é calculada pela ordem das datas.',
     })
 
+@login_required
+def exportar_advertencias(request):
+    empresa = request.empresa
+    advertencias = (Advertencia.objects.filter(empresa=empresa)
+                    .select_related('funcionario__setor', 'tipo').order_by('-data_incidente'))
+    colunas = [
+        ('Data', lambda a: a.data_incidente),
+        ('Funcionário', lambda a: a.funcionario.nome),
+        ('Setor', lambda a: a.funcionario.setor.nome if a.funcionario.setor else ''),
+        ('Motivo', lambda a: a.tipo.titulo),
+        ('Reincidente', lambda a: 'Sim' if a.reincidente else 'Não'),
+        ('Observações', lambda a: a.detalhes),
+    ]
+    return exportar(advertencias, colunas, 'advertencias', request.GET.get('formato', 'csv'))
+
 @login_required
 def imprimir_advertencia(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     adv = get_object_or_404(Advertencia, pk=pk, empresa=empresa)
     return render(request, 'advertencias/documento_print.html', {'adv': adv, 'empresa': empresa})
 
 # --- EXTINTORES ---
 
 @login_required
+@cache_dados.condicional(Extintor, InspecaoExtintor, Localizacao)
 def dashboard_extintores(request):
-    empresa = request.user.perfil.empresa
-    extintores = Extintor.objects.filter(empresa=empresa)
-    status_filter = request.GET.get('status')
-    if status_filter: extintores = extintores.filter(situacao=status_filter)
-    termo = request.GET.get('search')
-    if termo: extintores = extintores.filter(Q(codigo_patrimonial__icontains=termo) | Q(localizacao__nome__icontains=termo))
-    
-    total_ativos = extintores.filter(situacao='ATIVO').count()
-    data_limite = date.today() + timedelta(days=30)
-    vencendo_recarga = extintores.filter(data_proxima_manutencao__lte=data_limite, data_proxima_manutencao__gte=date.today()).count()
-    vencendo_hidro = extintores.filter(data_teste_hidrostatico__lte=data_limite, data_teste_hidrostatico__gte=date.today()).count()
-    
-    data_limite_inspecao = date.today() - timedelta(days=30)
-    pendentes_inspecao = []
-    for ext in extintores.filter(situacao='ATIVO'):
-        ultima = ext.inspecoes.order_by('-data_inspecao').first()
-        if not ultima or ultima.data_inspecao < data_limite_inspecao:
-            pendentes_inspecao.append(ext)
-
-    return render(request, 'extintores/dashboard.html', {
-        'extintores': extintores, 'total_ativos': total_ativos,
-        'vencendo_recarga': vencendo_recarga, 'vencendo_hidro': vencendo_hidro,
-        'pendentes_inspecao': pendentes_inspecao
-    })
+    empresa = request.empresa
+
+    def calcular():
+        extintores = Extintor.objects.filter(empresa=empresa).select_related('localizacao')
+        status_filter = request.GET.get('status')
+        if status_filter: extintores = extintores.filter(situacao=status_filter)
+        termo = request.GET.get('search')
+        if termo: extintores = extintores.filter(Q(codigo_patrimonial__icontains=termo) | Q(localizacao__nome__icontains=termo))
+
+        # Contadores e pendências numa única agregação (ultima_inspecao é desnormalizada); a tabela vem paginada
+        hoje = date.today()
+        data_limite = hoje + timedelta(days=30)
+        data_limite_inspecao = hoje - timedelta(days=30)
+        filtro_pendente = Q(situacao='ATIVO') & (Q(ultima_inspecao__isnull=True) | Q(ultima_inspecao__lt=data_limite_inspecao))
+        contadores = extintores.aggregate(
+            total_ativos=Count('pk', filter=Q(situacao='ATIVO')),
+            vencendo_recarga=Count('pk', filter=Q(data_proxima_manutencao__range=(hoje, data_limite))),
+            vencendo_hidro=Count('pk', filter=Q(data_teste_hidrostatico__range=(hoje, data_limite))),
+            qtd_pendente_inspecao=Count('pk', filter=filtro_pendente),
+        )
+        pagina = paginar(request, extintores, ['codigo_patrimonial', 'pk'])
+        return {'extintores': pagina, 'pagina': pagina, **contadores}
+
+    return render(request, 'extintores/dashboard.html',
+                  cache_dados.contexto(request, 'dashboard_extintores', calcular))
 
 @login_required
 def criar_editar_extintor(request, pk=None):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     extintor = get_object_or_404(Extintor, pk=pk, empresa=empresa) if pk else None
     if request.method == 'POST':
         form = ExtintorForm(empresa.id, request.POST, instance=extintor)
@@ -420,88 +630,195 @@ def criar_editar_extintor(request, pk=None):
 
 @login_required
 def registrar_inspecao(request, extintor_id):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     extintor = get_object_or_404(Extintor, pk=extintor_id, empresa=empresa)
     if request.method == 'POST':
-        form = InspecaoExtintorForm(request.POST, request.FILES)
+        form = InspecaoExtintorForm(empresa.id, request.POST, request.FILES)
         if form.is_valid():
             inspecao = form.save(commit=False)
             inspecao.extintor = extintor
             inspecao.save()
             for foto in request.FILES.getlist('fotos'):
                 FotoInspecao.objects.create(inspecao=inspecao, imagem=foto)
+            for upload in form.cleaned_data['fotos_enviadas']:
+                with uploads.anexo(upload, FotoInspecao, 'imagem') as foto:
+                    FotoInspecao.objects.create(inspecao=inspecao, imagem=foto)
             extintor.sinalizacao_ok = inspecao.sinalizacao_visivel
             extintor.acesso_livre = inspecao.acesso_livre
             extintor.save()
             return redirect('dashboard_extintores')
     else:
-        form = InspecaoExtintorForm(initial={'responsavel': request.user.username})
+        form = InspecaoExtintorForm(empresa.id, initial={'responsavel': request.user.username})
     return render(request, 'extintores/inspecao_form.html', {'form': form, 'extintor': extintor})
 
 @login_required
+@cache_dados.condicional(Extintor, InspecaoExtintor, FotoInspecao, Localizacao)
 def historico_extintor(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     extintor = get_object_or_404(Extintor, pk=pk, empresa=empresa)
-    inspecoes = extintor.inspecoes.all().order_by('-data_inspecao')
+    inspecoes = extintor.inspecoes.prefetch_related('fotos').order_by('-data_inspecao')
     return render(request, 'extintores/historico.html', {'extintor': extintor, 'inspecoes': inspecoes})
 
 @login_required
 def exportar_extintores(request):
-    empresa = request.user.perfil.empresa
-    extintores = Extintor.objects.filter(empresa=empresa)
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="extintores.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Patrimonio', 'Local', 'Tipo', 'Venc. Recarga', 'Situação'])
-    for ext in extintores:
-        writer.writerow([ext.codigo_patrimonial, ext.localizacao.nome, ext.get_agente_display(), ext.data_proxima_manutencao, ext.get_situacao_display()])
-    return response
+    empresa = request.empresa
+    extintores = Extintor.objects.filter(empresa=empresa).select_related('localizacao').order_by('codigo_patrimonial')
+    colunas = [
+        ('Patrimonio', lambda ext: ext.codigo_patrimonial),
+        ('Local', lambda ext: ext.localizacao.nome),
+        ('Tipo', lambda ext: ext.get_agente_display()),
+        ('Venc. Recarga', lambda ext: ext.data_proxima_manutencao),
+        ('Situação', lambda ext: ext.get_situacao_display()),
+    ]
+    return exportar(extintores, colunas, 'extintores', request.GET.get('formato', 'csv'))
 
 @login_required
 def gerar_qrcode(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     extintor = get_object_or_404(Extintor, pk=pk, empresa=empresa)
-    if not extintor.qrcode_imagem:
-        url_destino = request.build_absolute_uri(reverse('extintor_mobile', args=[pk]))
-        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=2)
-        qr.add_data(url_destino)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        filename = f'qrcode_extintor_{extintor.id}.png'
-        extintor.qrcode_imagem.save(filename, ContentFile(buffer.getvalue()), save=True)
-        buffer.seek(0)
-        return HttpResponse(buffer, content_type="image/png")
-    else:
-        return HttpResponse(extintor.qrcode_imagem, content_type="image/png")
+    qrcodes.garantir_qrcode(extintor, qrcodes.endereco_base(request))
+    return responder_arquivo(request, extintor.qrcode_imagem, content_type="image/png")
+
+@login_required
+def modal_qrcode(request, pk):
+    """Conteúdo do modal de etiqueta do dashboard, buscado só quando o modal é aberto"""
+    empresa = request.empresa
+    extintor = get_object_or_404(Extintor.objects.select_related('localizacao'), pk=pk, empresa=empresa)
+    return render(request, 'extintores/modal_qr.html', {'ext': extintor})
 
 @login_required
 def imprimir_etiqueta(request, pk):
-    empresa = request.user.perfil.empresa
-    extintor = get_object_or_404(Extintor, pk=pk, empresa=empresa)
+    empresa = request.empresa
+    extintor = get_object_or_404(Extintor.objects.select_related('localizacao'), pk=pk, empresa=empresa)
     return render(request, 'extintores/etiqueta_print.html', {'ext': extintor})
 
+@login_required
+def etiquetas_extintores(request):
+    """Folha A4 com as etiquetas de todos os extintores (ou de um local), pronta para imprimir"""
+    empresa = request.empresa
+    base_url = qrcodes.endereco_base(request)
+    extintores = (Extintor.objects.filter(empresa=empresa).exclude(situacao='CONDENADO')
+                  .select_related('localizacao').order_by('localizacao__nome', 'codigo_patrimonial'))
+    local_id = request.GET.get('local')
+    if local_id:
+        extintores = extintores.filter(localizacao_id=local_id)
+    extintores = list(extintores)
+    # PNGs já gravados vão embutidos na página: nenhuma requisição por etiqueta
+    for ext in extintores:
+        ext.qr_dados = qrcodes.imagem_inline(ext, base_url)
+    faltando = sum(1 for ext in extintores if ext.qr_dados is None)
+    em_geracao = faltando and qrcodes.agendar_lote(empresa.id, base_url)
+    return render(request, 'extintores/etiquetas_lote.html', {
+        'extintores': extintores, 'faltando': faltando, 'em_geracao': em_geracao,
+    })
+
 @login_required
 def extintor_mobile(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     extintor = get_object_or_404(Extintor, pk=pk, empresa=empresa)
     ultimas_inspecoes = extintor.inspecoes.all().order_by('-data_inspecao')[:3]
     return render(request, 'extintores/mobile_scan.html', {'ext': extintor, 'ultimas_inspecoes': ultimas_inspecoes})
 
+# --- BUSCA ---
+
+@login_required
+def busca_global(request):
+    """Funcionários, EPIs, extintores e equipamentos da empresa num só resultado (core.busca)"""
+    termo = request.GET.get('q', '').strip()
+    resultados = busca.buscar(request.empresa, termo)
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'termo': termo, 'resultados': resultados})
+    return render(request, 'busca.html', {
+        'termo': termo, 'resultados': resultados, 'tamanho_minimo': busca.TAMANHO_MINIMO,
+    })
+
+# --- ARQUIVOS ENVIADOS ---
+
+@login_required
+def servir_midia(request, caminho):
+    """Entrega um arquivo de MEDIA_ROOT se ele pertencer à empresa do usuário"""
+    return responder_arquivo(request, localizar_arquivo(caminho, request.empresa))
+
+@login_required
+@require_POST
+def iniciar_upload(request):
+    """Cria um upload em partes. Corpo JSON: nome, tamanho e sha256 (opcional) do arquivo"""
+    try:
+        dados = json.loads(request.body or b'{}')
+        upload = uploads.iniciar(request.empresa, request.user, dados.get('nome'), dados.get('tamanho'), dados.get('sha256'))
+    except ValueError:
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+    except uploads.ErroUpload as erro:
+        return JsonResponse({'erro': str(erro)}, status=erro.status)
+    return JsonResponse(uploads.estado(upload), status=201)
+
+@login_required
+@require_POST
+def sincronizar_inspecoes(request):
+    """Lote de inspeções feitas offline (ver core.sincronizacao); responde com o delta de extintores"""
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+    if not isinstance(dados, dict):
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+    try:
+        resposta = sincronizacao.sincronizar(request.empresa, request.user, dados)
+    except sincronizacao.ErroSincronizacao as erro:
+        return JsonResponse({'erro': str(erro), 'erros': erro.erros}, status=400)
+    return JsonResponse(resposta)
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def parte_upload(request, pk):
+    """GET: quanto já foi recebido (para retomar). PUT: corpo cru da parte que começa em Upload-Offset"""
+    upload = get_object_or_404(UploadParcial, pk=pk, empresa=request.empresa)
+    if request.method == 'PUT':
+        try:
+            deslocamento = int(request.headers.get('Upload-Offset', ''))
+            # Lê o corpo direto do stream, sem request.body: a parte nunca fica inteira na memória
+            uploads.receber_parte(upload, deslocamento, request, int(request.META.get('CONTENT_LENGTH') or 0),
+                                  request.headers.get('Upload-Checksum', ''))
+        except ValueError:
+            return JsonResponse({'erro': 'Upload-Offset inválido.', **uploads.estado(upload)}, status=400)
+        except uploads.ErroUpload as erro:
+            return JsonResponse({'erro': str(erro), **uploads.estado(upload)}, status=erro.status)
+    return JsonResponse(uploads.estado(upload))
+
 # --- EQUIPAMENTOS ---
 
 @login_required
+@cache_dados.condicional(Equipamento, Localizacao)
 def dashboard_equipamentos(request):
-    empresa = request.user.perfil.empresa
-    equipamentos = Equipamento.objects.filter(empresa=empresa).order_by('tipo', 'localizacao')
-    tipo_filter = request.GET.get('tipo')
-    if tipo_filter: equipamentos = equipamentos.filter(tipo=tipo_filter)
-    return render(request, 'equipamentos/dashboard.html', {'equipamentos': equipamentos})
+    empresa = request.empresa
+
+    def calcular():
+        equipamentos = Equipamento.objects.filter(empresa=empresa).select_related('localizacao')
+        tipo_filter = request.GET.get('tipo')
+        if tipo_filter: equipamentos = equipamentos.filter(tipo=tipo_filter)
+        pagina = paginar(request, equipamentos, ['tipo', 'nome', 'pk'])
+        return {'equipamentos': pagina, 'pagina': pagina}
+
+    return render(request, 'equipamentos/dashboard.html',
+                  cache_dados.contexto(request, 'dashboard_equipamentos', calcular))
+
+@login_required
+def exportar_equipamentos(request):
+    empresa = request.empresa
+    equipamentos = Equipamento.objects.filter(empresa=empresa).select_related('localizacao').order_by('tipo', 'nome')
+    colunas = [
+        ('Identificação', lambda e: e.nome),
+        ('Tipo', lambda e: e.get_tipo_display()),
+        ('Local', lambda e: e.localizacao.nome),
+        ('Instalação', lambda e: e.data_instalacao),
+        ('Validade', lambda e: e.data_validade),
+        ('Ativo', lambda e: 'Sim' if e.ativo else 'Não'),
+    ]
+    return exportar(equipamentos, colunas, 'equipamentos', request.GET.get('formato', 'csv'))
 
 @login_required
 def criar_editar_equipamento(request, pk=None):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     equipamento = get_object_or_404(Equipamento, pk=pk, empresa=empresa) if pk else None
     if request.method == 'POST':
         form = EquipamentoForm(empresa.id, request.POST, request.FILES, instance=equipamento)
@@ -516,24 +833,28 @@ def criar_editar_equipamento(request, pk=None):
 
 @login_required
 def inspecionar_equipamento(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     equipamento = get_object_or_404(Equipamento, pk=pk, empresa=empresa)
     if request.method == 'POST':
-        form = InspecaoEquipamentoForm(request.POST, request.FILES)
+        form = InspecaoEquipamentoForm(empresa.id, request.POST, request.FILES)
         if form.is_valid():
             inspecao = form.save(commit=False)
             inspecao.equipamento = equipamento
             inspecao.save()
             for f in request.FILES.getlist('arquivos'):
                 ArquivoInspecao.objects.create(inspecao=inspecao, arquivo=f)
+            for upload in form.cleaned_data['arquivos_enviados']:
+                with uploads.anexo(upload, ArquivoInspecao, 'arquivo') as f:
+                    ArquivoInspecao.objects.create(inspecao=inspecao, arquivo=f)
             return redirect('historico_equipamento', pk=equipamento.pk)
     else:
-        form = InspecaoEquipamentoForm(initial={'responsavel': request.user.username})
+        form = InspecaoEquipamentoForm(empresa.id, initial={'responsavel': request.user.username})
     return render(request, 'equipamentos/inspecao_form.html', {'form': form, 'equipamento': equipamento})
 
 @login_required
+@cache_dados.condicional(Equipamento, InspecaoEquipamento, ArquivoInspecao, Localizacao)
 def historico_equipamento(request, pk):
-    empresa = request.user.perfil.empresa
+    empresa = request.empresa
     equipamento = get_object_or_404(Equipamento, pk=pk, empresa=empresa)
-    inspecoes = equipamento.inspecoes.all().order_by('-data_inspecao')
+    inspecoes = equipamento.inspecoes.prefetch_related('arquivos').order_by('-data_inspecao')
     return render(request, 'equipamentos/historico.html', {'equipamento': equipamento, 'inspecoes': inspecoes})
\ No newline at end of file
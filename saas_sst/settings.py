@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
 from decouple import config
 
@@ -48,6 +49,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.EmpresaMiddleware',
+    'core.middleware.ReplicaLeituraMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,17 +79,97 @@ WSGI_APPLICATION = 'saas_sst.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# O HOST é o pooler do Supabase em modo transação (porta 6543): cada transação pode cair numa
+# conexão diferente do servidor. Por isso:
+# - a conexão do Django com o pooler é reaproveitada entre requisições (CONN_MAX_AGE), em vez
+#   de abrir um TLS novo pela WAN a cada página, e testada antes de reusar (CONN_HEALTH_CHECKS);
+# - nada de estado de sessão no servidor: sem cursores do lado do servidor (um iterator() traz
+#   o resultado inteiro para a memória do cliente; por isso as exportações leem em lotes por
+#   keyset, ver core.exportacao) e sem prepared statements automáticos do psycopg 3;
+# - TIME_ZONE = 'UTC' igual ao padrão do servidor, então o Django não precisa de SET TIME ZONE.
+# DB_POOL=True troca a conexão persistente pelo pool do psycopg 3 (pacote psycopg-pool), útil
+# com vários threads por processo; nesse modo o CONN_MAX_AGE tem de ser 0.
+# DB_HOST/DB_PORT permitem apontar para um pgbouncer local (ver comando medir_conexoes).
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',
-        'USER': 'postgres.tiyxcqjeitreicgmtmdy',
+        'NAME': config('DB_NAME', default='postgres'),
+        'USER': config('DB_USER', default='postgres.tiyxcqjeitreicgmtmdy'),
         'PASSWORD': config('DB_PASSWORD'), # Senha lida do arquivo .env
-        'HOST': 'aws-1-us-east-1.pooler.supabase.com',
-        'PORT': '6543',
+        'HOST': config('DB_HOST', default='aws-1-us-east-1.pooler.supabase.com'),
+        'PORT': config('DB_PORT', default='6543'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=300, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': True,
+        'OPTIONS': {
+            'sslmode': config('DB_SSLMODE', default='require'),
+            'connect_timeout': 10,
+        },
     }
 }
 
+try:
+    import psycopg  # noqa: F401  (psycopg 3; o Django o prefere ao psycopg2 quando instalado)
+except ImportError:
+    pass
+else:
+    # prepare_threshold=None: o pooler em modo transação não garante que o PREPARE e o EXECUTE
+    # caiam na mesma conexão do servidor
+    DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+            'timeout': 10,
+        }
+
+# Réplica de leitura (core.roteador): dashboards, históricos, listas e exportações leem dela
+# quando DB_REPLICA_HOST está definido. Nos testes ela espelha o default (TEST.MIRROR).
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica'].update({
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    })
+
+DATABASE_ROUTERS = ['core.roteador.RoteadorReplica']
+# Nomes das funções de view (fnmatch) servidas pela réplica; só GET/HEAD
+VIEWS_REPLICA = ['dashboard_*', 'historico_*', 'lista_*', 'exportar_*']
+# Segundos no primário depois de um POST do mesmo navegador (atraso máximo esperado da réplica)
+REPLICA_JANELA_ESCRITA = config('REPLICA_JANELA_ESCRITA', default=10, cast=int)
+
+# Cache compartilhado entre os workers (ex.: redis://127.0.0.1:6379/0). Sem ele cada processo
+# tem o próprio cache em memória.
+REDIS_URL = config('REDIS_URL', default='')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    # Fragmentos de template com a data de alteração do registro na chave ({% cache ... using="fragmentos" %}):
+    # nunca ficam desatualizados, então podem ficar na memória do processo, sem ida à rede por linha
+    'fragmentos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragmentos',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+if REDIS_URL:
+    CACHES['default'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+
+# Contexto dos dashboards e listas em cache por empresa e versão dos dados (core.cache_dados).
+# Com cache em memória por processo um worker não vê a versão nova gravada por outro, então
+# por padrão só liga com o Redis; num único processo (runserver) pode ser ligado à mão.
+CACHE_DASHBOARDS = config('CACHE_DASHBOARDS', default=bool(REDIS_URL), cast=bool)
+CACHE_DASHBOARDS_VALIDADE = config('CACHE_DASHBOARDS_VALIDADE', default=3600, cast=int)
+# Empresa do usuário em cache (core.middleware.resolver_empresa): é dado de autorização, então só
+# com o cache compartilhado entre os workers; sem Redis cada requisição consulta o PerfilUsuario.
+CACHE_EMPRESA_USUARIO = config('CACHE_EMPRESA_USUARIO', default=bool(REDIS_URL), cast=bool)
+# Entra no ETag das listas e históricos (core.cache_dados.condicional): mude a cada deploy que
+# altere templates, senão o navegador continua recebendo 304 para a página antiga
+ETAG_VERSAO = config('ETAG_VERSAO', default='')
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
@@ -139,4 +222,25 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Entrega dos arquivos pelo servidor web depois da checagem de empresa (core.midia):
+# 'nginx' -> X-Accel-Redirect para MIDIA_ACCEL_PREFIXO (location internal apontando para MEDIA_ROOT)
+# 'sendfile' -> X-Sendfile (Apache mod_xsendfile); vazio -> o próprio Django envia o arquivo
+# O Django já manda Content-Type/Content-Disposition conferidos e CSP sandbox; o nginx repassa
+# os dois primeiros, o CSP precisa de um add_header Content-Security-Policy sandbox na location.
+MIDIA_ACCEL = config('MIDIA_ACCEL', default='')
+MIDIA_ACCEL_PREFIXO = '/protegido/'
+
+# Miniaturas das fotos de inspeção numa fila de threads do próprio processo (core.imagens), e os
+# QR Codes que faltam na folha de etiquetas (core.qrcodes). Desligue para gerar só pelos comandos
+# processar_imagens e gerar_qrcodes (ex.: cron num worker separado).
+IMAGENS_EM_SEGUNDO_PLANO = config('IMAGENS_EM_SEGUNDO_PLANO', default=True, cast=bool)
+
+# Uploads em partes (core.uploads): arquivos incompletos ficam aqui até serem anexados.
+# No mesmo disco do MEDIA_ROOT o anexo final é só um rename; a view de mídia não serve esta pasta.
+UPLOADS_PARCIAIS_DIR = os.path.join(MEDIA_ROOT, 'parciais')
+UPLOAD_PARTE_MAXIMA = 8 * 1024 * 1024
+
+# Endereço público do sistema (ex.: https://sst.exemplo.com.br), usado nos QR Codes gerados fora de uma requisição
+SITE_URL = config('SITE_URL', default='')
@@ -2,7 +2,6 @@ from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from django.conf import settings
-from django.conf.urls.static import static
 
 from core.views import (
     # Views Originais
@@ -49,6 +48,17 @@ from core.views import (
     adicionar_acidente_func
 )
 
+from core.views import (
+    # Exportações (CSV / XLSX / NDJSON)
+    exportar_funcionarios, exportar_epis,
+    exportar_advertencias, exportar_equipamentos
+)
+
+from core.views import historico_epis_func, painel_conformidade, importar_advertencias, importar_funcionarios
+from core.views import movimentos_epi, relatorio_estoque, devolver_epi_func, entregar_kit
+from core.views import etiquetas_extintores, servir_midia, iniciar_upload, parte_upload
+from core.views import sincronizar_inspecoes, busca_global, modal_qrcode
+
 
 
 urlpatterns = [
@@ -66,10 +76,15 @@ urlpatterns = [
     # --- FUNCIONÁRIOS E PRONTUÁRIO ---
     path('funcionarios/', lista_funcionarios, name='lista_funcionarios'),
     path('funcionarios/novo/', criar_funcionario, name='criar_funcionario'),
+    path('funcionarios/exportar/', exportar_funcionarios, name='exportar_funcionarios'),
+    path('funcionarios/importar/', importar_funcionarios, name='importar_funcionarios'),
     # Novas rotas de detalhes e histórico
     path('funcionarios/<int:pk>/', detalhe_funcionario, name='detalhe_funcionario'),
     path('funcionarios/<int:func_id>/vacina/nova/', adicionar_vacina_func, name='adicionar_vacina_func'),
     path('funcionarios/<int:func_id>/epi/novo/', adicionar_epi_func, name='adicionar_epi_func'),
+    path('funcionarios/<int:func_id>/epis/', historico_epis_func, name='historico_epis_func'),
+    path('funcionarios/<int:func_id>/epis/<int:pk>/devolver/', devolver_epi_func, name='devolver_epi_func'),
+    path('funcionarios/conformidade/', painel_conformidade, name='painel_conformidade'),
     path('funcionarios/<int:func_id>/treinamento/novo/', adicionar_treinamento_func, name='adicionar_treinamento_func'),
 
     # Configurações
@@ -80,6 +95,10 @@ urlpatterns = [
     # EPIs (Estoque)
     path('estoque/', lista_epis, name='lista_epis'),
     path('estoque/novo/', criar_editar_epi, name='criar_epi'),
+    path('estoque/exportar/', exportar_epis, name='exportar_epis'),
+    path('estoque/relatorio/', relatorio_estoque, name='relatorio_estoque'),
+    path('estoque/entrega-kit/', entregar_kit, name='entregar_kit'),
+    path('estoque/<int:pk>/movimentos/', movimentos_epi, name='movimentos_epi'),
     path('estoque/editar/<int:pk>/', criar_editar_epi, name='editar_epi'),
     path('estoque/deletar/<int:pk>/', deletar_epi, name='deletar_epi'),
 
@@ -87,6 +106,8 @@ urlpatterns = [
     path('advertencias/', dashboard_advertencias, name='dashboard_advertencias'),
     path('advertencias/config/', gerenciar_tipos_advertencia, name='config_advertencias'),
     path('advertencias/nova/', nova_advertencia, name='nova_advertencia'),
+    path('advertencias/exportar/', exportar_advertencias, name='exportar_advertencias'),
+    path('advertencias/importar/', importar_advertencias, name='importar_advertencias'),
     path('advertencias/imprimir/<int:pk>/', imprimir_advertencia, name='imprimir_advertencia'),
 
     # Extintores
@@ -97,12 +118,15 @@ urlpatterns = [
     path('extintores/historico/<int:pk>/', historico_extintor, name='historico_extintor'),
     path('extintores/exportar/', exportar_extintores, name='exportar_extintores'),
     path('extintores/qrcode/<int:pk>/', gerar_qrcode, name='gerar_qrcode'),
+    path('extintores/qrcode/<int:pk>/modal/', modal_qrcode, name='modal_qrcode'),
     path('extintores/etiqueta/<int:pk>/', imprimir_etiqueta, name='imprimir_etiqueta'),
+    path('extintores/etiquetas/', etiquetas_extintores, name='etiquetas_extintores'),
     path('extintores/scan/<int:pk>/', extintor_mobile, name='extintor_mobile'),
 
     # Outros Equipamentos
     path('equipamentos/', dashboard_equipamentos, name='dashboard_equipamentos'),
     path('equipamentos/novo/', criar_editar_equipamento, name='criar_equipamento'),
+    path('equipamentos/exportar/', exportar_equipamentos, name='exportar_equipamentos'),
     path('equipamentos/editar/<int:pk>/', criar_editar_equipamento, name='editar_equipamento'),
     path('equipamentos/inspecao/<int:pk>/', inspecionar_equipamento, name='inspecionar_equipamento'),
     path('equipamentos/historico/<int:pk>/', historico_equipamento, name='historico_equipamento'),
@@ -114,7 +138,18 @@ urlpatterns = [
 
     path('funcionarios/<int:func_id>/afastamento/novo/', adicionar_afastamento_func, name='adicionar_afastamento_func'),
     path('funcionarios/<int:func_id>/acidente/novo/', adicionar_acidente_func, name='adicionar_acidente_func'),
+
+    path('busca/', busca_global, name='busca_global'),
+
+    # Uploads em partes dos anexos (core.uploads)
+    path('uploads/', iniciar_upload, name='iniciar_upload'),
+    path('uploads/<uuid:pk>/', parte_upload, name='parte_upload'),
+
+    # Inspeções feitas sem sinal, enviadas em lote pelo celular (core.sincronizacao)
+    path('sincronizar/inspecoes/', sincronizar_inspecoes, name='sincronizar_inspecoes'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Arquivos enviados passam pela checagem de empresa (core.midia), inclusive em produção
+urlpatterns += [
+    path(settings.MEDIA_URL.lstrip('/') + '<path:caminho>', servir_midia, name='servir_midia'),
+]